@@ -1,6 +1,7 @@
 // cloudfunctions/generateNoteQuestions/index.js
 const cloud = require('wx-server-sdk')
 const axios = require('axios')
+const crypto = require('crypto')
 
 cloud.init({
     env: cloud.DYNAMIC_CURRENT_ENV
@@ -19,17 +20,15 @@ exports.main = async (event, context) => {
     console.log('📝 [NoteQ Debug]', { bookName, chapter })
 
     try {
-        // 1. [缓存优先] 查数据库
-        const dbRes = await db.collection('note_questions').where({
-            book_name: bookName,
-            chapter: chapter
-        }).get()
+        // 1. [缓存优先] 查数据库：先按确定性 _id 取（离线批量生成的问题池），再兼容旧的自动 _id 记录
+        const docId = noteQuestionsId(bookName, chapter)
+        const cached = await getCachedQuestions(db, docId, bookName, chapter)
 
-        if (dbRes.data.length > 0) {
+        if (cached) {
             console.log('✨ [NoteQ Debug] Hit Cache!')
             return {
                 code: 0,
-                data: dbRes.data[0].questions,
+                data: cached,
                 source: 'database'
             }
         }
@@ -99,8 +98,8 @@ exports.main = async (event, context) => {
             questions.push(getDefaultQuestions()[questions.length])
         }
 
-        // 3. [写入缓存]
-        await db.collection('note_questions').add({
+        // 3. [写入缓存] 用与问题池相同的 _id，之后离线导入时会覆盖而不是重复
+        await db.collection('note_questions').doc(docId).set({
             data: {
                 book_name: bookName,
                 chapter: chapter,
@@ -129,6 +128,28 @@ exports.main = async (event, context) => {
     }
 }
 
+/**
+ * note_questions 记录的确定性 _id，与 scripts/generate_note_questions_pool.py 的 note_questions_id 保持一致
+ */
+function noteQuestionsId(bookName, chapter) {
+    const key = `${bookName}\u001f${chapter}`
+    return 'n' + crypto.createHash('sha1').update(key, 'utf8').digest('hex').slice(0, 20)
+}
+
+async function getCachedQuestions(db, docId, bookName, chapter) {
+    try {
+        const res = await db.collection('note_questions').doc(docId).get()
+        if (res.data && res.data.questions) return res.data.questions
+    } catch (e) {
+        // 文档不存在
+    }
+    const res = await db.collection('note_questions').where({
+        book_name: bookName,
+        chapter: chapter
+    }).get()
+    return res.data.length > 0 ? res.data[0].questions : null
+}
+
 function getDefaultQuestions() {
     return [
         '🦸‍♂️ 你最喜欢的角色是谁？为什么？',
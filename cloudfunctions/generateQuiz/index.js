@@ -1,12 +1,22 @@
 // cloudfunctions/generateQuiz/index.js
 const cloud = require('wx-server-sdk')
 const axios = require('axios')
+const crypto = require('crypto')
 const { CONFIG } = require('./constants')
 
 cloud.init({
     env: cloud.DYNAMIC_CURRENT_ENV
 })
 
+/**
+ * 题库记录的确定性 _id，与 scripts/export_quiz_pool.py 的 record_id 保持一致
+ * 例：quizRecordId('西游记', '第一回 灵根育孕源流出', 1) === 'q24ee1119f595efb846c0'
+ */
+function quizRecordId(bookName, chapter, level) {
+    const key = `${bookName}\u001f${chapter}\u001f${level}`
+    return 'q' + crypto.createHash('sha1').update(key, 'utf8').digest('hex').slice(0, 20)
+}
+
 /**
  * generateQuiz 云函数 (带 Fallback AI 生成机制)
  * 接收：bookName, chapter, level
@@ -28,18 +38,26 @@ exports.main = async (event, context) => {
 
     let pool = [];
     let isDbHit = false;
+    const recordId = quizRecordId(bookName, chapter, quizLevel);
 
     try {
-        // 1. 优先查数据库 'questions' 集合
-        const dbRes = await db.collection('questions').where({
-            book_name: bookName,
-            chapter: chapter,
-            level: quizLevel
-        }).get();
-
-        if (dbRes.data.length > 0 && dbRes.data[0].questions && dbRes.data[0].questions.length > 0) {
+        // 1. 优先按 _id 点查数据库 'questions' 集合（导出脚本生成的确定性 _id）
+        let record = null;
+        try {
+            record = (await db.collection('questions').doc(recordId).get()).data;
+        } catch (e) {
+            // 文档不存在：可能是旧版随机 _id 导入的记录，按字段再查一次
+            const dbRes = await db.collection('questions').where({
+                book_name: bookName,
+                chapter: chapter,
+                level: quizLevel
+            }).get();
+            record = dbRes.data[0] || null;
+        }
+
+        if (record && record.questions && record.questions.length > 0) {
             console.log(`✨ [Quiz DB Hit] Found Level ${quizLevel} questions in DB.`);
-            pool = dbRes.data[0].questions;
+            pool = record.questions;
             isDbHit = true;
         } else {
             console.log(`💨 [Quiz DB Miss] Generating Level ${quizLevel} via AI Fallback...`);
@@ -113,7 +131,8 @@ exports.main = async (event, context) => {
             // 写入数据库
             if (pool.length > 0) {
                 console.log(`✅ [Quiz Fallback] Generated ${pool.length} questions. Saving to DB...`);
-                await db.collection('questions').add({
+                // 用确定性 _id 写入，之后同一 key 的请求直接点查命中
+                await db.collection('questions').doc(recordId).set({
                     data: {
                         book_name: bookName,
                         chapter: chapter,
@@ -2,6 +2,7 @@
 
 const cloud = require('wx-server-sdk');
 const axios = require('axios');
+const crypto = require('crypto');
 const { classifyIntent } = require('./intentClassifier');
 const { CONFIG, CHAT_PROMPT, PLANNER_PROMPT, OPTIMIZER_PROMPT } = require('./constants');
 
@@ -173,6 +174,9 @@ async function getUserContext(openid, bookName, chapter) {
             bookName: bookName || progress.book_name || '当前读物',
             chapter: chapter || `第${(progress.current_chapter_index || 0) + 1}回`,
             chapterIndex: progress.current_chapter_index || 0,
+            // 调用方没指定章节、且进度就是这本书的时，章节名和下标都来自阅读进度，可以按下标查知识包
+            chapterFromProgress: !chapter && progress.current_chapter_index !== undefined
+                && (!bookName || bookName === progress.book_name),
             totalChapters: totalChapters,
             level: Number(user.level) || 1,
             streak: user.continuous_days || 0,
@@ -187,6 +191,7 @@ async function getUserContext(openid, bookName, chapter) {
             bookName: bookName || '当前读物',
             chapter: chapter || '当前章节',
             chapterIndex: 0,
+            chapterFromProgress: false,
             streak: 0,
             daysSinceCheckin: 0,
             quizAccuracy: 0,
@@ -360,17 +365,76 @@ async function pollCozeResult(chatId, conversationId, token, maxRetries = 8) {
     return { type: 'chat', message: '唔，我翻书翻太久了，能再问一遍吗？', source: 'coze_timeout' };
 }
 
+/**
+ * 章节知识包的确定性 _id，与 scripts/generate_context_packs.py 的 pack_id 保持一致
+ */
+function contextPackId(bookName, chapter) {
+    const key = `${bookName}\u001f${chapter}`;
+    return 'c' + crypto.createHash('sha1').update(key, 'utf8').digest('hex').slice(0, 20);
+}
+
+/**
+ * 知识包渲染为 Prompt 文本，与 scripts/generate_context_packs.py 的 render_pack 保持一致
+ */
+function renderContextPack(pack) {
+    const lines = [];
+    if (pack.summary) lines.push(`【本回概要】${pack.summary}`);
+    if (pack.characters && pack.characters.length) {
+        lines.push('【主要人物】' + pack.characters.map(c => c.role ? `${c.name}：${c.role}` : c.name).join('；'));
+    }
+    if (pack.plot_beats && pack.plot_beats.length) {
+        lines.push('【情节要点】' + pack.plot_beats.map((b, i) => `${i + 1}. ${b}`).join(' '));
+    }
+    if (pack.vocabulary && pack.vocabulary.length) {
+        lines.push('【词语】' + pack.vocabulary.map(v => `${v.word}：${v.meaning}`).join('；'));
+    }
+    return lines.join('\n');
+}
+
+/**
+ * 查询预生成的章节知识包（chapter_context 集合），没有则返回 null。
+ * 先按 (书名, 章节名) 的 _id 点查；只有章节名本身是由阅读进度拼出来的默认值（"第N回"）时，
+ * 才按进度里的章节下标再查一次。对不上所问章节的知识包宁可不用，免得拿别的章节"以此为准"
+ */
+async function getContextPack(bookName, chapter, chapterIndex, chapterFromProgress) {
+    try {
+        const res = await db.collection('chapter_context').doc(contextPackId(bookName, chapter)).get();
+        if (res.data && res.data.book_name === bookName && res.data.chapter === chapter) {
+            return renderContextPack(res.data);
+        }
+    } catch (e) {
+        // 文档不存在
+    }
+    if (!chapterFromProgress) return null;
+    try {
+        const res = await db.collection('chapter_context')
+            .where({ book_name: bookName, chapter_index: chapterIndex }).limit(1).get();
+        const pack = res.data[0];
+        return pack && pack.book_name === bookName && pack.chapter_index === chapterIndex
+            ? renderContextPack(pack) : null;
+    } catch (e) {
+        console.error('⚠️ [ContextPack] 查询章节知识包失败:', e.message);
+        return null;
+    }
+}
+
 /**
  * 通过 DeepSeek 直连对话（无 RAG，降级方案）
+ * 有预生成的章节知识包时拼进系统 Prompt，让回答有原文依据
  */
 async function chatViaDeepSeek(message, userContext, history) {
     const apiKey = process.env.AI_API_KEY || CONFIG.DEFAULT_API_KEY;
     const baseUrl = process.env.AI_BASE_URL || CONFIG.DEFAULT_BASE_URL;
     const model = process.env.AI_MODEL || CONFIG.DEFAULT_MODEL;
 
-    const systemPrompt = CHAT_PROMPT
+    let systemPrompt = CHAT_PROMPT
         .replace(/\$\{bookName\}/g, userContext.bookName)
         .replace(/\$\{chapter\}/g, userContext.chapter);
+    const contextPack = await getContextPack(userContext.bookName, userContext.chapter, userContext.chapterIndex,
+        userContext.chapterFromProgress);
+    if (contextPack) {
+        systemPrompt += `\n\n【本章知识包（据原文整理，回答以此为准）】\n${contextPack}`;
+    }
 
     const messages = [{ role: 'system', content: systemPrompt }, ...history];
 
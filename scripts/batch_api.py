@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Batch 批量接口：把所有待出题的请求写成一个 JSONL 批量输入文件一次提交，轮询到完成后取回结果。
+夜间全量重建这类不在乎延迟的离线任务走批量接口更便宜、吞吐更高，也不占用实时接口的 RPM。
+
+后端可替换，都实现 submit(input_path) / status(batch_id) / fetch(batch_id, dest_path)：
+- OpenAIBatchBackend：OpenAI 兼容的 /files + /batches 接口
+- LocalBatchBackend：用本地目录模拟批处理，供联调和测试使用
+
+单独运行可处理本地批次（逐条转发给 DEEPSEEK_BASE_URL，可指向本地 stub 服务器）：
+    python batch_api.py --process-local .cache/batches/local
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+
+import metrics
+
+CHAT_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+DEFAULT_POLL_INTERVAL = 30
+
+
+def batch_request_line(custom_id, body, endpoint=CHAT_ENDPOINT):
+    return json.dumps({"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body},
+                      ensure_ascii=False) + "\n"
+
+
+def write_batch_input(path, requests):
+    """requests: 可迭代的 (custom_id, 请求体)，写成批量输入文件，返回请求数"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for custom_id, body in requests:
+            f.write(batch_request_line(custom_id, body))
+            count += 1
+    return count
+
+
+def read_batch_custom_ids(path):
+    """批量输入文件中所有请求的 custom_id"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return {json.loads(line)["custom_id"] for line in f if line.strip()}
+
+
+def iter_batch_output(path):
+    """逐行产出批量结果的 (custom_id, 回复文本 或 None, 错误信息 或 None)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if entry.get("error") or response.get("status_code") != 200:
+                error = entry.get("error") or f"HTTP {response.get('status_code')}"
+                yield entry["custom_id"], None, str(error)
+                continue
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                yield entry["custom_id"], None, "批量结果缺少回复内容"
+                continue
+            metrics.add_usage(response["body"].get("usage"))
+            yield entry["custom_id"], content, None
+
+
+def wait_for_batch(backend, batch_id, poll_interval=DEFAULT_POLL_INTERVAL):
+    """轮询直到批次结束，返回最终状态"""
+    last = None
+    while True:
+        status = backend.status(batch_id)
+        report = (status["state"], status.get("completed"), status.get("total"))
+        if report != last:
+            progress = f" {status['completed']}/{status['total']}" if status.get("total") else ""
+            print(f"  ⏳ 批次 {batch_id}: {status['state']}{progress}")
+            last = report
+        if status["state"] in TERMINAL_STATES:
+            return status["state"]
+        time.sleep(poll_interval)
+
+# ==========================================
+# OpenAI 兼容的批量接口
+# ==========================================
+class OpenAIBatchBackend:
+    """上传输入文件 → 创建 batch → 轮询 → 下载输出文件（24 小时完成窗口）"""
+
+    def __init__(self, base_url, api_key, http):
+        self.base_url = base_url.rstrip('/')
+        self.http = http
+        self.auth = {"Authorization": f"Bearer {api_key}"}
+
+    def submit(self, input_path):
+        with open(input_path, 'rb') as f:
+            response = self.http.post(f"{self.base_url}/files", headers=self.auth,
+                                      data={"purpose": "batch"},
+                                      files={"file": (os.path.basename(input_path), f, "application/jsonl")})
+        response.raise_for_status()
+        response = self.http.post(f"{self.base_url}/batches", headers=self.auth, json={
+            "input_file_id": response.json()["id"],
+            "endpoint": CHAT_ENDPOINT,
+            "completion_window": "24h"
+        })
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def _batch(self, batch_id):
+        response = self.http.get(f"{self.base_url}/batches/{batch_id}", headers=self.auth)
+        response.raise_for_status()
+        return response.json()
+
+    def status(self, batch_id):
+        batch = self._batch(batch_id)
+        counts = batch.get("request_counts") or {}
+        return {"state": batch["status"], "completed": counts.get("completed", 0) + counts.get("failed", 0),
+                "total": counts.get("total", 0)}
+
+    def fetch(self, batch_id, dest_path):
+        """下载输出文件（以及失败请求的错误文件）合并到 dest_path"""
+        batch = self._batch(batch_id)
+        with open(dest_path, 'wb') as out:
+            for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                if not file_id:
+                    continue
+                response = self.http.get(f"{self.base_url}/files/{file_id}/content", headers=self.auth)
+                response.raise_for_status()
+                out.write(response.content)
+                if not response.content.endswith(b"\n"):
+                    out.write(b"\n")
+        return dest_path
+
+# ==========================================
+# 本地目录模拟
+# ==========================================
+class LocalBatchBackend:
+    """
+    directory/<batch_id>/input.jsonl 为提交的请求，output.jsonl 出现即视为完成。
+    传入 responder(请求体) -> (HTTP 状态码, 响应体) 时，在第一次查询状态时就地处理整批；
+    否则等待外部进程（python batch_api.py --process-local）写出结果。
+    """
+
+    def __init__(self, directory, responder=None):
+        self.directory = directory
+        self.responder = responder
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, batch_id, name):
+        return os.path.join(self.directory, batch_id, name)
+
+    def submit(self, input_path):
+        batch_id = "local-" + uuid.uuid4().hex[:12]
+        os.makedirs(os.path.join(self.directory, batch_id))
+        shutil.copyfile(input_path, self._path(batch_id, 'input.jsonl'))
+        return batch_id
+
+    def status(self, batch_id):
+        if not os.path.exists(self._path(batch_id, 'input.jsonl')):
+            return {"state": "failed"}
+        if not os.path.exists(self._path(batch_id, 'output.jsonl')) and self.responder:
+            process_local_batch(self.directory, batch_id, self.responder)
+        if os.path.exists(self._path(batch_id, 'output.jsonl')):
+            return {"state": "completed"}
+        return {"state": "in_progress"}
+
+    def fetch(self, batch_id, dest_path):
+        shutil.copyfile(self._path(batch_id, 'output.jsonl'), dest_path)
+        return dest_path
+
+
+def process_local_batch(directory, batch_id, responder):
+    """逐条处理本地批次的请求，写出与 OpenAI 批量接口相同格式的 output.jsonl"""
+    batch_dir = os.path.join(directory, batch_id)
+    tmp_path = os.path.join(batch_dir, 'output.jsonl.tmp')
+    with open(os.path.join(batch_dir, 'input.jsonl'), 'r', encoding='utf-8') as f, \
+            open(tmp_path, 'w', encoding='utf-8') as out:
+        for line in f:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            try:
+                status_code, body = responder(request["body"])
+                entry = {"response": {"status_code": status_code, "body": body}, "error": None}
+            except Exception as e:
+                entry = {"response": None, "error": {"message": str(e)}}
+            entry = {"id": uuid.uuid4().hex, "custom_id": request["custom_id"], **entry}
+            out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    # 写完再改名，查询状态时不会读到半个结果文件
+    os.replace(tmp_path, os.path.join(batch_dir, 'output.jsonl'))
+
+
+def http_responder(http, url, api_key):
+    """把批量请求逐条转发给 chat/completions 接口的 responder"""
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+    def respond(body):
+        response = http.post(url, json=body, headers=headers)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+    return respond
+
+
+if __name__ == "__main__":
+    from http_client import get_client
+
+    parser = argparse.ArgumentParser(description="处理本地模拟的批次（逐条转发给 DEEPSEEK_BASE_URL）")
+    parser.add_argument("--process-local", metavar="DIR", required=True, help="LocalBatchBackend 的目录")
+    args = parser.parse_args()
+
+    url = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1/chat/completions")
+    responder = http_responder(get_client(), url, os.environ.get("DEEPSEEK_API_KEY", ""))
+    for batch_id in sorted(os.listdir(args.process_local)):
+        batch_dir = os.path.join(args.process_local, batch_id)
+        if os.path.exists(os.path.join(batch_dir, 'input.jsonl')) and \
+                not os.path.exists(os.path.join(batch_dir, 'output.jsonl')):
+            print(f"⚙️ 处理批次 {batch_id}")
+            process_local_batch(args.process_local, batch_id, responder)
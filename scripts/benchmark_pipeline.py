@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+内容流水线压测：生成指定规模的合成 RAG_books 语料，启动本地模拟 LLM 服务器，
+在临时目录里端到端跑一遍 建索引（Chunk 切分 + 章节提取）→ 生成 books → 出题 → 去重 → 导出，
+报告各阶段耗时、吞吐（条/秒）、出题请求的 p50 / p95 延迟和峰值内存。
+传入 --baseline 时与之前保存的结果比较，吞吐下降超过 --tolerance 即以非零状态退出，用于在夜间任务前发现性能回退。
+
+    python benchmark_pipeline.py --books 50 --chapters 20 --mock-latency 0.2 --workers 8 --json bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import corpus
+import metrics
+import quiz_engine
+import run_journal
+import generate_books_db
+import generate_quiz_pool
+import dedup_quiz_pool
+import export_quiz_pool
+from quiz_engine import add_engine_arguments, configure
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+CHARS = "天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏闰余成岁律吕调阳云腾致雨露结为霜金生丽水玉出昆冈"
+
+# ==========================================
+# 合成语料
+# ==========================================
+def make_corpus(directory, books, chapters, chapter_chars, marker_ratio=0.3, long_ratio=0.05, seed=0):
+    """
+    生成 books 本书：每本约 chapters 章、每章约 chapter_chars 字。
+    marker_ratio 的书用 ===CHUNK=== 分隔，其余按「## 」标题切分；long_ratio 的章节长度为平均的 10 倍（触发切分）。
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for b in range(books):
+        parts = []
+        for c in range(max(1, int(rng.gauss(chapters, chapters / 4)))):
+            size = chapter_chars * (10 if rng.random() < long_ratio else 1)
+            paragraphs = []
+            while size > 0:
+                n = min(size, rng.randint(60, 300))
+                paragraphs.append("".join(rng.choice(CHARS) for _ in range(n)) + "。")
+                size -= n
+            parts.append(f"## 第{c + 1}回 合成章节{c + 1}\n\n" + "\n\n".join(paragraphs) + "\n")
+        use_marker = rng.random() < marker_ratio
+        body = ("===CHUNK===\n" if use_marker else "").join(parts)
+        name = f"RAG_合成书{b:04d}_原著完整版.md" if b % 2 else f"合成书{b:04d}.md"
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            f.write(body)
+
+# ==========================================
+# 模拟服务器
+# ==========================================
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(args):
+    port = free_port()
+    cmd = [sys.executable, os.path.join(SCRIPTS_DIR, "mock_llm_server.py"), "--port", str(port),
+           "--latency", str(args.mock_latency), "--jitter", str(args.mock_jitter),
+           "--error-rate", str(args.mock_error_rate), "--rate-limit", str(args.mock_429_rate),
+           "--rpm-limit", str(args.mock_rpm_limit)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base + "/stats", timeout=1).read()
+            return proc, base
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise SystemExit("❌ 模拟服务器启动失败")
+
+# ==========================================
+# 计时
+# ==========================================
+def peak_rss_mb():
+    """本进程及已结束子进程（扫描进程池）的峰值常驻内存"""
+    # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(own / 2 ** 20, 1), round(children / 2 ** 20, 1)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values) + 0.5)) - 1))]
+
+
+def timed_requests(latencies):
+    """包装引擎的请求函数，记录每次调用（含重试和退避）的耗时"""
+    def wrap(fn):
+        def timed(*a, **kw):
+            start = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                latencies.append(time.perf_counter() - start)
+        return timed
+    quiz_engine.chat_completion = wrap(quiz_engine.chat_completion)
+    quiz_engine.stream_completion = wrap(quiz_engine.stream_completion)
+
+
+def run_stage(results, name, fn, count_items, verbose=False, latencies=None):
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with sink:
+        fn()
+    elapsed = time.perf_counter() - start
+    items = count_items()
+    rss, children_rss = peak_rss_mb()
+    row = {"stage": name, "seconds": round(elapsed, 3), "items": items,
+           "items_per_sec": round(items / elapsed, 2) if elapsed else None,
+           "peak_rss_mb": rss, "children_peak_rss_mb": children_rss}
+    if latencies is not None:
+        row["requests"] = len(latencies)
+        row["p50_ms"] = round(percentile(latencies, 50) * 1000, 1) if latencies else None
+        row["p95_ms"] = round(percentile(latencies, 95) * 1000, 1) if latencies else None
+    results.append(row)
+    print(f"  {name:<10} {row['seconds']:>8.2f}s {items:>8} 条 {row['items_per_sec'] or 0:>10.1f} 条/s"
+          + (f"   p50 {row['p50_ms']} ms  p95 {row['p95_ms']} ms" if latencies else "")
+          + f"   峰值内存 {rss} MB")
+
+
+def count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+# ==========================================
+# 主流程
+# ==========================================
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="quiz_bench_")
+    books_dir = os.path.join(workdir, "RAG_books")
+    cache_dir = os.path.join(workdir, ".cache")
+    if os.path.exists(books_dir):
+        shutil.rmtree(books_dir)
+    print(f"📁 工作目录: {workdir}")
+    make_corpus(books_dir, args.books, args.chapters, args.chapter_chars, args.marker_ratio, args.long_ratio, args.seed)
+
+    # 所有输出和缓存都放进工作目录，不碰仓库里的文件
+    corpus.CACHE_DIR = cache_dir
+    run_journal.RUNS_DIR = os.path.join(cache_dir, "runs")
+    quiz_engine.BATCH_WORK_DIR = os.path.join(cache_dir, "batches")
+    # --batch-dir 的默认值在导入 quiz_engine 时就定成了仓库里的目录，没有显式指定时同样改到工作目录
+    if args.batch_dir == quiz_engine.DEFAULT_LOCAL_BATCH_DIR:
+        args.batch_dir = os.path.join(quiz_engine.BATCH_WORK_DIR, "local")
+    books_file = os.path.join(workdir, "database_books_import.json")
+    pool_file = os.path.join(workdir, "database_export_batch.json")
+    export_file = os.path.join(workdir, "database_questions_import.json")
+    generate_books_db.RAG_DIR = books_dir
+    generate_books_db.OUTPUT_PATH = books_file
+    generate_quiz_pool.INPUT_DIR = books_dir
+    generate_quiz_pool.OUTPUT_FILE = pool_file
+    generate_quiz_pool.MANIFEST_FILE = pool_file + ".manifest.json"
+    dedup_quiz_pool.OUTPUT_FILE = pool_file
+    export_quiz_pool.OUTPUT_FILE = pool_file
+    export_quiz_pool.BOOKS_FILE = books_file
+    export_quiz_pool.EXPORT_FILE = export_file
+    export_quiz_pool.COVERAGE_FILE = export_file + ".coverage.json"
+    export_quiz_pool.INDEXES_FILE = export_file + ".indexes.json"
+
+    proc, base = start_mock(args)
+    quiz_engine.BASE_URL = base + "/v1/chat/completions"
+    results = []
+    latencies = []
+    try:
+        print(f"🧪 模拟服务器 {base}（延迟 {args.mock_latency}s，5xx {args.mock_error_rate:.0%}，429 {args.mock_429_rate:.0%}）")
+        index_holder = {}
+
+        def build_index():
+            index_holder["index"] = corpus.CorpusIndex.build(books_dir, full=True, jobs=args.jobs)
+
+        run_stage(results, "index", build_index,
+                  lambda: sum(len(e["chunks"]) for e in index_holder["index"].files.values()), args.verbose)
+        run_stage(results, "books_db", lambda: generate_books_db.main(jobs=args.jobs),
+                  lambda: count_lines(books_file), args.verbose)
+
+        # 出题时的书名映射以刚生成的 books 文件为准
+        corpus.BOOKS_IMPORT_FILE = books_file
+        corpus._title_matcher = None
+        # 引擎指标并入压测结果，不写仓库里的运行报告
+        args.metrics_file = None
+        configure(args)
+        timed_requests(latencies)
+        run_stage(results, "generate", lambda: generate_quiz_pool.main(args.workers, full=True),
+                  lambda: count_lines(pool_file), args.verbose, latencies)
+        run_stage(results, "dedup", lambda: dedup_quiz_pool.main(apply=True),
+                  lambda: sum(len(json.loads(line)["questions"]) for line in open(pool_file, encoding='utf-8')
+                              if line.strip()), args.verbose)
+        run_stage(results, "export", export_quiz_pool.main, lambda: count_lines(export_file), args.verbose)
+
+        stats = json.loads(urllib.request.urlopen(base + "/stats", timeout=5).read())
+        print(f"📡 模拟服务器收到 {stats['requests']} 个请求：成功 {stats['ok']}，5xx {stats['errors']}，429 {stats['throttled']}")
+    finally:
+        proc.terminate()
+        proc.wait()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {"config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")}, "stages": results,
+            "metrics": metrics.METRICS.snapshot()}
+
+
+def compare(report, baseline_path, tolerance):
+    """吞吐低于基线 (1 - tolerance) 倍的阶段视为回退，返回回退的阶段列表"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {row["stage"]: row for row in json.load(f)["stages"]}
+    regressions = []
+    for row in report["stages"]:
+        base = baseline.get(row["stage"])
+        if not base or not base.get("items_per_sec") or not row.get("items_per_sec"):
+            continue
+        ratio = row["items_per_sec"] / base["items_per_sec"]
+        flag = "⚠️ 回退" if ratio < 1 - tolerance else "✅"
+        print(f"  {flag} {row['stage']:<10} {base['items_per_sec']:>10.1f} → {row['items_per_sec']:>10.1f} 条/s ({ratio:.0%})")
+        if ratio < 1 - tolerance:
+            regressions.append(row["stage"])
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    corpus_args = parser.add_argument_group("合成语料")
+    corpus_args.add_argument("--books", type=int, default=20)
+    corpus_args.add_argument("--chapters", type=int, default=15, help="每本书的平均章节数")
+    corpus_args.add_argument("--chapter-chars", type=int, default=1500, help="每章的平均字数")
+    corpus_args.add_argument("--marker-ratio", type=float, default=0.3, help="用 ===CHUNK=== 分隔的书的比例")
+    corpus_args.add_argument("--long-ratio", type=float, default=0.05, help="超长章节（10 倍长度）的比例")
+    corpus_args.add_argument("--seed", type=int, default=0)
+
+    mock_args = parser.add_argument_group("模拟服务器")
+    mock_args.add_argument("--mock-latency", type=float, default=0.1)
+    mock_args.add_argument("--mock-jitter", type=float, default=0.03)
+    mock_args.add_argument("--mock-error-rate", type=float, default=0.0)
+    mock_args.add_argument("--mock-429-rate", type=float, default=0.0)
+    mock_args.add_argument("--mock-rpm-limit", type=int, default=0)
+
+    engine_args = parser.add_argument_group("出题引擎")
+    add_engine_arguments(engine_args)
+    # 压测默认不走缓存、不受真实 API 的 RPM 预算限制
+    parser.set_defaults(rpm=100000, no_cache=True)
+
+    parser.add_argument("--jobs", type=int, default=corpus.DEFAULT_SCAN_JOBS, help="扫描语料的进程数")
+    parser.add_argument("--workdir", help="工作目录（默认临时目录，跑完删除）")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录")
+    parser.add_argument("--verbose", action="store_true", help="显示各阶段自身的输出")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 结果比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的吞吐下降比例 (默认 0.2)")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    report = run(args)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已写入 {args.json}")
+    if args.baseline:
+        regressions = compare(report, args.baseline, args.tolerance)
+        if regressions:
+            raise SystemExit(f"❌ 性能回退: {', '.join(regressions)}")
@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+把 assets/icons 下的 SVG 图标栅格化成 app.json tabBar 引用的 PNG（取代原来的纯色占位图标脚本）。
+- 需要生成哪些 PNG 直接读 app.json 的 tabBar.list（iconPath / selectedIconPath），对应同名的 SVG
+- 栅格化用 NumPy 整批计算：描边按像素到线段的距离算覆盖率（round 端点 / 拐角，现有图标都是 round），
+  填充按 4×4 超采样的环绕数计算，不依赖 cairo 等本地库
+- PNG 编码逐扫描线整批过滤：5 种过滤器 + 按行自适应一次算完，再在调色板 / 灰度 / 真彩色几种
+  模式里挑压缩后最小的，减小小程序包体积
+- 多个图标并行渲染；SVG 内容、尺寸和渲染器版本都没变、输出文件也没被改过的图标直接跳过
+
+    python build_assets.py              # 增量构建
+    python build_assets.py --full       # 全部重新生成
+"""
+import os
+import re
+import json
+import math
+import time
+import zlib
+import struct
+import hashlib
+import argparse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from source_manifest import file_sha256
+
+# ==========================================
+# 配置区域
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_JSON = os.path.join(BASE_DIR, 'app.json')
+SVG_DIR = os.path.join(BASE_DIR, 'assets', 'icons')
+MANIFEST_PATH = os.path.join(BASE_DIR, '.cache', 'asset_manifest.json')
+# 微信建议 tabBar 图标 81×81 px
+DEFAULT_SIZE = 81
+DEFAULT_JOBS = os.cpu_count() or 1
+# 渲染或编码逻辑变化时加 1，让已有输出全部失效
+RENDER_VERSION = 1
+# 曲线展平的最大弦高误差（像素）
+FLATTEN_TOLERANCE = 0.05
+# 填充的超采样倍数（每个像素 N×N 个采样点）
+FILL_SUPERSAMPLE = 4
+# 距离计算时 (像素数 × 线段数) 的分块上限，控制内存
+_BLOCK_ELEMENTS = 1 << 22
+
+_NAMED_COLORS = {"black": (0, 0, 0), "white": (255, 255, 255), "currentcolor": (0, 0, 0)}
+_NUMBER_RE = re.compile(r'[-+]?(?:\d*\.\d+|\d+\.?)(?:[eE][-+]?\d+)?')
+_STYLE_ATTRS = ("fill", "stroke", "stroke-width", "fill-rule")
+
+
+# ==========================================
+# SVG 解析：元素 → 折线（用户坐标）
+# ==========================================
+def parse_color(value):
+    """返回 (r, g, b)，none / transparent 返回 None"""
+    value = (value or "none").strip().lower()
+    if value in ("none", "transparent"):
+        return None
+    if value in _NAMED_COLORS:
+        return _NAMED_COLORS[value]
+    if value.startswith("#"):
+        hexpart = value[1:]
+        if len(hexpart) == 3:
+            hexpart = "".join(ch * 2 for ch in hexpart)
+        return tuple(int(hexpart[i:i + 2], 16) for i in (0, 2, 4))
+    raise ValueError(f"不支持的颜色: {value}")
+
+
+def _segments_for(length, tolerance, radius=None):
+    """按弦高误差决定曲线分成几段"""
+    if radius:
+        step = 2 * math.acos(max(-1.0, 1 - tolerance / radius)) if radius > tolerance else math.pi
+        return max(8, math.ceil(2 * math.pi / step))
+    return max(4, math.ceil(math.sqrt(length / tolerance) / 2))
+
+
+def _arc_points(p0, rx, ry, phi, large, sweep, p1, tolerance):
+    """SVG 椭圆弧（端点参数）→ 采样点，不含起点。换算见 SVG 规范附录 F.6.5"""
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0 or np.allclose(p0, p1):
+        return np.array([p1])
+    cos_phi, sin_phi = math.cos(math.radians(phi)), math.sin(math.radians(phi))
+    dx, dy = (p0[0] - p1[0]) / 2, (p0[1] - p1[1]) / 2
+    x1 = cos_phi * dx + sin_phi * dy
+    y1 = -sin_phi * dx + cos_phi * dy
+    scale = (x1 / rx) ** 2 + (y1 / ry) ** 2
+    if scale > 1:
+        rx, ry = rx * math.sqrt(scale), ry * math.sqrt(scale)
+    num = rx * rx * ry * ry - rx * rx * y1 * y1 - ry * ry * x1 * x1
+    den = rx * rx * y1 * y1 + ry * ry * x1 * x1
+    coef = math.sqrt(max(0.0, num / den)) * (-1 if large == sweep else 1)
+    cx1, cy1 = coef * rx * y1 / ry, -coef * ry * x1 / rx
+    cx = cos_phi * cx1 - sin_phi * cy1 + (p0[0] + p1[0]) / 2
+    cy = sin_phi * cx1 + cos_phi * cy1 + (p0[1] + p1[1]) / 2
+    theta1 = math.atan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+    delta = math.atan2((-y1 - cy1) / ry, (-x1 - cx1) / rx) - theta1
+    if sweep and delta < 0:
+        delta += 2 * math.pi
+    elif not sweep and delta > 0:
+        delta -= 2 * math.pi
+    n = max(2, math.ceil(_segments_for(0, tolerance, max(rx, ry)) * abs(delta) / (2 * math.pi)))
+    t = theta1 + delta * np.arange(1, n + 1) / n
+    ex, ey = rx * np.cos(t), ry * np.sin(t)
+    points = np.stack([cos_phi * ex - sin_phi * ey + cx, sin_phi * ex + cos_phi * ey + cy], axis=1)
+    points[-1] = p1
+    return points
+
+
+def _bezier_points(controls, tolerance):
+    """二次 / 三次贝塞尔曲线 → 采样点，不含起点"""
+    controls = np.asarray(controls, dtype=float)
+    n = _segments_for(np.linalg.norm(np.diff(controls, axis=0), axis=1).sum(), tolerance)
+    t = (np.arange(1, n + 1) / n)[:, None]
+    if len(controls) == 3:
+        p0, p1, p2 = controls
+        return (1 - t) ** 2 * p0 + 2 * (1 - t) * t * p1 + t ** 2 * p2
+    p0, p1, p2, p3 = controls
+    return (1 - t) ** 3 * p0 + 3 * (1 - t) ** 2 * t * p1 + 3 * (1 - t) * t ** 2 * p2 + t ** 3 * p3
+
+
+class _PathReader:
+    """按 SVG path 语法逐个读取命令和参数（弧线标志位可以不带分隔符，如 a2 2 0 012 2）"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def _skip(self):
+        while self.pos < len(self.data) and self.data[self.pos] in " \t\r\n,":
+            self.pos += 1
+
+    def at_number(self):
+        self._skip()
+        return self.pos < len(self.data) and (self.data[self.pos].isdigit() or self.data[self.pos] in "+-.")
+
+    def command(self):
+        self._skip()
+        if self.pos >= len(self.data):
+            return None
+        ch = self.data[self.pos]
+        if not ch.isalpha():
+            raise ValueError(f"path 第 {self.pos} 个字符处应为命令: {self.data[self.pos:self.pos + 10]}")
+        self.pos += 1
+        return ch
+
+    def number(self):
+        self._skip()
+        match = _NUMBER_RE.match(self.data, self.pos)
+        if not match:
+            raise ValueError(f"path 第 {self.pos} 个字符处应为数字: {self.data[self.pos:self.pos + 10]}")
+        self.pos = match.end()
+        return float(match.group())
+
+    def flag(self):
+        self._skip()
+        ch = self.data[self.pos:self.pos + 1]
+        if ch not in ("0", "1"):
+            raise ValueError(f"path 第 {self.pos} 个字符处应为弧线标志 0/1")
+        self.pos += 1
+        return ch == "1"
+
+
+def parse_path(data, tolerance):
+    """path 的 d 属性 → [(点数组, 是否闭合)]"""
+    reader = _PathReader(data)
+    subpaths = []
+    points = []
+    current = np.zeros(2)
+    start = np.zeros(2)
+    last_control = None  # 上一段的控制点（S / T 用）
+    last_command = ""
+
+    def finish(closed):
+        if points:
+            subpaths.append((np.array(points), closed))
+
+    command = reader.command()
+    while command:
+        relative = command.islower()
+        kind = command.upper()
+        first = True
+        while first or reader.at_number():
+            base = current if relative else np.zeros(2)
+            if kind == "Z":
+                finish(True)
+                points = []
+                current = start.copy()
+                last_control = None
+                break
+            if kind == "M":
+                target = base + (reader.number(), reader.number())
+                if first:
+                    finish(False)
+                    points = [target]
+                    start = target
+                else:  # M 后面多出的坐标按 L 处理
+                    points.append(target)
+                current = target
+                last_control = None
+            elif kind in "LHV":
+                if kind == "L":
+                    target = base + (reader.number(), reader.number())
+                elif kind == "H":
+                    target = np.array([reader.number() + (current[0] if relative else 0), current[1]])
+                else:
+                    target = np.array([current[0], reader.number() + (current[1] if relative else 0)])
+                if not points:
+                    points = [current]
+                points.append(target)
+                current = target
+                last_control = None
+            elif kind in "CSQT":
+                if kind == "C":
+                    c1 = base + (reader.number(), reader.number())
+                elif kind == "S" or kind == "T":
+                    smooth = last_command in (("C", "S") if kind == "S" else ("Q", "T"))
+                    c1 = 2 * current - last_control if smooth and last_control is not None else current
+                else:
+                    c1 = base + (reader.number(), reader.number())
+                if kind in "CS":
+                    c2 = base + (reader.number(), reader.number())
+                    target = base + (reader.number(), reader.number())
+                    controls = [current, c1, c2, target]
+                    last_control = c2
+                else:
+                    target = base + (reader.number(), reader.number())
+                    controls = [current, c1, target]
+                    last_control = c1
+                if not points:
+                    points = [current]
+                points.extend(_bezier_points(controls, tolerance))
+                current = target
+            else:  # A
+                rx, ry, phi = reader.number(), reader.number(), reader.number()
+                large, sweep = reader.flag(), reader.flag()
+                target = base + (reader.number(), reader.number())
+                if not points:
+                    points = [current]
+                points.extend(_arc_points(current, rx, ry, phi, large, sweep, target, tolerance))
+                current = target
+                last_control = None
+            last_command = kind
+            first = False
+        last_command = kind
+        command = reader.command()
+    finish(False)
+    return subpaths
+
+
+def _numbers(value):
+    return [float(v) for v in _NUMBER_RE.findall(value or "")]
+
+
+def element_subpaths(element, tolerance):
+    """单个图形元素 → [(点数组, 是否闭合)]，非图形元素返回 []"""
+    tag = element.tag.rsplit('}', 1)[-1]
+    get = lambda name: float(element.get(name, 0))
+    if tag == "path":
+        return parse_path(element.get("d", ""), tolerance)
+    if tag in ("polyline", "polygon"):
+        coords = _numbers(element.get("points"))
+        points = np.array(coords[:len(coords) // 2 * 2], dtype=float).reshape(-1, 2)
+        return [(points, tag == "polygon")] if len(points) else []
+    if tag == "line":
+        return [(np.array([[get("x1"), get("y1")], [get("x2"), get("y2")]]), False)]
+    if tag in ("circle", "ellipse"):
+        rx = get("r") if tag == "circle" else get("rx")
+        ry = get("r") if tag == "circle" else get("ry")
+        n = _segments_for(0, tolerance, max(rx, ry))
+        t = 2 * math.pi * np.arange(n) / n
+        return [(np.stack([get("cx") + rx * np.cos(t), get("cy") + ry * np.sin(t)], axis=1), True)]
+    if tag == "rect":
+        if element.get("rx") or element.get("ry"):
+            rx = get("rx") or get("ry")
+            ry = get("ry") or rx
+            x, y, w, h = get("x"), get("y"), get("width"), get("height")
+            d = (f"M{x + rx} {y}H{x + w - rx}A{rx} {ry} 0 0 1 {x + w} {y + ry}V{y + h - ry}"
+                 f"A{rx} {ry} 0 0 1 {x + w - rx} {y + h}H{x + rx}A{rx} {ry} 0 0 1 {x} {y + h - ry}"
+                 f"V{y + ry}A{rx} {ry} 0 0 1 {x + rx} {y}Z")
+            return parse_path(d, tolerance)
+        x, y, w, h = get("x"), get("y"), get("width"), get("height")
+        return [(np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]]), True)]
+    return []
+
+
+def load_svg(path, size):
+    """
+    解析 SVG，返回 [(subpaths, style)]，坐标已换算到 size×size 像素。
+    style 为继承后的 fill / stroke / stroke-width / fill-rule。
+    """
+    root = ET.parse(path).getroot()
+    view_box = _numbers(root.get("viewBox")) or [0, 0, float(root.get("width", size)), float(root.get("height", size))]
+    min_x, min_y, vb_w, vb_h = view_box
+    scale = size / max(vb_w, vb_h)
+    offset = np.array([min_x, min_y]) - (np.array([max(vb_w, vb_h)] * 2) - (vb_w, vb_h)) / 2
+    tolerance = FLATTEN_TOLERANCE / scale
+    shapes = []
+
+    def walk(element, inherited):
+        if element.get("transform"):
+            raise ValueError(f"{os.path.basename(path)}: 不支持 transform 属性")
+        style = dict(inherited)
+        style.update({k: element.get(k) for k in _STYLE_ATTRS if element.get(k) is not None})
+        for decl in (element.get("style") or "").split(";"):
+            if ":" in decl:
+                k, v = (s.strip() for s in decl.split(":", 1))
+                if k in _STYLE_ATTRS:
+                    style[k] = v
+        subpaths = element_subpaths(element, tolerance)
+        if subpaths:
+            shapes.append(([((pts - offset) * scale, closed) for pts, closed in subpaths],
+                           {**style, "stroke-width": float(style["stroke-width"]) * scale}))
+        for child in element:
+            walk(child, style)
+
+    walk(root, {"fill": "black", "stroke": "none", "stroke-width": "1", "fill-rule": "nonzero"})
+    return shapes
+
+
+# ==========================================
+# 栅格化
+# ==========================================
+def stroke_coverage(subpaths, width, size):
+    """描边覆盖率：像素中心到最近线段的距离 d，覆盖率 = clip(半线宽 - d + 0.5, 0, 1)"""
+    starts, ends = [], []
+    for points, closed in subpaths:
+        if closed:
+            points = np.vstack([points, points[:1]])
+        if len(points) == 1:
+            points = np.vstack([points, points])  # 单点按圆点画（round 端点）
+        starts.append(points[:-1])
+        ends.append(points[1:])
+    a, b = np.vstack(starts), np.vstack(ends)
+    centers = (np.indices((size, size))[::-1].reshape(2, -1).T + 0.5)
+    dist = np.full(len(centers), np.inf)
+    ab = b - a
+    ab_len2 = np.maximum((ab ** 2).sum(axis=1), 1e-12)
+    block = max(1, _BLOCK_ELEMENTS // len(centers))
+    for i in range(0, len(a), block):
+        ap = centers[:, None, :] - a[None, i:i + block]
+        t = np.clip((ap * ab[None, i:i + block]).sum(axis=2) / ab_len2[None, i:i + block], 0, 1)
+        nearest = ap - t[..., None] * ab[None, i:i + block]
+        dist = np.minimum(dist, np.sqrt((nearest ** 2).sum(axis=2)).min(axis=1))
+    return np.clip(width / 2 - dist + 0.5, 0, 1).reshape(size, size)
+
+
+def fill_coverage(subpaths, even_odd, size):
+    """填充覆盖率：N×N 超采样点上的环绕数（所有子路径按闭合处理）"""
+    edges = [(pts, np.roll(pts, -1, axis=0)) for pts, _ in subpaths if len(pts) > 2]
+    if not edges:
+        return np.zeros((size, size))
+    a = np.vstack([e[0] for e in edges])
+    b = np.vstack([e[1] for e in edges])
+    n = FILL_SUPERSAMPLE
+    offsets = (np.arange(n) + 0.5) / n
+    xs = (np.arange(size)[:, None] + offsets).ravel()
+    ys = xs.copy()
+    winding = np.zeros((len(ys), len(xs)), dtype=np.int32)
+    py = ys[:, None]
+    block = max(1, _BLOCK_ELEMENTS // (len(xs) * len(ys)))
+    for i in range(0, len(a), block):
+        (x0, y0), (x1, y1) = a[i:i + block].T, b[i:i + block].T
+        # 向上穿过的边 +1、向下 -1（水平边不会满足条件）
+        crosses = ((y0 <= py) & (py < y1)) | ((y1 <= py) & (py < y0))
+        x_cross = x0 + (py - y0) * (x1 - x0) / np.where(y1 == y0, 1, y1 - y0)
+        direction = np.where(y1 > y0, 1, -1) * crosses
+        winding += (direction[:, :, None] * (xs[None, None, :] < x_cross[:, :, None])).sum(axis=1)
+    inside = (winding % 2 == 1) if even_odd else (winding != 0)
+    return inside.reshape(size, n, size, n).mean(axis=(1, 3))
+
+
+def render_svg(path, size):
+    """SVG → (size, size, 4) 的 RGBA uint8 数组（非预乘 alpha，完全透明处 RGB 置 0）"""
+    rgb = np.zeros((size, size, 3))
+    alpha = np.zeros((size, size))
+    for subpaths, style in load_svg(path, size):
+        layers = []
+        fill = parse_color(style["fill"])
+        if fill:
+            layers.append((fill, fill_coverage(subpaths, style["fill-rule"] == "evenodd", size)))
+        stroke = parse_color(style["stroke"])
+        if stroke and style["stroke-width"] > 0:
+            layers.append((stroke, stroke_coverage(subpaths, style["stroke-width"], size)))
+        for color, coverage in layers:
+            rgb = np.asarray(color, dtype=float) * coverage[..., None] + rgb * (1 - coverage[..., None])
+            alpha = coverage + alpha * (1 - coverage)
+    out = np.zeros((size, size, 4), dtype=np.uint8)
+    visible = alpha > 0
+    out[visible, :3] = np.round(rgb[visible] / alpha[visible, None])
+    out[..., 3] = np.round(alpha * 255)
+    out[out[..., 3] == 0] = 0
+    return out
+
+
+# ==========================================
+# PNG 编码
+# ==========================================
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def filter_scanlines(raw, bpp):
+    """
+    raw: (行数, 每行字节数) uint8 的未过滤扫描线。
+    返回 (5, 行数, 每行字节数)：None / Sub / Up / Average / Paeth 过滤后的整幅数据。
+    预测值只依赖原始字节，5 种过滤器都能整幅一次算完。
+    """
+    x = raw.astype(np.int16)
+    left = np.zeros_like(x)
+    left[:, bpp:] = x[:, :-bpp]
+    up = np.zeros_like(x)
+    up[1:] = x[:-1]
+    up_left = np.zeros_like(x)
+    up_left[1:, bpp:] = x[:-1, :-bpp]
+    p = left + up - up_left
+    pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - up_left)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+    predictions = np.stack([np.zeros_like(x), left, up, (left + up) // 2, paeth])
+    return ((x[None] - predictions) & 0xFF).astype(np.uint8)
+
+
+def _compress_smallest(raw, bpp):
+    """逐一尝试 5 种统一过滤器和按行自适应（最小绝对值和），返回压缩后最小的 IDAT 数据"""
+    filtered = filter_scanlines(raw, bpp)
+    rows = np.arange(raw.shape[0])
+    scores = np.abs(filtered.view(np.int8).astype(np.int32)).sum(axis=2)
+    choices = [np.full(len(rows), f) for f in range(5)] + [scores.argmin(axis=0)]
+    best = None
+    for types in choices:
+        data = np.concatenate([types[:, None].astype(np.uint8), filtered[types, rows]], axis=1).tobytes()
+        for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED):
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+            compressed = compressor.compress(data) + compressor.flush()
+            if best is None or len(compressed) < len(best):
+                best = compressed
+    return best
+
+
+def _pack_bits(indices, depth):
+    """(行数, 宽) 的调色板下标按 depth 位打包成扫描线字节"""
+    if depth == 8:
+        return indices.astype(np.uint8)
+    per_byte = 8 // depth
+    height, width = indices.shape
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :width] = indices
+    shifts = (depth * np.arange(per_byte - 1, -1, -1)).astype(np.uint8)
+    return (padded.reshape(height, -1, per_byte) << shifts).sum(axis=2, dtype=np.uint16).astype(np.uint8)
+
+
+def encode_png(rgba):
+    """
+    RGBA 数组 → PNG 字节。候选模式：调色板（颜色不超过 256 种，位深取最小够用的）、
+    灰度 / 灰度 + alpha（R=G=B 时）、真彩色 / 真彩色 + alpha，逐一编码后取最小的。
+    """
+    height, width = rgba.shape[:2]
+    opaque = bool((rgba[..., 3] == 255).all())
+    candidates = []
+
+    def add(color_type, depth, raw, bpp, extra=b''):
+        ihdr = struct.pack('>IIBBBBB', width, height, depth, color_type, 0, 0, 0)
+        candidates.append(_chunk(b'IHDR', ihdr) + extra + _chunk(b'IDAT', _compress_smallest(raw, bpp)))
+
+    packed = rgba.reshape(-1, 4).view('>u4').ravel()
+    colors, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+    if len(colors) <= 256:
+        # 半透明的颜色排在前面，tRNS 只需覆盖到最后一个非不透明项；同组内按出现次数降序
+        palette_rgba = colors.view(np.uint8).reshape(-1, 4)
+        order = np.lexsort((-counts, palette_rgba[:, 3] == 255))
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        palette_rgba = palette_rgba[order]
+        indices = rank[inverse].reshape(height, width)
+        depth = next(d for d in (1, 2, 4, 8) if len(colors) <= 1 << d)
+        extra = _chunk(b'PLTE', palette_rgba[:, :3].tobytes())
+        translucent = int((palette_rgba[:, 3] < 255).sum())
+        if translucent:
+            extra += _chunk(b'tRNS', palette_rgba[:translucent, 3].tobytes())
+        add(3, depth, _pack_bits(indices, depth), 1, extra)
+    if (rgba[..., 0] == rgba[..., 1]).all() and (rgba[..., 1] == rgba[..., 2]).all():
+        channels = [0] if opaque else [0, 3]
+        add(0 if opaque else 4, 8, rgba[..., channels].reshape(height, -1), len(channels))
+    channels = [0, 1, 2] if opaque else [0, 1, 2, 3]
+    add(2 if opaque else 6, 8, rgba[..., channels].reshape(height, -1), len(channels))
+    return b'\x89PNG\r\n\x1a\n' + min(candidates, key=len) + _chunk(b'IEND', b'')
+
+
+# ==========================================
+# 构建
+# ==========================================
+def tab_icons(app_json=APP_JSON, svg_dir=SVG_DIR):
+    """app.json tabBar 引用的 PNG → [(SVG 路径, PNG 路径)]，SVG 与 PNG 同名"""
+    with open(app_json, 'r', encoding='utf-8') as f:
+        tab_bar = json.load(f).get("tabBar", {})
+    targets = []
+    for item in tab_bar.get("list", []):
+        for key in ("iconPath", "selectedIconPath"):
+            if item.get(key):
+                png = os.path.join(os.path.dirname(app_json), item[key])
+                svg = os.path.join(svg_dir, os.path.splitext(os.path.basename(png))[0] + '.svg')
+                targets.append((svg, png))
+    return targets
+
+
+def build_key(svg_path, size):
+    """输出失效的依据：SVG 内容、尺寸、渲染器版本"""
+    return hashlib.sha256(f"{file_sha256(svg_path)}|{size}|{RENDER_VERSION}".encode()).hexdigest()
+
+
+def render_icon(svg_path, png_path, size):
+    """渲染并写入一个图标（在子进程中运行），返回 (PNG 路径, 字节数)"""
+    data = encode_png(render_svg(svg_path, size))
+    os.makedirs(os.path.dirname(png_path), exist_ok=True)
+    tmp = png_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, png_path)
+    return png_path, len(data)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("outputs", {})
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 资源清单损坏，将全量重建 ({e})")
+        return {}
+
+
+def save_manifest(outputs, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({"version": RENDER_VERSION, "outputs": outputs}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def main(size=DEFAULT_SIZE, jobs=DEFAULT_JOBS, full=False):
+    targets = tab_icons()
+    missing = [svg for svg, _ in targets if not os.path.exists(svg)]
+    if missing:
+        print("❌ 找不到 SVG: " + ", ".join(os.path.relpath(p, BASE_DIR) for p in missing))
+        return
+    outputs = {} if full else load_manifest()
+    todo = []
+    before = 0
+    for svg, png in targets:
+        name = os.path.relpath(png, BASE_DIR)
+        key = build_key(svg, size)
+        entry = outputs.get(name)
+        if (entry and entry.get("key") == key and os.path.exists(png)
+                and file_sha256(png) == entry.get("sha256")):
+            continue
+        before += os.path.getsize(png) if os.path.exists(png) else 0
+        todo.append((svg, png, key))
+    print(f"🎨 共 {len(targets)} 个 tabBar 图标，{len(targets) - len(todo)} 个未变化，需要生成 {len(todo)} 个")
+    if not todo:
+        return
+
+    start = time.time()
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+            results = list(pool.map(render_icon, [t[0] for t in todo], [t[1] for t in todo], [size] * len(todo)))
+    else:
+        results = [render_icon(svg, png, size) for svg, png, _ in todo]
+
+    after = 0
+    for (svg, png, key), (_, length) in zip(todo, results):
+        outputs[os.path.relpath(png, BASE_DIR)] = {"key": key, "sha256": file_sha256(png), "bytes": length}
+        after += length
+        print(f"  ✓ {os.path.relpath(png, BASE_DIR)} ({length} B)")
+    save_manifest(outputs)
+    print(f"\n✅ 完成，用时 {time.time() - start:.2f}s；这些图标合计 {before} B → {after} B")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="把 SVG 图标栅格化为 tabBar PNG")
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE, help=f"输出边长 px (默认 {DEFAULT_SIZE})")
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS, help="并行进程数 (默认 CPU 核数)")
+    parser.add_argument('--full', action='store_true', help="忽略清单，全部重新生成")
+    args = parser.parse_args()
+    main(size=args.size, jobs=args.jobs, full=args.full)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+按 books 集合逐章生成离线内容（章节知识包、读后感引导问题等）时共用的工具：
+- chapter_sources：把 books.chapters 中的每个章节对应到语料索引里的段
+- source_excerpt：超长章节均匀抽取，控制送给模型的原文长度
+- iter_completed：与出题引擎相同的有界并发
+- load_existing：读取上一次的导入文件，供增量生成沿用
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from quiz_engine import DEFAULT_WORKERS
+from segmenter import count_tokens, split_text
+
+# 超长章节抽取的段数（首尾都会保留）
+EXCERPT_PARTS = 6
+
+
+def chapter_sources(index, books):
+    """
+    逐个产出 (书籍记录, 章节下标, 章节名, 文件名, 该章节的段列表)，顺序与 books.chapters 一致。
+    同一书名对应多个源文件时，取章节列表与 books 一致的那个（否则取章节最多的，同 generate_books_db 的去重）。
+    """
+    files_by_title = {}
+    for filename, entry in index.files.items():
+        files_by_title.setdefault(index.book_name(filename), []).append(filename)
+    for title, book in books.items():
+        candidates = files_by_title.get(title)
+        if not candidates:
+            continue
+        chapters = book.get('chapters') or []
+        filename = next((f for f in candidates if index.files[f]["chapters"] == chapters),
+                        max(candidates, key=lambda f: len(index.files[f]["chapters"])))
+        segments = index.segments(filename)
+        seen = set()
+        for chapter_index, chapter_name in enumerate(chapters):
+            # 重名章节的正文已合并在第一次出现处，_id 也只能有一个
+            if chapter_name in seen:
+                continue
+            seen.add(chapter_name)
+            matched = [s for s in segments if s["chapter"] == chapter_name]
+            if matched:
+                yield book, chapter_index, chapter_name, filename, matched
+
+
+def source_excerpt(text, max_tokens):
+    """超长章节按段落切分后均匀抽取若干部分（首尾都会保留），使总量不超过 max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    parts = split_text(text, max_tokens // EXCERPT_PARTS, 0)
+    if len(parts) <= EXCERPT_PARTS:
+        return "\n\n".join(parts)
+    step = (len(parts) - 1) / (EXCERPT_PARTS - 1)
+    return "\n\n……\n\n".join(parts[round(i * step)] for i in range(EXCERPT_PARTS))
+
+
+def iter_completed(work, jobs, workers=DEFAULT_WORKERS):
+    """与出题引擎相同的有界并发：同时在途不超过 workers 个，按完成顺序在调用方线程中产出 (job, work(job))"""
+    workers = max(1, workers)
+    jobs = iter(jobs)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+
+        def fill():
+            for job in jobs:
+                running[pool.submit(work, job)] = job
+                if len(running) >= workers:
+                    return
+
+        fill()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield running.pop(future), future.result()
+            fill()
+
+
+def load_existing(path):
+    """上一次输出的导入文件：{_id: 记录}，文件不存在返回空字典"""
+    existing = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    existing[record['_id']] = record
+    return existing
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+RAG_books 语料索引：所有脚本共用的 Chunk 切分规则、章节提取规则和书名映射。
+按行流式扫描文件，逐个产出 Chunk，内存占用只取决于最大的那个 Chunk，而不是整本书。
+
+CorpusIndex 把 书 → 章节 → Chunk（字节偏移 / 长度 / 哈希）整理成可序列化的索引并缓存到磁盘，
+只有内容变化的文件才会重新扫描；各脚本查询索引，按偏移按需读取 Chunk 正文，不再各自扫描目录。
+出题以「段」为单位：同一章节名下相邻的 Chunk 按 Token 数合并（见 segmenter），超长的段在出题时再切分。
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from segmenter import count_tokens, should_merge
+from source_manifest import SourceManifest, text_sha256
+from title_matcher import TitleMatcher
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BOOKS_IMPORT_FILE = os.path.join(REPO_DIR, 'database_books_import.json')
+CACHE_DIR = os.path.join(REPO_DIR, '.cache')
+
+# 重建索引时扫描文件的进程数
+DEFAULT_SCAN_JOBS = os.cpu_count() or 1
+
+CHUNK_MARKER = "===CHUNK==="
+# 过短的 Chunk（标语、空标题等）不出题
+MIN_CHUNK_CHARS = 50
+
+# 索引条目的格式版本，字段有增减时加一，旧缓存会自动重扫
+SCAN_VERSION = 2
+
+HEADER_RE = re.compile(r'^#+\s+(.+)$', re.MULTILINE)
+
+# 文件名中需要去掉的前后缀
+NAME_PREFIXES = ['RAG_']
+NAME_SUFFIXES = ['_原著完整版', '_全书完整版', '_完整试读版']
+
+# ==========================================
+# 书名映射
+# ==========================================
+_title_matcher = None
+
+
+def load_import_titles():
+    """读取 database_books_import.json 中的书名，构建书名匹配器（每个进程只构建一次）"""
+    global _title_matcher
+    if _title_matcher is None:
+        import_titles = []
+        try:
+            with open(BOOKS_IMPORT_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        import_titles.append(json.loads(line)['title'])
+        except Exception as e:
+            print(f"⚠️ 警告：无法加载 database_books_import.json 进行书名映射 ({e})")
+        _title_matcher = TitleMatcher(import_titles)
+    return _title_matcher
+
+
+def sanitize_book_name(raw_name):
+    """把文件名映射为 books 集合中的书名（题库里的 book_name）：完全相同优先，否则取文件名中出现的最长书名"""
+    matcher = load_import_titles()
+    if raw_name in matcher:
+        return raw_name
+    return matcher.longest_in(raw_name) or raw_name
+
+
+def normalize_book_name(filename):
+    """从文件名提取书名（books 集合里的 title）"""
+    name = os.path.splitext(filename)[0]
+    # 去除常见前后缀
+    for prefix in NAME_PREFIXES:
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    for suffix in NAME_SUFFIXES:
+        name = name.replace(suffix, '')
+    return name
+
+# ==========================================
+# Chunk 切分
+# ==========================================
+def has_chunk_marker(filepath):
+    """用 mmap 在文件中查找 ===CHUNK===，不把文件读进内存"""
+    if os.path.getsize(filepath) == 0:
+        return False
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm.find(CHUNK_MARKER.encode('utf-8')) != -1
+
+
+def decode_chunk(raw):
+    """字节 → 去掉首尾空白的文本（换行统一为 \\n，与文本模式读取一致）"""
+    return raw.decode('utf-8').replace('\r\n', '\n').strip()
+
+
+def _iter_raw_chunks(filepath, headers=None, digest=None):
+    """
+    按原出题脚本的规则产出非空 Chunk 的 (起始字节, 结束字节, 文本)：
+    文件含 ===CHUNK=== 时按此标志分割，否则在每个以「## 」开头的行前切分。
+    传入 headers={"h1": [], "h2": []} 时顺带收集一级/二级标题，供章节提取使用；
+    传入 digest（hashlib 对象）时顺带计算整个文件的哈希。
+    """
+    marker = CHUNK_MARKER.encode('utf-8')
+    use_marker = has_chunk_marker(filepath)
+    buf = []
+    start = 0
+    pos = 0
+
+    def flush(end):
+        text = decode_chunk(b"".join(buf))
+        return (start, end, text) if text else None
+
+    with open(filepath, 'rb') as f:
+        for line in f:
+            if digest is not None:
+                digest.update(line)
+            if headers is not None:
+                if line.startswith(b"## "):
+                    title = line[3:].rstrip(b"\r\n")
+                    if title:
+                        headers["h2"].append(title.decode('utf-8').strip())
+                elif line.startswith(b"# "):
+                    title = line[2:].rstrip(b"\r\n")
+                    if title:
+                        headers["h1"].append(title.decode('utf-8').strip())
+
+            if use_marker:
+                parts = line.split(marker)
+                buf.append(parts[0])
+                offset = pos + len(parts[0])
+                for part in parts[1:]:
+                    chunk = flush(offset)
+                    if chunk:
+                        yield chunk
+                    offset += len(marker)
+                    buf = [part]
+                    start = offset
+                    offset += len(part)
+            else:
+                if line.startswith(b"## ") and buf:
+                    chunk = flush(pos)
+                    if chunk:
+                        yield chunk
+                    buf = []
+                    start = pos
+                buf.append(line)
+            pos += len(line)
+
+    chunk = flush(pos)
+    if chunk:
+        yield chunk
+
+
+def chapter_name_for(chunk_text, index):
+    """章节名取 Chunk 内第一个 # 标题，没有标题则为「片段 N」（N 为该 Chunk 在全书中的序号）"""
+    header_match = HEADER_RE.search(chunk_text)
+    if header_match:
+        return header_match.group(1).strip()
+    return f"片段 {index + 1}"
+
+
+def iter_chunks(filepath, max_chunks=None, min_chars=MIN_CHUNK_CHARS):
+    """
+    逐个产出 (chapter_name, chunk_text)；短于 min_chars 的 Chunk 跳过。
+    产出 max_chunks 个后立即停止读取文件。
+    """
+    produced = 0
+    for index, (_, _, chunk_text) in enumerate(_iter_raw_chunks(filepath)):
+        if len(chunk_text) < min_chars:
+            continue
+        yield chapter_name_for(chunk_text, index), chunk_text
+        produced += 1
+        if max_chunks is not None and produced >= max_chunks:
+            return
+
+# ==========================================
+# 章节提取（books 集合的 chapters 字段）
+# ==========================================
+def chapters_from_headers(filename, h1, h2):
+    """按 books 集合的规则，从一级/二级标题列表得到章节列表"""
+    # RAG_ 前缀的大型书籍：只提取真正的章节标题（过滤掉 Section 子标题）
+    if filename.startswith('RAG_') and h2:
+        # 过滤：只保留中文章节标题（第X回、第X章、卷X 等），去掉 Section X
+        real_chapters = [h for h in h2
+                         if not h.startswith('Section')
+                         and not h.startswith('section')]
+        if real_chapters:
+            return real_chapters
+
+    # 普通文件：优先 ## 标题
+    if h2:
+        return list(h2)
+
+    # 其次 # 标题（多于一个才算分章）
+    if len(h1) > 1:
+        return list(h1)
+
+    # 如果没有标题格式，整篇算一章
+    name = os.path.splitext(filename)[0]
+    for prefix in NAME_PREFIXES + NAME_SUFFIXES:
+        name = name.replace(prefix, '')
+    return [name]
+
+
+def scan_file(filepath, digest=None):
+    """单次扫描文件，得到 Chunk 列表（含偏移和哈希）与章节列表"""
+    filename = os.path.basename(filepath)
+    headers = {"h1": [], "h2": []}
+    chunks = []
+    for index, (start, end, chunk_text) in enumerate(_iter_raw_chunks(filepath, headers, digest)):
+        if len(chunk_text) < MIN_CHUNK_CHARS:
+            continue
+        chunks.append({
+            "chapter": chapter_name_for(chunk_text, index),
+            "offset": start,
+            "length": end - start,
+            "chars": len(chunk_text),
+            "tokens": count_tokens(chunk_text),
+            "sha256": text_sha256(chunk_text)
+        })
+    return {
+        "scan_version": SCAN_VERSION,
+        "raw_name": os.path.splitext(filename)[0],
+        "title": normalize_book_name(filename),
+        "chapters": chapters_from_headers(filename, headers["h1"], headers["h2"]),
+        "chunks": chunks
+    }
+
+def scan_job(filepath):
+    """进程池任务：读一遍文件，同时得到 (指纹, scan_file 的结果)"""
+    stat = os.stat(filepath)
+    digest = hashlib.sha256()
+    derived = scan_file(filepath, digest)
+    return {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": digest.hexdigest()}, derived
+
+# ==========================================
+# 语料索引
+# ==========================================
+def default_index_path(input_dir):
+    digest = hashlib.sha1(os.path.abspath(input_dir).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(CACHE_DIR, f'corpus_index_{digest}.json')
+
+
+class CorpusIndex:
+    """
+    docs/RAG_books 的索引，每个 .md 一条：
+    {"raw_name", "title", "chapters", "chunks": [{"chapter", "offset", "length", "chars", "tokens", "sha256"}]}
+    加上 source_manifest 的 mtime / size / sha256 指纹，内容没变的文件直接复用缓存。
+    """
+
+    def __init__(self, input_dir, index_path=None):
+        self.input_dir = input_dir
+        self.manifest = SourceManifest(index_path or default_index_path(input_dir))
+        self.rescanned = 0
+
+    @classmethod
+    def build(cls, input_dir, index_path=None, full=False, jobs=DEFAULT_SCAN_JOBS):
+        """
+        加载缓存的索引，只重新扫描变化的文件（full=True 时全部重扫），并写回缓存。
+        mtime 或大小变了、且内容哈希也变了的文件交给 jobs 个进程并行扫描（每个文件只读一遍：标题、Chunk、整文件哈希一起得到），
+        结果在主进程按文件名顺序合并，输出与串行扫描完全相同。
+        """
+        index = cls(input_dir, index_path)
+        if full:
+            index.manifest.files = {}
+        filenames = sorted(f for f in os.listdir(input_dir) if f.endswith('.md'))
+        to_scan = []
+        for filename in filenames:
+            filepath = os.path.join(input_dir, filename)
+            entry = index.manifest.files.get(filename)
+            # mtime / 大小都没变直接沿用；只是被 touch 过（哈希没变）时 check 顺带更新 mtime，同样不重扫
+            if entry and entry.get("scan_version") == SCAN_VERSION and index.manifest.check(filepath)[0]:
+                continue
+            to_scan.append(filepath)
+
+        if jobs > 1 and len(to_scan) > 1:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(to_scan))) as pool:
+                results = list(pool.map(scan_job, to_scan, chunksize=max(1, len(to_scan) // (jobs * 4))))
+        else:
+            results = [scan_job(filepath) for filepath in to_scan]
+        for filepath, (fingerprint, derived) in zip(to_scan, results):
+            index.manifest.update(filepath, fingerprint, **derived)
+            index.rescanned += 1
+        index.manifest.prune(set(filenames))
+        index.manifest.save()
+        return index
+
+    @property
+    def files(self):
+        """{文件名: 索引条目}，按文件名排序"""
+        return dict(sorted(self.manifest.files.items()))
+
+    def book_name(self, filename):
+        return sanitize_book_name(self.manifest.files[filename]["raw_name"])
+
+    def chunks(self, filename, max_chunks=None):
+        chunks = self.manifest.files[filename]["chunks"]
+        return chunks if max_chunks is None else chunks[:max_chunks]
+
+    def segments(self, filename, max_segments=None):
+        """
+        出题用的段：相邻且章节名相同的 Chunk 按 segmenter.should_merge 合并。
+        单个 Chunk 的段就是索引里的 Chunk 条目；合并的段为
+        {"chapter", "spans": [[偏移, 长度], ...], "chars", "tokens", "sha256"}。
+        """
+        segments = []
+        for chunk in self.chunks(filename):
+            last = segments[-1] if segments else None
+            if last and last["chapter"] == chunk["chapter"] and should_merge(last["tokens"], chunk["tokens"]):
+                if "spans" not in last:
+                    last = segments[-1] = {"chapter": last["chapter"], "spans": [[last["offset"], last["length"]]],
+                                           "chars": last["chars"], "tokens": last["tokens"],
+                                           "hashes": [last["sha256"]]}
+                last["spans"].append([chunk["offset"], chunk["length"]])
+                last["chars"] += chunk["chars"]
+                last["tokens"] += chunk["tokens"]
+                last["hashes"].append(chunk["sha256"])
+            else:
+                if max_segments is not None and len(segments) >= max_segments:
+                    break
+                segments.append(chunk)
+        for segment in segments:
+            if "hashes" in segment:
+                segment["sha256"] = text_sha256("".join(segment.pop("hashes")))
+        return segments
+
+    def read_chunk(self, filename, chunk):
+        """按偏移只读取这一个 Chunk（或合并段的各个 Chunk）的正文"""
+        spans = chunk.get("spans") or [[chunk["offset"], chunk["length"]]]
+        texts = []
+        with open(os.path.join(self.input_dir, filename), 'rb') as f:
+            for offset, length in spans:
+                f.seek(offset)
+                texts.append(decode_chunk(f.read(length)))
+        return "\n\n".join(texts)
+
+    def fingerprint(self, filename):
+        entry = self.manifest.files[filename]
+        return {"mtime": entry["mtime"], "size": entry["size"], "sha256": entry["sha256"]}
+
+    def iter_work_items(self, pending):
+        """
+        pending: [(文件名, 书名, Chunk 条目或合并段, [等级, ...])]。
+        按需读取 Chunk 正文（每个 Chunk 只读一次），产出 (书名, 章节, 正文, 等级) 出题任务。
+        """
+        for filename, book_name, chunk, levels in pending:
+            with metrics.timer("read_chunk"):
+                chunk_text = self.read_chunk(filename, chunk)
+            for level in levels:
+                yield (book_name, chunk["chapter"], chunk_text, level)
+
+    def iter_book_chunks(self, max_chunks=None):
+        """逐个产出 (文件名, 书名, 段)，每本书最多 max_chunks 段，不读取正文"""
+        for filename in self.files:
+            book_name = self.book_name(filename)
+            for segment in self.segments(filename, max_chunks):
+                yield filename, book_name, segment
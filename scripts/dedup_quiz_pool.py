@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+题库去重：对 database_export_batch.json 中的全部题目做 MinHash 指纹，一次批量找出近似重复的题目。
+- 同一 (book, chapter, level) 有多条记录时（重试追加导致），只保留最好的一条（云函数只取 data[0]）
+- 同一本书内跨等级 / 跨章节近似重复的题目只保留第一处（低等级优先），每条记录至少保留 MIN_QUESTIONS 道题
+默认只输出报告，加 --apply 才改写输出文件（旁路索引会在下次打开时自动重建）。
+"""
+import os
+import json
+import time
+import argparse
+from collections import Counter, defaultdict
+
+from near_dup import DEFAULT_THRESHOLD, near_duplicate_clusters
+from stream_parser import StreamFormatError, check_question
+
+# ==========================================
+# 配置区域
+# ==========================================
+OUTPUT_FILE = "/Users/bowei/Desktop/智慧之匙-(wisdom-key)/database_export_batch.json"
+# 去重后每条记录至少保留的题目数，不足时宁可保留重复题
+MIN_QUESTIONS = 7
+
+# ==========================================
+# 核心逻辑
+# ==========================================
+def question_text(q):
+    """参与比较的文本：题干 + 正确选项"""
+    options = q.get('options') or []
+    ans = q.get('correctIndex', 0)
+    answer = options[ans] if isinstance(ans, int) and 0 <= ans < len(options) else ''
+    return f"{q.get('question', '')} {answer}"
+
+
+def valid_count(record):
+    ok = 0
+    for q in record.get('questions') or []:
+        try:
+            check_question(q)
+            ok += 1
+        except StreamFormatError:
+            pass
+    return ok
+
+
+def load_records(path):
+    """返回 (记录列表, 无法解析而原样保留的行)"""
+    records, passthrough = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if isinstance(record.get('questions'), list):
+                    records.append(record)
+                    continue
+            except (ValueError, AttributeError):
+                pass
+            passthrough.append(line if line.endswith("\n") else line + "\n")
+    return records, passthrough
+
+
+def dedup(records, threshold=DEFAULT_THRESHOLD, min_questions=MIN_QUESTIONS):
+    """返回 (保留的记录, 统计)。保留的记录中已剔除重复题目并重新编号"""
+    # 展平所有题目：flat[k] = (记录下标, 题目下标)
+    flat = [(ri, qi) for ri, r in enumerate(records) for qi in range(len(r['questions']))]
+    books = {}
+    groups = [books.setdefault(records[ri]['book_name'], len(books)) for ri, _ in flat]
+    clusters = near_duplicate_clusters([question_text(records[ri]['questions'][qi]) for ri, qi in flat],
+                                       groups, threshold)
+    cluster_size = Counter(clusters.tolist())
+
+    # 1. 同一 key 的多条记录：合格题目多的优先，其次与别处重复的题目少的，最后取最新的
+    dup_in_record = Counter(flat[k][0] for k, c in enumerate(clusters.tolist()) if cluster_size[c] > 1)
+    by_key = defaultdict(list)
+    for ri, r in enumerate(records):
+        by_key[(r['book_name'], r['chapter'], r['level'])].append(ri)
+
+    def quality(ri):
+        created = (records[ri].get('created_at') or {}).get('$date', '')
+        return valid_count(records[ri]), -dup_in_record[ri], created
+
+    keep = {max(indices, key=quality) for indices in by_key.values()}
+
+    # 2. 保留的记录之间的重复题目：每个簇只留第一处（低等级、文件中靠前的优先）
+    order = sorted((k for k in range(len(flat)) if flat[k][0] in keep),
+                   key=lambda k: (records[flat[k][0]]['level'], flat[k][0], flat[k][1]))
+    seen = set()
+    drop = set()
+    remaining = {ri: len(records[ri]['questions']) for ri in keep}
+    kept_for_min = 0
+    for k in order:
+        c = clusters[k]
+        if c not in seen:
+            seen.add(c)
+            continue
+        ri = flat[k][0]
+        if remaining[ri] <= min_questions:
+            kept_for_min += 1
+            continue
+        drop.add(k)
+        remaining[ri] -= 1
+
+    dropped_by_record = defaultdict(set)
+    for k in drop:
+        dropped_by_record[flat[k][0]].add(flat[k][1])
+
+    kept = []
+    for ri, r in enumerate(records):
+        if ri not in keep:
+            continue
+        if ri in dropped_by_record:
+            questions = [q for qi, q in enumerate(r['questions']) if qi not in dropped_by_record[ri]]
+            r = dict(r, questions=[dict(q, id=i + 1) for i, q in enumerate(questions)])
+        kept.append(r)
+
+    stats = {
+        "records": len(records),
+        "duplicate_keys": sum(1 for indices in by_key.values() if len(indices) > 1),
+        "records_removed": len(records) - len(keep),
+        "questions": len(flat),
+        "duplicate_clusters": sum(1 for size in cluster_size.values() if size > 1),
+        "questions_removed": len(drop),
+        "kept_for_min": kept_for_min,
+    }
+    return kept, stats
+
+
+def main(threshold=DEFAULT_THRESHOLD, apply=False):
+    if not os.path.exists(OUTPUT_FILE):
+        print(f"❌ 找不到题库文件 {OUTPUT_FILE}")
+        return
+
+    start = time.perf_counter()
+    records, passthrough = load_records(OUTPUT_FILE)
+    kept, stats = dedup(records, threshold)
+    elapsed = time.perf_counter() - start
+
+    print(f"📊 共 {stats['records']} 条记录、{stats['questions']} 道题，耗时 {elapsed:.1f}s")
+    print(f"   重复的 (书, 章节, 等级)：{stats['duplicate_keys']} 个，多余记录 {stats['records_removed']} 条")
+    print(f"   近似重复题目簇：{stats['duplicate_clusters']} 个，可删除重复题 {stats['questions_removed']} 道"
+          f"（另有 {stats['kept_for_min']} 道因记录题数不足 {MIN_QUESTIONS} 而保留）")
+
+    if not apply:
+        print("💡 以上为预览，加 --apply 改写题库文件")
+        return
+
+    tmp = OUTPUT_FILE + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for record in kept:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.writelines(passthrough)
+    os.replace(tmp, OUTPUT_FILE)
+    print(f"✅ 已写回 {OUTPUT_FILE}：{len(kept)} 条记录")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"判定为近似重复的 Jaccard 相似度 (默认 {DEFAULT_THRESHOLD})")
+    parser.add_argument("--apply", action="store_true", help="改写题库文件（默认只输出报告）")
+    args = parser.parse_args()
+    main(args.threshold, args.apply)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+分片导出：把导入记录流式写成若干个大小受限的 JSON Lines 分片（可选 gzip / zstd 压缩），外加一份 manifest。
+- 单个大文件在云开发控制台导入时容易卡死或超时；按原始（未压缩）字节数封顶，每个分片都能单独导入
+- 压缩只影响存储和传输，上传到云数据库前由 upload_parts.py 解压
+- 同样的记录总是得到同样的分片（gzip 不写时间戳），upload_parts.py 按 manifest 里的哈希跳过已上传的分片
+- manifest 最后写入；上一次导出留下、这次不再需要的分片文件会被删除
+
+    python export_parts.py ../database_chapter_context_import.json --collection chapter_context --out-dir ../export/chapter_context
+"""
+import os
+import io
+import gzip
+import json
+import datetime
+import argparse
+
+from source_manifest import file_sha256
+
+try:
+    import zstandard
+except ImportError:  # zstd 压缩为可选功能
+    zstandard = None
+
+# ==========================================
+# 配置区域
+# ==========================================
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'export')
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+# 每个分片的原始 JSON Lines 字节数上限
+DEFAULT_MAX_PART_BYTES = 8 * 1024 * 1024
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+# ==========================================
+# 核心逻辑
+# ==========================================
+def _open_writer(path, compression):
+    """
+    打开分片的写入流，返回 (压缩流, 底层文件)，两者都要关闭。
+    gzip 固定 mtime 和文件名，保证同样的内容得到同样的字节。
+    """
+    raw = open(path, 'wb')
+    if compression == "gzip":
+        return gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=GZIP_LEVEL, mtime=0), raw
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw), raw
+    return raw, raw
+
+
+def open_part(path):
+    """以二进制流读取分片（按扩展名解压）"""
+    if path.endswith(COMPRESSIONS["gzip"]):
+        return gzip.open(path, 'rb')
+    if path.endswith(COMPRESSIONS["zstd"]):
+        if zstandard is None:
+            raise RuntimeError("读取 .zst 分片需要安装 zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def read_part(path):
+    """分片的原始 JSON Lines 字节"""
+    with open_part(path) as f:
+        return f.read()
+
+
+def iter_part_records(path):
+    with io.TextIOWrapper(open_part(path), encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class PartWriter:
+    """
+    逐条写入记录，当前分片再写就会超过 max_bytes 时换下一个分片。
+    单条记录本身超过上限时独占一个分片（并给出警告）。
+    用法：
+        with PartWriter(out_dir, "questions") as writer:
+            for record in records:
+                writer.write(record)
+        manifest = writer.manifest
+    """
+
+    def __init__(self, out_dir, collection, max_bytes=DEFAULT_MAX_PART_BYTES, compression="none"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"不支持的压缩方式: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd 压缩需要安装 zstandard（pip install zstandard），或改用 gzip")
+        self.out_dir = out_dir
+        self.collection = collection
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.parts = []
+        self.manifest = None
+        self._stream = None
+        self._raw = None
+
+    def __enter__(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        return self
+
+    def _part_name(self, index):
+        return f"{self.collection}-{index:05d}.jsonl{COMPRESSIONS[self.compression]}"
+
+    def _close_part(self):
+        if self._stream is None:
+            return
+        self._stream.close()
+        self._raw.close()
+        part = self.parts[-1]
+        tmp = os.path.join(self.out_dir, part["name"] + ".tmp")
+        os.replace(tmp, os.path.join(self.out_dir, part["name"]))
+        part["stored_bytes"] = os.path.getsize(os.path.join(self.out_dir, part["name"]))
+        part["sha256"] = file_sha256(os.path.join(self.out_dir, part["name"]))
+        self._stream = None
+
+    def write(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        if self._stream is not None and self.parts[-1]["bytes"] + len(line) > self.max_bytes:
+            self._close_part()
+        if self._stream is None:
+            name = self._part_name(len(self.parts))
+            self._stream, self._raw = _open_writer(os.path.join(self.out_dir, name + ".tmp"), self.compression)
+            self.parts.append({"name": name, "records": 0, "bytes": 0})
+        if len(line) > self.max_bytes:
+            print(f"⚠️ 单条记录 {len(line)} 字节，超过分片上限 {self.max_bytes}（_id={record.get('_id')}）")
+        self._stream.write(line)
+        self.parts[-1]["records"] += 1
+        self.parts[-1]["bytes"] += len(line)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            if self._stream is not None:
+                self._stream.close()
+                self._raw.close()
+                os.remove(os.path.join(self.out_dir, self.parts[-1]["name"] + ".tmp"))
+            return False
+        self._close_part()
+        self.manifest = {
+            "version": MANIFEST_VERSION,
+            "collection": self.collection,
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+            "compression": self.compression,
+            "max_part_bytes": self.max_bytes,
+            "records": sum(p["records"] for p in self.parts),
+            "parts": self.parts,
+        }
+        previous = load_manifest(self.out_dir)
+        write_manifest(self.out_dir, self.manifest)
+        # 上一次导出留下、这次不再属于 manifest 的分片
+        keep = {p["name"] for p in self.parts}
+        for part in (previous or {}).get("parts", []):
+            stale = os.path.join(self.out_dir, part["name"])
+            if part["name"] not in keep and os.path.exists(stale):
+                os.remove(stale)
+        return False
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"manifest 版本 {manifest.get('version')} 与当前版本 {MANIFEST_VERSION} 不一致，请重新导出")
+    return manifest
+
+
+def write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def write_parts(records, out_dir, collection, max_bytes=DEFAULT_MAX_PART_BYTES, compression="none"):
+    """把 records 写成分片，返回 manifest"""
+    with PartWriter(out_dir, collection, max_bytes, compression) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.manifest
+
+
+def add_part_arguments(parser):
+    parser.add_argument("--max-part-mb", type=float, default=DEFAULT_MAX_PART_BYTES / 1024 / 1024,
+                        help=f"每个分片的原始大小上限 MB (默认 {DEFAULT_MAX_PART_BYTES // 1024 // 1024})")
+    parser.add_argument("--compression", choices=sorted(COMPRESSIONS), default="none",
+                        help="分片压缩方式 (默认 none)")
+
+
+def print_manifest(manifest, out_dir):
+    stored = sum(p["stored_bytes"] for p in manifest["parts"])
+    raw = sum(p["bytes"] for p in manifest["parts"])
+    print(f"📦 {manifest['records']} 条记录 → {len(manifest['parts'])} 个分片"
+          f"（原始 {raw / 1024 / 1024:.1f} MB，存储 {stored / 1024 / 1024:.1f} MB）→ {os.path.abspath(out_dir)}")
+
+
+def _iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 JSON Lines 导入文件拆成大小受限的分片")
+    parser.add_argument("input", help="JSON Lines 导入文件")
+    parser.add_argument("--collection", required=True, help="目标集合名（也用作分片文件名前缀）")
+    parser.add_argument("--out-dir", help="分片输出目录 (默认 export/<集合名>)")
+    add_part_arguments(parser)
+    args = parser.parse_args()
+    out_dir = args.out_dir or os.path.join(EXPORT_DIR, args.collection)
+    manifest = write_parts(_iter_jsonl(args.input), out_dir, args.collection,
+                           int(args.max_part_mb * 1024 * 1024), args.compression)
+    print_manifest(manifest, out_dir)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+题库导出：把 database_export_batch.json 整理成导入云数据库 questions 集合的最终文件。
+- _id 由 (book_name, chapter, level) 哈希得到（与 cloudfunctions/generateQuiz 的 quizRecordId 一致），
+  云函数按 _id 直接 doc().get() 点查，不再走条件查询；同一 key 只导出一条记录
+- 对照 database_books_import.json 的 books.chapters 生成覆盖率报告，列出每个会被请求、但题库里没有的 key
+- 输出 questions 集合的索引定义
+- 可同时写成大小受限的分片（export_parts.py）并直接并发上传（upload_parts.py），重新发布整个题库只需一条命令：
+    python export_quiz_pool.py --parts-dir ../export/questions --publish --backend wxcloud
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import contextlib
+from collections import OrderedDict
+
+from corpus import BOOKS_IMPORT_FILE
+from dedup_quiz_pool import load_records, valid_count
+from export_parts import DEFAULT_MAX_PART_BYTES, PartWriter, add_part_arguments, print_manifest
+from quiz_engine import LEVELS
+from upload_parts import PART_RETRIES, add_backend_arguments, make_backend, publish
+
+# ==========================================
+# 配置区域
+# ==========================================
+OUTPUT_FILE = "/Users/bowei/Desktop/智慧之匙-(wisdom-key)/database_export_batch.json"
+# books 集合导入文件（generate_books_db.py 的输出），覆盖率以其中的 chapters 为准。
+# 与其他路径一样做成配置项（而不是 load_catalog 的默认参数，那会在导入时就定死），
+# benchmark_pipeline.py 才能把它改到临时工作目录
+BOOKS_FILE = BOOKS_IMPORT_FILE
+# 导出的最终导入文件及其附带的覆盖率报告、索引定义
+EXPORT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database_questions_import.json')
+COVERAGE_FILE = EXPORT_FILE + ".coverage.json"
+INDEXES_FILE = EXPORT_FILE + ".indexes.json"
+
+# questions 集合的索引：_id 点查为主，复合唯一索引兜底旧的条件查询和 AI 回退写入
+QUESTION_INDEXES = [
+    {"name": "book_chapter_level", "unique": True,
+     "keys": [{"name": "book_name", "direction": "1"},
+              {"name": "chapter", "direction": "1"},
+              {"name": "level", "direction": "1"}]},
+]
+
+# ==========================================
+# 核心逻辑
+# ==========================================
+def record_id(book_name, chapter, level):
+    """确定性的记录 _id（修改时务必同步 generateQuiz 的 quizRecordId）"""
+    key = f"{book_name}\x1f{chapter}\x1f{level}"
+    return "q" + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def load_catalog(path):
+    """books 集合：{书名: [章节, ...]}，保持文件中的顺序"""
+    catalog = OrderedDict()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                book = json.loads(line)
+                catalog[book['title']] = book.get('chapters') or []
+    return catalog
+
+
+def best_records(records):
+    """同一 key 只留一条：合格题目多的优先，其次最新的"""
+    best = {}
+    for record in records:
+        key = (record['book_name'], record['chapter'], record['level'])
+        created = (record.get('created_at') or {}).get('$date', '')
+        rank = (valid_count(record), created)
+        if key not in best or rank > best[key][0]:
+            best[key] = (rank, record)
+    return {key: record for key, (_, record) in best.items()}
+
+
+def coverage_report(catalog, keys):
+    """books.chapters 能请求到的每个 (书, 章节, 等级) 是否都有题库"""
+    by_book = OrderedDict()
+    missing = []
+    catalog_keys = set()
+    for title, chapters in catalog.items():
+        covered = 0
+        for chapter in dict.fromkeys(chapters):
+            for level in LEVELS:
+                catalog_keys.add((title, chapter, level))
+                if (title, chapter, level) in keys:
+                    covered += 1
+                else:
+                    missing.append({"book_name": title, "chapter": chapter, "level": level})
+        by_book[title] = {"covered": covered, "total": len(dict.fromkeys(chapters)) * len(LEVELS)}
+    total = len(catalog_keys)
+    orphans = sorted(keys - catalog_keys)
+    return {
+        "total_keys": total,
+        "covered": total - len(missing),
+        "coverage": round((total - len(missing)) / total, 4) if total else 1.0,
+        "by_book": by_book,
+        "missing": missing,
+        # 题库里有、但 books.chapters 里请求不到的记录（章节名不一致或书已下架）
+        "orphans": [{"book_name": b, "chapter": c, "level": lv} for b, c, lv in orphans],
+    }
+
+
+def main(parts_dir=None, max_part_bytes=DEFAULT_MAX_PART_BYTES, compression="none"):
+    """parts_dir 不为空时同时写出 questions 集合的分片，返回 manifest"""
+    if not os.path.exists(OUTPUT_FILE):
+        print(f"❌ 找不到题库文件 {OUTPUT_FILE}")
+        return None
+    catalog = load_catalog(BOOKS_FILE)
+    records, _ = load_records(OUTPUT_FILE)
+    best = best_records(records)
+
+    # 按书单顺序、章节顺序、等级排序，同样的输入总是得到同样的文件
+    book_rank = {title: i for i, title in enumerate(catalog)}
+    chapter_rank = {(title, chapter): i for title, chapters in catalog.items() for i, chapter in enumerate(chapters)}
+
+    def sort_key(key):
+        book_name, chapter, level = key
+        return (book_rank.get(book_name, len(book_rank)), book_name,
+                chapter_rank.get((book_name, chapter), len(chapter_rank)), chapter, level)
+
+    tmp = EXPORT_FILE + ".tmp"
+    parts = PartWriter(parts_dir, "questions", max_part_bytes, compression) if parts_dir else None
+    with open(tmp, 'w', encoding='utf-8') as f, (parts or contextlib.nullcontext()):
+        for key in sorted(best, key=sort_key):
+            record = dict(best[key], _id=record_id(*key))
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if parts:
+                parts.write(record)
+    os.replace(tmp, EXPORT_FILE)
+
+    report = coverage_report(catalog, set(best))
+    with open(COVERAGE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    with open(INDEXES_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"collection": "questions", "indexes": QUESTION_INDEXES}, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 导出 {len(best)} 条记录（原始 {len(records)} 条）→ {EXPORT_FILE}")
+    print(f"📊 覆盖率 {report['covered']}/{report['total_keys']} ({report['coverage']:.1%})，"
+          f"缺失 {len(report['missing'])} 个，孤立记录 {len(report['orphans'])} 条 → {COVERAGE_FILE}")
+    for title, stats in report['by_book'].items():
+        if stats['covered'] < stats['total']:
+            print(f"   《{title}》{stats['covered']}/{stats['total']}")
+    print(f"🗂️ 索引定义 → {INDEXES_FILE}")
+    if parts:
+        print_manifest(parts.manifest, parts_dir)
+        return parts.manifest
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--parts-dir", help="同时写出分片到该目录（见 export_parts.py）")
+    add_part_arguments(parser)
+    parser.add_argument("--publish", action="store_true", help="导出后立即上传分片（需要 --parts-dir）")
+    parser.add_argument("--retries", type=int, default=PART_RETRIES, help=f"单个分片的重试次数 (默认 {PART_RETRIES})")
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+    if args.publish and not args.parts_dir:
+        parser.error("--publish 需要同时指定 --parts-dir")
+    manifest = main(args.parts_dir, int(args.max_part_mb * 1024 * 1024), args.compression)
+    if args.publish and manifest:
+        sys.exit(1 if publish(args.parts_dir, make_backend(args), args.upload_workers, args.retries) else 0)
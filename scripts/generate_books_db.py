@@ -5,10 +5,14 @@
 """
 
 import os
-import re
 import json
+import argparse
+
+from corpus import DEFAULT_SCAN_JOBS, CorpusIndex
+from title_matcher import TitleMatcher
 
 RAG_DIR = os.path.join(os.path.dirname(__file__), '..', 'docs', 'RAG_books')
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'database_books_import.json')
 
 # ===== 年级映射 =====
 # 书名 → (grade_level, recommend_level)
@@ -89,58 +93,8 @@ for grade, books in GRADE_BOOKS.items():
         if book_name not in GRADE_MAP or GRADE_MAP[book_name][1] < level:
             GRADE_MAP[book_name] = (grade, level)
 
-
-def extract_chapters(filepath):
-    """从 Markdown 文件提取章节列表"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    basename = os.path.basename(filepath)
-    chapters = []
-
-    # RAG_ 前缀的大型书籍：只提取真正的章节标题（过滤掉 Section 子标题）
-    if basename.startswith('RAG_'):
-        h2_matches = re.findall(r'^## (.+)$', content, re.MULTILINE)
-        # 过滤：只保留中文章节标题（第X回、第X章、卷X 等），去掉 Section X
-        real_chapters = [h.strip() for h in h2_matches
-                         if not h.strip().startswith('Section')
-                         and not h.strip().startswith('section')]
-        if real_chapters:
-            return real_chapters
-        # 如果没有中文章节标题，返回所有 h2（小型 RAG 文件）
-        if h2_matches:
-            return [h.strip() for h in h2_matches]
-
-    # 普通文件：尝试匹配 ## 标题
-    h2_matches = re.findall(r'^## (.+)$', content, re.MULTILINE)
-    if h2_matches:
-        chapters = [h.strip() for h in h2_matches]
-        return chapters
-
-    # 尝试匹配 # 标题
-    h1_matches = re.findall(r'^# (.+)$', content, re.MULTILINE)
-    if len(h1_matches) > 1:
-        chapters = [h.strip() for h in h1_matches]
-        return chapters
-
-    # 如果没有标题格式，整篇算一章
-    name = os.path.splitext(basename)[0]
-    for prefix in ['RAG_', '_原著完整版', '_全书完整版', '_完整试读版']:
-        name = name.replace(prefix, '')
-    chapters = [name]
-    return chapters
-
-
-def normalize_book_name(filename):
-    """从文件名提取书名"""
-    name = os.path.splitext(filename)[0]
-    # 去除常见前后缀
-    for prefix in ['RAG_']:
-        if name.startswith(prefix):
-            name = name[len(prefix):]
-    for suffix in ['_原著完整版', '_全书完整版', '_完整试读版']:
-        name = name.replace(suffix, '')
-    return name
+# 年级书名匹配器，模糊匹配时使用
+GRADE_MATCHER = TitleMatcher(GRADE_MAP)
 
 
 def find_grade_info(book_name):
@@ -148,10 +102,14 @@ def find_grade_info(book_name):
     # 精确匹配
     if book_name in GRADE_MAP:
         return GRADE_MAP[book_name]
-    # 模糊匹配（处理 朱自清·背影 → 背影）
-    for key, value in GRADE_MAP.items():
-        if book_name in key or key in book_name:
-            return value
+    # 模糊匹配（处理 朱自清·背影 → 背影）：
+    # 书名中出现的最长年级书名，或包含该书名的最短年级书名，取匹配长度更长的一个
+    inner = GRADE_MATCHER.longest_in(book_name)
+    outer = GRADE_MATCHER.containing(book_name)
+    if outer and (not inner or len(book_name) > len(inner)):
+        return GRADE_MAP[outer[0]]
+    if inner:
+        return GRADE_MAP[inner]
     # 去掉书名号再试
     clean = book_name.replace('《', '').replace('》', '')
     if clean in GRADE_MAP:
@@ -159,19 +117,16 @@ def find_grade_info(book_name):
     return None
 
 
-def main():
-    rag_dir = os.path.abspath(RAG_DIR)
-    md_files = sorted([f for f in os.listdir(rag_dir) if f.endswith('.md')])
+def main(full=False, jobs=DEFAULT_SCAN_JOBS):
+    # 书名和章节列表来自共享的语料索引，未变化的文件不会重新扫描，变化的文件多进程并行扫描
+    index = CorpusIndex.build(os.path.abspath(RAG_DIR), full=full, jobs=jobs)
+    reused = len(index.files) - index.rescanned
 
     books_data = []
 
-    for md_file in md_files:
-        if md_file.endswith('.py'):
-            continue
-
-        filepath = os.path.join(rag_dir, md_file)
-        book_name = normalize_book_name(md_file)
-        chapters = extract_chapters(filepath)
+    for entry in index.files.values():
+        book_name = entry["title"]
+        chapters = entry["chapters"]
         grade_info = find_grade_info(book_name)
 
         grade_label = grade_info[0] if grade_info else "未分级"
@@ -212,16 +167,21 @@ def main():
         print(f"  {book['_id']} | {book['title']} | {book['grade']} | {book['total_chapters']} 章")
 
     # 输出为微信云数据库导入格式（每行一个 JSON）
-    output_path = os.path.join(os.path.dirname(__file__), '..', 'database_books_import.json')
+    output_path = OUTPUT_PATH
     with open(output_path, 'w', encoding='utf-8') as f:
         for book in books:
             f.write(json.dumps(book, ensure_ascii=False) + '\n')
 
-    print(f"\n✅ 共生成 {len(books)} 本书数据")
+    print(f"\n✅ 共生成 {len(books)} 本书数据（{reused} 个文件未变化，沿用上次提取的章节）")
     print(f"📁 输出文件: {os.path.abspath(output_path)}")
     print(f"\n⚠️  请手动补充 author 和 cover_url 字段")
     print(f"📤 导入方式: 云开发控制台 → 数据库 → books → 导入")
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='生成 books 集合导入文件（默认增量，只重新提取变化的文件）')
+    parser.add_argument('--full', action='store_true', help='忽略缓存的语料索引，重新扫描所有文件')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_SCAN_JOBS,
+                        help=f'并行扫描文件的进程数 (默认 CPU 核数 {DEFAULT_SCAN_JOBS}，1 即串行)')
+    args = parser.parse_args()
+    main(full=args.full, jobs=args.jobs)
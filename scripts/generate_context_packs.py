@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+为 books 集合中的每个 (书, 章节) 预先生成一份精简的章节知识包（chapter_context 集合）：
+本回概要、主要人物、情节要点和词语解释，渲染后不超过 --max-pack-tokens 个 Token。
+书灵对话时按 _id 点查知识包拼进 Prompt，不必再让模型凭记忆回忆原著或等远程知识库检索。
+- 章节名、顺序与 database_books_import.json 的 books.chapters 一致，记录带 book_id / chapter_index
+- 增量：原文没变的章节沿用已有知识包；LLM 回复走共享缓存、限流和运行指标
+"""
+import os
+import json
+import hashlib
+import datetime
+import argparse
+
+import metrics
+from chapter_sources import chapter_sources, iter_completed, load_existing, source_excerpt
+from corpus import REPO_DIR, CorpusIndex
+from generate_books_db import RAG_DIR
+from quiz_engine import DEFAULT_WORKERS, add_engine_arguments, configure, cached_completion, strip_code_fence
+from scheduler import load_books
+from segmenter import count_tokens
+from source_manifest import text_sha256
+
+# ==========================================
+# 配置区域
+# ==========================================
+OUTPUT_PATH = os.path.join(REPO_DIR, 'database_chapter_context_import.json')
+# 渲染后的知识包 Token 上限（对话时每轮额外发送的上下文）
+DEFAULT_PACK_TOKENS = 400
+# 每个章节送给模型的原文上限，超长章节均匀抽取若干段
+MAX_SOURCE_TOKENS = 6000
+PACK_VERSION = 1
+# 各字段的条目上限
+MAX_CHARACTERS = 6
+MAX_BEATS = 6
+MAX_VOCABULARY = 6
+
+# ==========================================
+# 核心逻辑
+# ==========================================
+def pack_id(book_name, chapter_name):
+    """知识包的确定性 _id（修改时务必同步 smartDialogueAgent 的 contextPackId）"""
+    key = f"{book_name}\x1f{chapter_name}"
+    return "c" + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def render_pack(pack):
+    """知识包拼进对话 Prompt 时的文本（与 smartDialogueAgent 的 renderContextPack 保持一致）"""
+    lines = []
+    if pack.get("summary"):
+        lines.append(f"【本回概要】{pack['summary']}")
+    if pack.get("characters"):
+        lines.append("【主要人物】" + "；".join(f"{c['name']}：{c['role']}" if c.get('role') else c['name']
+                                           for c in pack["characters"]))
+    if pack.get("plot_beats"):
+        lines.append("【情节要点】" + " ".join(f"{i}. {b}" for i, b in enumerate(pack["plot_beats"], 1)))
+    if pack.get("vocabulary"):
+        lines.append("【词语】" + "；".join(f"{v['word']}：{v['meaning']}" for v in pack["vocabulary"]))
+    return "\n".join(lines)
+
+
+def fit_pack(pack, max_tokens):
+    """超出预算时依次去掉词语、人物、情节的末尾条目，最后截短概要，直到渲染结果不超过 max_tokens"""
+    pack = {k: list(v) if isinstance(v, list) else v for k, v in pack.items()}
+    while count_tokens(render_pack(pack)) > max_tokens:
+        longest = max(("vocabulary", "characters", "plot_beats"), key=lambda k: len(pack[k]))
+        if len(pack[longest]) > 1:
+            pack[longest].pop()
+        elif len(pack["summary"]) > 20:
+            pack["summary"] = pack["summary"][:int(len(pack["summary"]) * 0.8)].rstrip("，、；") + "…"
+        else:
+            for key in ("vocabulary", "characters", "plot_beats"):
+                if pack[key]:
+                    pack[key].pop()
+                    break
+            else:
+                break
+    return pack
+
+
+def build_pack_messages(book_name, chapter_name, text, max_tokens):
+    system_prompt = f"""你是一位儿童阅读辅导老师，要为《{book_name}》的一个章节整理一份简明的"章节知识包"，供陪读书灵和小读者聊天时参考。
+
+【要求】
+1. **章节名称**：{chapter_name}
+2. **绝对忠于文本**：所有内容都必须能在给定的原文中找到依据，不要补充原文以外的情节。
+3. **简明**：全部内容合计不超过 {max_tokens} 字，语言浅显，适合小学生。
+4. **输出格式**：必须且只能输出一个 **纯 JSON 对象**，不要包含任何 Markdown 代码块标签（如 ```json），也不要解释文字。
+格式范例：
+{{
+  "summary": "本章发生了什么（不超过 80 字）",
+  "characters": [{{"name": "人物名", "role": "在本章中的身份或作用（不超过 15 字）"}}],
+  "plot_beats": ["按顺序的关键情节，每条不超过 20 字"],
+  "vocabulary": [{{"word": "本章中较难的词语", "meaning": "浅显的解释（不超过 15 字）"}}]
+}}
+人物、情节、词语各不超过 {MAX_CHARACTERS} 条。
+"""
+    user_prompt = f"以下是章节原文：\n\n{text}\n\n请整理这一章的知识包。"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def _items(value, fields, limit):
+    """规范化人物 / 词语列表：只保留带必填字段的条目，字符串值去空白"""
+    items = []
+    for item in value if isinstance(value, list) else []:
+        if isinstance(item, dict) and str(item.get(fields[0], "")).strip():
+            items.append({f: str(item.get(f, "")).strip() for f in fields})
+    return items[:limit]
+
+
+def parse_pack(reply):
+    data = json.loads(strip_code_fence(reply))
+    if not isinstance(data, dict) or not str(data.get("summary", "")).strip():
+        raise ValueError("知识包缺少 summary")
+    beats = data.get("plot_beats")
+    return {
+        "summary": str(data["summary"]).strip(),
+        "characters": _items(data.get("characters"), ("name", "role"), MAX_CHARACTERS),
+        "plot_beats": [str(b).strip() for b in (beats if isinstance(beats, list) else []) if str(b).strip()][:MAX_BEATS],
+        "vocabulary": _items(data.get("vocabulary"), ("word", "meaning"), MAX_VOCABULARY),
+    }
+
+
+def generate_pack(book_name, chapter_name, text, max_tokens):
+    """调用 LLM 生成知识包（优先读缓存），失败返回 None"""
+    try:
+        messages = build_pack_messages(book_name, chapter_name, source_excerpt(text, MAX_SOURCE_TOKENS), max_tokens)
+        return fit_pack(cached_completion(messages, parse_pack, completion_tokens=max_tokens * 2), max_tokens)
+    except Exception as e:
+        print(f"    ❌ 知识包生成失败《{book_name}》{chapter_name}: {str(e)}")
+        return None
+
+
+def build_record(book, chapter_index, chapter_name, pack, source_sha256):
+    """组装符合微信云开发导入格式的 JSON 对象"""
+    return {
+        "_id": pack_id(book['title'], chapter_name),
+        "book_id": book.get('_id', ''),
+        "book_name": book['title'],
+        "chapter": chapter_name,
+        "chapter_index": chapter_index,
+        **pack,
+        "tokens": count_tokens(render_pack(pack)),
+        "source_sha256": source_sha256,
+        "created_at": {"$date": datetime.datetime.utcnow().isoformat() + "Z"},
+        "version": PACK_VERSION
+    }
+
+
+def main(workers=DEFAULT_WORKERS, max_tokens=DEFAULT_PACK_TOKENS, full=False):
+    books = load_books()
+    if not books:
+        print("❌ 找不到 database_books_import.json，请先运行 generate_books_db.py")
+        return
+    with metrics.timer("index"):
+        index = CorpusIndex.build(os.path.abspath(RAG_DIR))
+    existing = {} if full else load_existing(OUTPUT_PATH)
+
+    # 原文和预算都没变的章节沿用已有知识包
+    records = []
+    pending = []
+    for book, chapter_index, chapter_name, filename, segments in chapter_sources(index, books):
+        source_sha256 = text_sha256("".join(s["sha256"] for s in segments))
+        old = existing.get(pack_id(book['title'], chapter_name))
+        if (old and old.get("source_sha256") == source_sha256 and old.get("version") == PACK_VERSION
+                and old.get("tokens", 0) <= max_tokens):
+            records.append(dict(old, book_id=book.get('_id', ''), chapter_index=chapter_index))
+        else:
+            records.append(None)
+            pending.append((len(records) - 1, book, chapter_index, chapter_name, filename, segments, source_sha256))
+    print(f"📚 共 {len(records)} 个章节，沿用 {len(records) - len(pending)} 个，需要生成 {len(pending)} 个知识包")
+
+    def work(job):
+        _, book, _, chapter_name, filename, segments, _ = job
+        with metrics.timer("read_chunk"):
+            text = "\n\n".join(index.read_chunk(filename, s) for s in segments)
+        return generate_pack(book['title'], chapter_name, text, max_tokens)
+
+    # 结果只在主线程中收集
+    fail = 0
+    for done, (job, pack) in enumerate(iter_completed(work, pending, workers), 1):
+        slot, book, chapter_index, chapter_name, _, _, source_sha256 = job
+        if pack:
+            records[slot] = build_record(book, chapter_index, chapter_name, pack, source_sha256)
+            metrics.inc("records", status="ok")
+            print(f"  [{done}/{len(pending)}] ✅ 《{book['title']}》{chapter_name}")
+        else:
+            print(f"  [{done}/{len(pending)}] ❌ 《{book['title']}》{chapter_name}")
+            fail += 1
+            metrics.inc("records", status="failed")
+
+    written = [r for r in records if r]
+    tmp = OUTPUT_PATH + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for record in written:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, OUTPUT_PATH)
+
+    tokens = [r["tokens"] for r in written]
+    print(f"\n✅ 共输出 {len(written)} 个知识包，失败 {fail} 个（重新运行即可补齐）")
+    if tokens:
+        print(f"📏 知识包平均 {sum(tokens) / len(tokens):.0f} Token，最大 {max(tokens)} Token（上限 {max_tokens}）")
+    print(f"📁 输出文件: {os.path.abspath(OUTPUT_PATH)}")
+    print("📤 导入方式: 云开发控制台 → 数据库 → chapter_context → 导入")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_engine_arguments(parser)
+    parser.add_argument("--max-pack-tokens", type=int, default=DEFAULT_PACK_TOKENS,
+                        help=f"每个知识包渲染后的 Token 上限 (默认 {DEFAULT_PACK_TOKENS})")
+    parser.add_argument("--full", action="store_true", help="忽略已有知识包，全部重新生成")
+    args = parser.parse_args()
+    configure(args)
+    main(workers=args.workers, max_tokens=args.max_pack_tokens, full=args.full)
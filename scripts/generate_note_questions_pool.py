@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+离线批量生成读后感引导问题（note_questions 集合），免得学生第一次写笔记时等 generateNoteQuestions 现场调用模型。
+- 章节与 books.chapters 一致（客户端传的正是 books.chapters 中的章节名），书名经过与出题相同的 sanitize_book_name 映射
+- 每条记录 5 个带 emoji 的问题，键与云函数查询的 (book_name, chapter) 相同，_id 确定（与 noteQuestionsId 一致）
+- 与云函数不同，这里把章节原文（超长时均匀抽取）一起发给模型，问题能具体到这一章的情节
+- 增量：原文没变的章节沿用已有问题；LLM 回复走共享缓存、限流和运行指标
+"""
+import os
+import json
+import hashlib
+import datetime
+import argparse
+import unicodedata
+
+import metrics
+from chapter_sources import chapter_sources, iter_completed, load_existing, source_excerpt
+from corpus import REPO_DIR, CorpusIndex
+from generate_books_db import RAG_DIR
+from quiz_engine import DEFAULT_WORKERS, add_engine_arguments, configure, cached_completion, strip_code_fence
+from scheduler import load_books
+from source_manifest import text_sha256
+
+# ==========================================
+# 配置区域
+# ==========================================
+OUTPUT_PATH = os.path.join(REPO_DIR, 'database_note_questions_import.json')
+QUESTIONS_PER_CHAPTER = 5
+# 引导问题只需要了解情节梗概，原文不必太长
+MAX_SOURCE_TOKENS = 3000
+NOTE_VERSION = 1
+# 模型漏掉 emoji 时按顺序补上
+FALLBACK_EMOJI = ["🤔", "✨", "💡", "🦸‍♂️", "😄"]
+
+# ==========================================
+# 核心逻辑
+# ==========================================
+def note_questions_id(book_name, chapter_name):
+    """记录的确定性 _id（修改时务必同步 generateNoteQuestions 的 noteQuestionsId）"""
+    key = f"{book_name}\x1f{chapter_name}"
+    return "n" + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def build_note_messages(book_name, chapter_name, text):
+    """与 generateNoteQuestions 的 Prompt 相同的规则，另外附上章节原文"""
+    system_prompt = f"""你是一位擅长引导学生思考的语文老师。
+你的任务是针对学生刚读完的书籍章节，生成 {QUESTIONS_PER_CHAPTER} 个引导性问题，帮助他们写读后感。
+
+【规则】
+1. 问题要具体到这一章的内容，不能太泛
+2. 问题要能激发思考，不是简单的问答题
+3. 问题的难度要适合小学生
+4. 每个问题前加一个合适的 emoji
+5. **输出格式**：纯 JSON 数组，不要包含任何解释文字
+
+示例输出：
+["🦸‍♂️ 这一章里谁最让你佩服？", "🤔 如果你是xxx会怎么做？", ...]"""
+    user_prompt = (f"以下是《{book_name}》{chapter_name}的原文：\n\n{text}\n\n"
+                   f"请为《{book_name}》的{chapter_name}生成 {QUESTIONS_PER_CHAPTER} 个读后感引导问题。")
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def _starts_with_emoji(question):
+    return unicodedata.category(question[0]) == "So"
+
+
+def parse_note_questions(reply):
+    """回复须为至少 5 个非空字符串的数组；只取前 5 个，缺 emoji 的补上"""
+    data = json.loads(strip_code_fence(reply))
+    if not isinstance(data, list):
+        raise ValueError("回复不是 JSON 数组")
+    questions = [q.strip() for q in data if isinstance(q, str) and q.strip()][:QUESTIONS_PER_CHAPTER]
+    if len(questions) < QUESTIONS_PER_CHAPTER:
+        raise ValueError(f"只有 {len(questions)} 个有效问题")
+    return [q if _starts_with_emoji(q) else f"{FALLBACK_EMOJI[i]} {q}" for i, q in enumerate(questions)]
+
+
+def generate_note_questions(book_name, chapter_name, text):
+    """调用 LLM 生成引导问题（优先读缓存），失败返回 None"""
+    try:
+        messages = build_note_messages(book_name, chapter_name, source_excerpt(text, MAX_SOURCE_TOKENS))
+        return cached_completion(messages, parse_note_questions, completion_tokens=300)
+    except Exception as e:
+        print(f"    ❌ 引导问题生成失败《{book_name}》{chapter_name}: {str(e)}")
+        return None
+
+
+def build_record(book_name, chapter_name, questions, source_sha256):
+    """组装符合微信云开发导入格式的 JSON 对象（字段与云函数写入的缓存记录一致）"""
+    return {
+        "_id": note_questions_id(book_name, chapter_name),
+        "book_name": book_name,
+        "chapter": chapter_name,
+        "questions": questions,
+        "created_at": {"$date": datetime.datetime.utcnow().isoformat() + "Z"},
+        "source": "ai_generated_batch",
+        "source_sha256": source_sha256,
+        "version": NOTE_VERSION
+    }
+
+
+def main(workers=DEFAULT_WORKERS, full=False):
+    books = load_books()
+    if not books:
+        print("❌ 找不到 database_books_import.json，请先运行 generate_books_db.py")
+        return
+    with metrics.timer("index"):
+        index = CorpusIndex.build(os.path.abspath(RAG_DIR))
+    existing = {} if full else load_existing(OUTPUT_PATH)
+
+    records = []
+    pending = []
+    for book, _, chapter_name, filename, segments in chapter_sources(index, books):
+        source_sha256 = text_sha256("".join(s["sha256"] for s in segments))
+        old = existing.get(note_questions_id(book['title'], chapter_name))
+        if old and old.get("source_sha256") == source_sha256 and old.get("version") == NOTE_VERSION:
+            records.append(old)
+        else:
+            records.append(None)
+            pending.append((len(records) - 1, book['title'], chapter_name, filename, segments, source_sha256))
+    print(f"📚 共 {len(records)} 个章节，沿用 {len(records) - len(pending)} 个，需要生成 {len(pending)} 组引导问题")
+
+    def work(job):
+        _, book_name, chapter_name, filename, segments, _ = job
+        with metrics.timer("read_chunk"):
+            text = "\n\n".join(index.read_chunk(filename, s) for s in segments)
+        return generate_note_questions(book_name, chapter_name, text)
+
+    fail = 0
+    for done, (job, questions) in enumerate(iter_completed(work, pending, workers), 1):
+        slot, book_name, chapter_name, _, _, source_sha256 = job
+        if questions:
+            records[slot] = build_record(book_name, chapter_name, questions, source_sha256)
+            metrics.inc("records", status="ok")
+            print(f"  [{done}/{len(pending)}] ✅ 《{book_name}》{chapter_name}")
+        else:
+            print(f"  [{done}/{len(pending)}] ❌ 《{book_name}》{chapter_name}")
+            fail += 1
+            metrics.inc("records", status="failed")
+
+    written = [r for r in records if r]
+    tmp = OUTPUT_PATH + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for record in written:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, OUTPUT_PATH)
+
+    print(f"\n✅ 共输出 {len(written)} 组引导问题，失败 {fail} 组（重新运行即可补齐）")
+    print(f"📁 输出文件: {os.path.abspath(OUTPUT_PATH)}")
+    print("📤 导入方式: 云开发控制台 → 数据库 → note_questions → 导入")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_engine_arguments(parser)
+    parser.add_argument("--full", action="store_true", help="忽略已有记录，全部重新生成")
+    args = parser.parse_args()
+    configure(args)
+    main(workers=args.workers, full=args.full)
@@ -1,208 +1,171 @@
 import os
 import json
-import re
-import requests
-import datetime
-import uuid
-import time
-
-# --- 新增的书名映射逻辑 ---
-import_titles = []
-try:
-    with open('/Users/bowei/Desktop/智慧之匙-(wisdom-key)/database_books_import.json', 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                import_titles.append(json.loads(line)['title'])
-    import_titles.sort(key=len, reverse=True)
-except Exception as e:
-    print(f"⚠️ 警告：无法加载 database_books_import.json 进行书名映射 ({e})")
-
-def sanitize_book_name(raw_name):
-    if raw_name in import_titles:
-        return raw_name
-    for t in import_titles:
-        if t in raw_name:
-            return t
-    return raw_name
+import argparse
+
+import metrics
+from corpus import CorpusIndex
+from source_manifest import SourceManifest
+from record_index import RecordIndex
+import quiz_engine
+from quiz_engine import LEVELS, DEFAULT_WORKERS, add_engine_arguments, configure, run_generation
 
 # ==========================================
 # 配置区域
 # ==========================================
-# 你的 DeepSeek API Key (这里可以替换为你自己的 Key)
-API_KEY = os.environ.get("DEEPSEEK_API_KEY", "YOUR_DEEPSEEK_API_KEY_HERE")
-BASE_URL = "https://api.deepseek.com/v1/chat/completions"
-MODEL = "deepseek-chat"
+# DeepSeek API Key / 模型等配置统一放在 quiz_engine.py（通过环境变量 DEEPSEEK_API_KEY 设置 Key）
 
 # 存放需要生成题目的 md 文件夹，请将你要生成题目的原著 md 文件放在这个目录
 INPUT_DIR = "/Users/bowei/Desktop/智慧之匙-(wisdom-key)/docs/RAG_books"
 # 输出生成的题库 JSON 文件的路径，直接可导入云开发数据库
 OUTPUT_FILE = "/Users/bowei/Desktop/智慧之匙-(wisdom-key)/database_export_batch.json"
+# 源文件清单：记录每本书每个 Chunk 的哈希和已生成的等级，用于增量构建
+MANIFEST_FILE = OUTPUT_FILE + ".manifest.json"
+# 每成功生成多少条保存一次清单
+MANIFEST_SAVE_EVERY = 20
 
 # ==========================================
 # 核心逻辑
 # ==========================================
 
-LEVEL_REQUIREMENTS = {
-    1: '考察基础情节、人物名称、核心事件等直观内容。题目必须非常简单直接。',
-    2: '考察人物动机、情节因果关系、隐含的深层含义等。需要一点点思考分析。',
-    3: '考察细节挖掘、逻辑推理、词句赏析、乃至作品背后的文化内涵或写作手法。'
-}
-
-def generate_questions_for_chunk(book_name, chapter_name, chunk_text, level):
-    """调用 DeepSeek 生成指定难度等级的题目"""
-    req_desc = LEVEL_REQUIREMENTS[level]
-    
-    system_prompt = f"""你是一位专业的阅读理解出题专家。你的任务是基于给定的原著节选文本，生成高质量的单项选择题。
-    
-【出题规则】
-1. **书名**：《{book_name}》
-2. **章节名称**：{chapter_name}
-3. **难度等级**：Level {level}。要求：{req_desc}
-4. **题目数量**：必须生成 **10** 道单选题。
-5. **绝对忠于文本**：所有题目的答案必须能够从给定的节选文本中找到依据。
-6. **输出格式**：必须且只能输出一个 **纯 JSON 数组**，不要包含任何 Markdown 代码块标签（如 ```json），也不要解释文字。
-格式范例：
-[
-  {{
-    "id": 1,
-    "question": "题目内容？",
-    "options": ["选项A", "选项B", "选项C", "选项D"],
-    "correctIndex": 0, 
-    "explanation": "解析内容"
-  }},
-  // ...直到第10题
-]
-"""
-    
-    user_prompt = f"以下是节选文本内容：\n\n{chunk_text}\n\n请针对以上文本，严格按照要求的难度等级（Level {level}）生成 10 道选择题。"
-
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "model": MODEL,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "temperature": 0.4
-    }
+def process_book_file(index, filename, manifest, stale, record_index):
+    """
+    对照语料索引中各段（见 CorpusIndex.segments）的哈希，返回这本书需要(重新)生成的 [(文件名, 书名, 段, [等级...])]。
+    内容和上次相同、且各等级都已生成的 Chunk 直接沿用已有题目；
+    内容变了或已删除的章节加入 stale，稍后从输出文件中剔除旧题目。
+    清单每 MANIFEST_SAVE_EVERY 条才保存一次，已写进输出文件（record_index）的等级同样视为已完成。
+    """
+    book_name = index.book_name(filename)
+    previous = manifest.files.get(filename)
+    old_chunks = previous["chunks"] if previous else {}
 
-    try:
-        response = requests.post(BASE_URL, json=payload, headers=headers, timeout=120)
-        response.raise_for_status()
-        
-        reply = response.json()["choices"][0]["message"]["content"]
-        # 清理多余的 Markdown 标记
-        cleaned_reply = re.sub(r'^```json\s*', '', reply)
-        cleaned_reply = re.sub(r'\s*```$', '', cleaned_reply)
-        cleaned_reply = cleaned_reply.strip()
-        
-        questions = json.loads(cleaned_reply)
-        
-        # 兜底规范化格式
-        valid_questions = []
-        for i, q in enumerate(questions):
-            ans = q.get('correctIndex', q.get('answer', 0)) # 兼容 answer 或 correctIndex
-            valid_questions.append({
-                "id": i + 1,
-                "question": q.get('question', ''),
-                "options": q.get('options', [])[:4],
-                "correctIndex": ans if isinstance(ans, int) else 0,
-                "explanation": q.get('explanation', '暂无解析')
-            })
-            
-        return valid_questions
-        
-    except Exception as e:
-        print(f"❌ 生成题目失败 (等级 {level}): {str(e)}")
-        if 'response' in locals() and hasattr(response, 'text'):
-            print(f"响应内容: {response.text}")
-        return None
-
-def process_book_file(filepath):
-    """解析 Markdown 书籍文件，切分为多个 Chunk 并生成题目"""
-    if not os.path.exists(filepath):
-        print(f"⚠️ 文件不存在: {filepath}")
-        return
-        
-    raw_name = os.path.splitext(os.path.basename(filepath))[0]
-    book_name = sanitize_book_name(raw_name)
-    print(f"\n==================== 开始处理书籍: 《{book_name}》 (原文件: {raw_name}) ====================")
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-        
-    # 如果文本中含有 ===CHUNK===，按此标志分割；否则整本书当成一个 Chunk
-    chunks = []
-    if "===CHUNK===" in content:
-        raw_chunks = content.split("===CHUNK===")
-        chunks = [c.strip() for c in raw_chunks if c.strip()]
-    else:
-        # 如果没有 ===CHUNK===，尝试通过二级标题 ## 切分
-        raw_chunks = re.split(r'\n(?=## )', content)
-        chunks = [c.strip() for c in raw_chunks if c.strip()]
-        if not chunks:
-             chunks = [content.strip()]
-
-    # 准备写入文件 (以追加模式打开 a)
-    with open(OUTPUT_FILE, 'a', encoding='utf-8') as out_f:
-        for index, chunk_text in enumerate(chunks):
-            # 尝试提取当前 Chunk 的标题
-            chapter_name = f"片段 {index + 1}"
-            header_match = re.search(r'^#+\s+(.+)$', chunk_text, re.MULTILINE)
-            if header_match:
-                chapter_name = header_match.group(1).strip()
-                
-            print(f"\n---> 开始生成章节: [{chapter_name}] 的题库")
-            
-            # 避免对单纯的标语/极短文本出题
-            if len(chunk_text) < 50:
-                print("文本过短，跳出出题。")
+    if previous and previous["book_name"] != book_name:
+        # 书名映射变了，旧书名下的题目全部作废
+        stale.update((previous["book_name"], chapter_name) for chapter_name in old_chunks)
+        old_chunks = {}
+
+    new_chunks = {}
+    pending = []
+    for chunk in index.segments(filename):
+        chapter_name = chunk["chapter"]
+        if chapter_name in new_chunks:
+            print(f"---> 《{book_name}》[{chapter_name}] 章节名重复，跳过。")
+            continue
+
+        old = old_chunks.get(chapter_name)
+        if old and old["sha256"] == chunk["sha256"]:
+            done_levels = list(old["levels"])
+            # 崩溃时清单可能落后于输出文件，以输出文件为准补齐，避免重复出题
+            missing = {key[2] for key in record_index.missing([(book_name, chapter_name, level) for level in LEVELS])}
+            done_levels += [level for level in LEVELS if level not in done_levels and level not in missing]
+        else:
+            done_levels = []
+            stale.add((book_name, chapter_name))
+        new_chunks[chapter_name] = {"sha256": chunk["sha256"], "levels": done_levels}
+
+        levels = [level for level in LEVELS if level not in done_levels]
+        if levels:
+            pending.append((filename, book_name, chunk, levels))
+
+    # 源文件里已经不存在的章节
+    for chapter_name in old_chunks:
+        if chapter_name not in new_chunks:
+            stale.add((book_name, chapter_name))
+
+    if pending:
+        print(f"📖 《{book_name}》(原文件: {filename}) 需要生成 {sum(len(p[3]) for p in pending)} 条题库")
+    manifest.update(filename, index.fingerprint(filename), book_name=book_name, chunks=new_chunks)
+    return pending
+
+def remove_stale_records(stale):
+    """从输出文件中剔除 (书名, 章节) 属于 stale 的旧题目，其余记录原样保留"""
+    if not stale or not os.path.exists(OUTPUT_FILE):
+        return 0
+    removed = 0
+    tmp = OUTPUT_FILE + ".tmp"
+    with open(OUTPUT_FILE, 'r', encoding='utf-8') as src, open(tmp, 'w', encoding='utf-8') as dst:
+        for line in src:
+            if not line.strip():
                 continue
-                
-            for level in [1, 2, 3]:
-                print(f"  🤖 正在生成 Level {level} 题库 (10道题)...")
-                questions = generate_questions_for_chunk(book_name, chapter_name, chunk_text, level)
-                
-                if questions and len(questions) > 0:
-                    # 组装符合微信云开发导入格式的 JSON 对象
-                    doc_record = {
-                        "_id": uuid.uuid4().hex, # 生成唯一 ID
-                        "book_name": book_name,
-                        "chapter": chapter_name,
-                        "level": level,
-                        "questions": questions,
-                        "created_at": { "$date": datetime.datetime.utcnow().isoformat() + "Z" }, # 云数据库特定的日期格式
-                        "source": "ai_generated_batch",
-                        "version": 1
-                    }
-                    
-                    # 写入一行 JSON (\n 结尾，即 JSONL 格式)
-                    out_f.write(json.dumps(doc_record, ensure_ascii=False) + "\n")
-                    print(f"  ✅ Level {level} 生成成功并写入文件！")
-                else:
-                    print(f"  ❌ Level {level} 生成失败。")
-                
-                # 增加延迟防并发限制
-                time.sleep(1)
+            try:
+                r = json.loads(line)
+                if (r['book_name'], r['chapter']) in stale:
+                    removed += 1
+                    continue
+            except (ValueError, KeyError):
+                pass
+            dst.write(line)
+    os.replace(tmp, OUTPUT_FILE)
+    return removed
+
+def main(workers=DEFAULT_WORKERS, full=False):
+    if full or not os.path.exists(OUTPUT_FILE):
+        # 全量重建：清空输出文件和清单
+        for path in (OUTPUT_FILE, MANIFEST_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+    manifest = SourceManifest(MANIFEST_FILE)
+    with metrics.timer("index"):
+        index = CorpusIndex.build(INPUT_DIR)
+    metrics.inc("files_rescanned", index.rescanned)
+
+    # 遍历语料索引中的所有书，收集需要生成的任务
+    stale = set()
+    pending = []
+    with metrics.timer("plan"):
+        record_index = RecordIndex.open(OUTPUT_FILE)
+        try:
+            for filename in index.files:
+                pending.extend(process_book_file(index, filename, manifest, stale, record_index))
+        finally:
+            record_index.close()
+    for entry in manifest.prune(set(index.files)).values():
+        print(f"🗑️  源文件已删除: 《{entry['book_name']}》")
+        stale.update((entry["book_name"], chapter_name) for chapter_name in entry["chunks"])
+
+    with metrics.timer("remove_stale"):
+        removed = remove_stale_records(stale)
+    metrics.inc("stale_records_removed", removed)
+    if removed:
+        print(f"🧹 已剔除 {removed} 条过期题目。")
+    manifest.save()
+
+    total = sum(len(levels) for _, _, _, levels in pending)
+    mode = "Batch 批量提交" if quiz_engine.BATCH else f"并发 {workers} 个 worker"
+    print(f"\n🚀 需要生成 {total} 条题库，{mode}")
+
+    chunk_entries = {(entry["book_name"], chapter_name): chunk
+                     for entry in manifest.files.values()
+                     for chapter_name, chunk in entry["chunks"].items()}
+    completed = [0]
+
+    def on_result(book_name, chapter_name, level, ok):
+        if not ok:
+            return
+        # 生成成功的等级记入清单，下次运行时跳过
+        chunk_entries[(book_name, chapter_name)]["levels"].append(level)
+        completed[0] += 1
+        if completed[0] % MANIFEST_SAVE_EVERY == 0:
+            manifest.save()
+
+    try:
+        with metrics.timer("generate"):
+            success, fail = run_generation(index.iter_work_items(pending), OUTPUT_FILE, source="ai_generated_batch",
+                                           workers=workers, total=total, on_result=on_result)
+    finally:
+        manifest.save()
+
+    print(f"\n🎉 所有题库生成完毕！成功 {success} 条，失败 {fail} 条。输出文件位置: {OUTPUT_FILE}")
+    print("💡 请前往微信开发者工具 -> 云开发 -> 数据库 -> questions 集合，选择【导入】并上传此 JSON 文件（如果是遇到格式要求冲突，选“JSON 格式”会有最佳效果）。")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量生成 questions 题库（默认增量，只处理变化的书籍/章节）")
+    add_engine_arguments(parser)
+    parser.add_argument("--full", action="store_true", help="清空输出文件和清单，全量重建")
+    args = parser.parse_args()
+    configure(args)
+
     if not os.path.exists(INPUT_DIR):
         print(f"请创建文件夹 {INPUT_DIR} 并放入需要出题的 .md 文件！")
     else:
-        # 如果输出文件已存在，先清空它
-        if os.path.exists(OUTPUT_FILE):
-             os.remove(OUTPUT_FILE)
-             
-        # 遍历输入目录下的所有 md 文件
-        for filename in os.listdir(INPUT_DIR):
-            if filename.endswith(".md"):
-                file_path = os.path.join(INPUT_DIR, filename)
-                process_book_file(file_path)
-                
-        print(f"\n🎉 所有题库生成完毕！输出文件位置: {OUTPUT_FILE}")
-        print("💡 请前往微信开发者工具 -> 云开发 -> 数据库 -> questions 集合，选择【导入】并上传此 JSON 文件（如果是遇到格式要求冲突，选“JSON 格式”会有最佳效果）。")
+        # 续跑时不清空输出
+        main(workers=args.workers, full=args.full and not args.resume)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+共享的 HTTP 客户端：所有 DeepSeek 调用复用同一个连接池（keep-alive），
+连接超时与读取超时分开设置；安装了 httpx[http2] 时可选用 HTTP/2。
+
+单独运行可对比连接池与每次新建连接的单次请求耗时（可指向本地 stub 服务器）：
+    python http_client.py --bench http://127.0.0.1:8000/v1/chat/completions -n 50
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # HTTP/2 为可选功能
+    httpx = None
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 120
+
+# 可重试的网络层错误（连接失败、超时、流式响应中途断开），rate_limiter 据此决定是否退避重试
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+if httpx is not None:
+    TRANSIENT_ERRORS += (httpx.TransportError,)
+
+
+class HttpClient:
+    """
+    线程安全的连接池客户端。post() 返回的响应对象都有
+    status_code / headers / json() / raise_for_status()。
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, http2=False):
+        self.timeout = (connect_timeout, read_timeout)
+        self.http2 = False
+
+        if http2:
+            try:
+                import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+                self.http2 = httpx is not None
+            except ImportError:
+                pass
+            if not self.http2:
+                print("⚠️ 未安装 httpx[http2]，回退到 HTTP/1.1 keep-alive")
+
+        if self.http2:
+            self.session = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout))
+        else:
+            self.session = requests.Session()
+            # 不在这一层重试，重试交给 rate_limiter 统一处理
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+    def post(self, url, json=None, headers=None, stream=False, data=None, files=None):
+        """stream=True 时只读完响应头就返回，正文用 iter_lines() 逐行读取，用完需 close()"""
+        if self.http2:
+            request = self.session.build_request("POST", url, json=json, headers=headers, data=data, files=files)
+            return self.session.send(request, stream=stream)
+        return self.session.post(url, json=json, headers=headers, data=data, files=files,
+                                 timeout=self.timeout, stream=stream)
+
+    def get(self, url, headers=None):
+        if self.http2:
+            return self.session.get(url, headers=headers)
+        return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    @staticmethod
+    def iter_lines(response):
+        """逐行产出流式响应的文本（requests 返回字节，httpx 返回字符串，这里统一为 str）"""
+        for line in response.iter_lines():
+            yield line.decode('utf-8') if isinstance(line, bytes) else line
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """进程内默认的共享客户端"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
+
+
+def set_client(client):
+    global _default_client
+    with _default_lock:
+        _default_client = client
+
+# ==========================================
+# 压测：连接池 vs 每次新建连接
+# ==========================================
+def _time_calls(post, url, n):
+    payload = {"model": "bench", "messages": [{"role": "user", "content": "ping"}]}
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = post(url, payload)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def bench(url, n, http2=False):
+    timeout = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+    fresh = _time_calls(lambda u, p: requests.post(u, json=p, timeout=timeout), url, n)
+    client = HttpClient(http2=http2)
+    pooled = _time_calls(lambda u, p: client.post(u, json=p), url, n)
+    client.close()
+
+    for name, lat in [("每次新建连接", fresh), ("连接池 keep-alive", pooled)]:
+        print(f"{name:<18} 平均 {statistics.mean(lat):7.1f} ms   p50 {statistics.median(lat):7.1f} ms   "
+              f"最大 {max(lat):7.1f} ms")
+    saved = statistics.mean(fresh) - statistics.mean(pooled)
+    print(f"⚡ 每次调用平均节省 {saved:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比连接池与每次新建连接的请求耗时")
+    parser.add_argument("--bench", metavar="URL", required=True, help="压测的 chat/completions 地址")
+    parser.add_argument("-n", type=int, default=50, help="每种方式请求次数")
+    parser.add_argument("--http2", action="store_true", help="连接池使用 HTTP/2（需要 httpx[http2]）")
+    args = parser.parse_args()
+    bench(args.bench, args.n, args.http2)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+LLM 回复的本地内容寻址缓存（SQLite）。
+键为 模型 + 温度 + 完整 messages（含系统 Prompt、书名章节、等级和节选文本）的 SHA-256，
+Prompt 与原文都没变时直接复用上次的回复，不再重复付费。
+支持按总大小 / 存活时间淘汰，并统计命中与未命中次数。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache', 'llm_cache.sqlite')
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+DEFAULT_MAX_AGE_DAYS = 90
+# 每写入多少条检查一次淘汰
+EVICT_EVERY = 200
+
+
+def cache_key(model, temperature, messages):
+    """对请求内容做规范化序列化后取 SHA-256"""
+    raw = json.dumps({"model": model, "temperature": temperature, "messages": messages},
+                     ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """线程安全的 SQLite 回复缓存"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+        self.conn.commit()
+        self.evict()
+
+    def get(self, key):
+        """命中返回缓存的回复文本，否则返回 None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        with self.lock:
+            now = time.time()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode('utf-8')), now, now))
+            self.conn.commit()
+            self.puts += 1
+            need_evict = self.puts % EVICT_EVERY == 0
+        if need_evict:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目；总大小超限时按最久未访问的顺序删除"""
+        with self.lock:
+            if self.max_age:
+                self.conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if self.max_bytes and total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                stale = []
+                for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    stale.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            self.conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"命中 {self.hits} / 未命中 {self.misses} (命中率 {rate:.1f}%)"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+出题流水线的运行指标：各阶段计时、计数器、API usage 中的 Token 用量和按原因分类的重试 / 失败次数。
+各模块直接调用本模块的 timer() / inc() / add_usage()（线程安全），运行结束时由 write_report()
+追加一行 JSON 到运行报告（便于跨夜间任务画图对比耗时和成本），可选再写一份 Prometheus textfile。
+
+    python metrics.py .cache/metrics/runs.jsonl --last 7    # 查看最近几次运行的摘要
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+
+DEFAULT_REPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache', 'metrics', 'runs.jsonl')
+# Prometheus 指标名前缀
+PROM_PREFIX = "quiz_"
+# 每百万 Token 的价格（元），用于估算成本；DeepSeek 的 usage 会区分命中 / 未命中上下文缓存的输入 Token
+PRICE_INPUT_CACHE_HIT = float(os.environ.get("DEEPSEEK_PRICE_INPUT_CACHE_HIT", "0.5"))
+PRICE_INPUT_CACHE_MISS = float(os.environ.get("DEEPSEEK_PRICE_INPUT", "2"))
+PRICE_OUTPUT = float(os.environ.get("DEEPSEEK_PRICE_OUTPUT", "8"))
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format(name, labels):
+    """name{k="v",...}，报告和 Prometheus 共用的序列名"""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+class Metrics:
+    """线程安全的计数器 + 计时器集合。计时器保留每次观测值，用于报告 p50 / p95"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.timings = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def total(self, name, **labels):
+        """名为 name、且标签包含 labels 的所有计数器之和"""
+        wanted = set(labels.items())
+        with self.lock:
+            return sum(v for (n, l), v in self.counters.items() if n == name and wanted <= set(l))
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.timings.setdefault(key, []).append(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, stage, **labels):
+        """记录 with 块耗时到 stage_seconds{stage=...}（异常退出同样计入）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def add_usage(self, usage):
+        """累计一次 API 回复的 usage 字段（缺失时忽略）"""
+        if not usage:
+            return
+        prompt = usage.get("prompt_tokens") or 0
+        completion = usage.get("completion_tokens") or 0
+        hit = usage.get("prompt_cache_hit_tokens") or 0
+        self.inc("tokens", prompt, kind="prompt")
+        self.inc("tokens", completion, kind="completion")
+        if hit:
+            self.inc("tokens", hit, kind="prompt_cache_hit")
+        cost = (hit * PRICE_INPUT_CACHE_HIT + (prompt - hit) * PRICE_INPUT_CACHE_MISS
+                + completion * PRICE_OUTPUT) / 1e6
+        self.inc("cost_yuan", cost)
+
+    def snapshot(self):
+        """{"counters": {序列名: 值}, "timings": {序列名: {count, sum, max, p50, p95}}}"""
+        with self.lock:
+            counters = {_format(n, l): round(v, 6) for (n, l), v in sorted(self.counters.items())}
+            timings = {}
+            for (n, l), values in sorted(self.timings.items()):
+                timings[_format(n, l)] = {
+                    "count": len(values), "sum": round(sum(values), 4), "max": round(max(values), 4),
+                    "p50": round(_percentile(values, 50), 4), "p95": round(_percentile(values, 95), 4)}
+        return {"counters": counters, "timings": timings}
+
+    def prometheus(self, extra_labels=None):
+        """Prometheus 文本格式：计数器为 counter，计时器为 summary（含 0.5 / 0.95 分位）"""
+        extra = tuple(sorted((extra_labels or {}).items()))
+        lines = []
+        with self.lock:
+            for name in sorted({n for n, _ in self.counters}):
+                metric = PROM_PREFIX + name + "_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (n, l), v in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{_format(metric, extra + l)} {v}")
+            for name in sorted({n for n, _ in self.timings}):
+                metric = PROM_PREFIX + name
+                lines.append(f"# TYPE {metric} summary")
+                for (n, l), values in sorted(self.timings.items()):
+                    if n != name:
+                        continue
+                    for q in (0.5, 0.95):
+                        lines.append(f"{_format(metric, extra + l + (('quantile', q),))} {_percentile(values, q * 100)}")
+                    lines.append(f"{_format(metric + '_sum', extra + l)} {sum(values)}")
+                    lines.append(f"{_format(metric + '_count', extra + l)} {len(values)}")
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共用的指标集合
+METRICS = Metrics()
+inc = METRICS.inc
+total = METRICS.total
+observe = METRICS.observe
+timer = METRICS.timer
+add_usage = METRICS.add_usage
+
+
+def write_report(path, run_id, script, prom_path=None):
+    """把本次运行的指标追加为 path 中的一行 JSON；prom_path 不为空时同时写 Prometheus textfile"""
+    report = {
+        "run_id": run_id,
+        "script": script,
+        "started_at": datetime.datetime.utcfromtimestamp(METRICS.started).isoformat() + "Z",
+        "wall_seconds": round(time.time() - METRICS.started, 3),
+        **METRICS.snapshot(),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    if prom_path:
+        # textfile collector 可能随时读取，先写临时文件再原子替换
+        tmp = prom_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(f"# TYPE {PROM_PREFIX}run_wall_seconds gauge\n")
+            f.write(f'{PROM_PREFIX}run_wall_seconds{{script="{script}"}} {report["wall_seconds"]}\n')
+            f.write(METRICS.prometheus({"script": script}))
+        os.replace(tmp, prom_path)
+    return report
+
+
+def print_summary(report):
+    counters, timings = report["counters"], report["timings"]
+    print(f"{report['started_at']}  {report['script']}  {report['run_id']}  总耗时 {report['wall_seconds']:.0f}s")
+    records = {k: v for k, v in counters.items() if k.startswith("records")}
+    tokens = {k: v for k, v in counters.items() if k.startswith("tokens")}
+    retries = {k: v for k, v in counters.items() if k.startswith(("retries", "failures"))}
+    for title, group in (("记录", records), ("Token", tokens), ("重试/失败", retries)):
+        if group:
+            print(f"   {title}: " + "，".join(f"{k} = {v:g}" for k, v in group.items()))
+    if "cost_yuan" in counters:
+        print(f"   估算成本: ¥{counters['cost_yuan']:.2f}")
+    for name, t in timings.items():
+        print(f"   {name}: {t['count']} 次，合计 {t['sum']:.1f}s，p50 {t['p50'] * 1000:.0f}ms，p95 {t['p95'] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看出题运行报告")
+    parser.add_argument("path", nargs="?", default=DEFAULT_REPORT_PATH, help="运行报告文件 (JSONL)")
+    parser.add_argument("--last", type=int, default=5, help="显示最近几次运行 (默认 5)")
+    args = parser.parse_args()
+    with open(args.path, 'r', encoding='utf-8') as f:
+        reports = [json.loads(line) for line in f if line.strip()]
+    for report in reports[-args.last:]:
+        print_summary(report)
+        print()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+本地模拟的 chat/completions 服务器，供联调和压测使用（不消耗真实额度）。
+支持可配置的响应延迟、5xx 错误率、随机 429 以及按 RPM 真实限流的 429（带 Retry-After），
+普通 / 流式（SSE）两种回复，单等级（题目数组）和多等级（按等级分组的对象）两种出题 Prompt，以及章节知识包 Prompt。
+
+    python mock_llm_server.py --port 8765 --latency 0.3 --error-rate 0.02 --rate-limit 0.05
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765/v1/chat/completions python generate_quiz_pool.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COUNT_RE = re.compile(r'生成 \*{0,2}(\d+)\*{0,2} 道')
+LEVELS_RE = re.compile(r'Level (\d)')
+
+
+def fake_questions(count, seed):
+    rng = random.Random(seed)
+    return [{
+        "id": i + 1,
+        "question": f"模拟题目 {seed % 100000}-{i + 1}：下列哪一项{rng.choice(['正确', '符合原文', '最恰当'])}？",
+        "options": [f"选项{c}{rng.randint(0, 999)}" for c in "ABCD"],
+        "correctIndex": rng.randint(0, 3),
+        "explanation": "模拟解析"
+    } for i in range(count)]
+
+
+def fake_pack(seed):
+    rng = random.Random(seed)
+    return {
+        "summary": f"模拟概要 {seed % 1000}：主人公遇到了{rng.choice(['难题', '朋友', '考验'])}。",
+        "characters": [{"name": f"人物{i}", "role": "模拟角色"} for i in range(rng.randint(2, 5))],
+        "plot_beats": [f"模拟情节{i}" for i in range(rng.randint(3, 6))],
+        "vocabulary": [{"word": f"词语{i}", "meaning": "模拟解释"} for i in range(rng.randint(2, 6))],
+    }
+
+
+def fake_reply(messages):
+    """按 Prompt 生成合法的回复：章节知识包、读后感引导问题、多等级 Prompt 返回 {"1": [...], ...}，否则返回题目数组"""
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    seed = hash(user) & 0xFFFFFFFF
+    if "章节知识包" in system:
+        return json.dumps(fake_pack(seed), ensure_ascii=False)
+    if "读后感" in system:
+        return json.dumps([f"🤔 引导问题 {seed % 97}-{i}？" for i in range(1, 6)], ensure_ascii=False)
+    match = COUNT_RE.search(user) or COUNT_RE.search(system)
+    count = int(match.group(1)) if match else 10
+    if "纯 JSON 对象" in system:
+        levels = sorted(set(LEVELS_RE.findall(user))) or ["1", "2", "3"]
+        return json.dumps({lv: fake_questions(count, seed + int(lv)) for lv in levels}, ensure_ascii=False)
+    return json.dumps(fake_questions(count, seed), ensure_ascii=False)
+
+
+class MockState:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.window = []  # 最近一分钟内放行的请求时间
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0}
+
+    def admit(self):
+        """返回 None 表示放行，否则返回 (状态码, Retry-After)"""
+        args = self.args
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            if args.rpm_limit:
+                self.window = [t for t in self.window if now - t < 60]
+                if len(self.window) >= args.rpm_limit:
+                    self.stats["throttled"] += 1
+                    return 429, max(1, int(60 - (now - self.window[0])) + 1)
+            if random.random() < args.rate_limit:
+                self.stats["throttled"] += 1
+                return 429, args.retry_after
+            if random.random() < args.error_rate:
+                self.stats["errors"] += 1
+                return random.choice([500, 502, 503]), None
+            self.window.append(now)
+            self.stats["ok"] += 1
+        return None
+
+
+def make_handler(state):
+    args = state.args
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 小包立即发送，避免 Nagle + 延迟 ACK 给 keep-alive 连接凭空加 40ms
+        disable_nagle_algorithm = True
+
+        def log_message(self, *a):
+            pass
+
+        def _send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                return self._send(200, json.dumps(state.stats).encode(), {"Content-Type": "application/json"})
+            self._send(404)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            rejected = state.admit()
+            if rejected:
+                status, retry_after = rejected
+                return self._send(status, b'{"error": {"message": "mock"}}',
+                                  {"Retry-After": str(retry_after)} if retry_after else None)
+
+            time.sleep(max(0.0, random.gauss(args.latency, args.jitter)))
+            content = fake_reply(body.get("messages") or [])
+            prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages") or [])
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content),
+                     "total_tokens": prompt_tokens + len(content)}
+
+            if not body.get("stream"):
+                out = {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage}
+                return self._send(200, json.dumps(out, ensure_ascii=False).encode(),
+                                  {"Content-Type": "application/json"})
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i in range(0, len(content), 16):
+                    self._chunk({"choices": [{"delta": {"content": content[i:i + 16]}}]})
+                self._chunk({"choices": [], "usage": usage})
+                self._chunk_raw("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # 客户端提前中止
+
+        def _chunk(self, event):
+            self._chunk_raw("data: " + json.dumps(event, ensure_ascii=False) + "\n\n")
+
+        def _chunk_raw(self, text):
+            data = text.encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+    return Handler
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="本地模拟的 chat/completions 服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="平均响应延迟秒数")
+    parser.add_argument("--jitter", type=float, default=0.05, help="延迟的标准差")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 5xx 的比例")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="随机返回 429 的比例")
+    parser.add_argument("--retry-after", type=int, default=1, help="随机 429 携带的 Retry-After 秒数")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="每分钟放行的请求数上限，超出返回 429（0 不限）")
+    return parser
+
+
+def serve(args):
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockState(args)))
+    server.daemon_threads = True
+    print(f"🧪 模拟服务器已启动: http://{args.host}:{server.server_port}/v1/chat/completions", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve(build_parser().parse_args())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+近似重复文本检测（NumPy 向量化的 MinHash + LSH）。
+所有文本一次性拼接成码点数组，字符 k-gram 哈希、MinHash 签名、分桶和相似度校验都是整批数组运算，
+没有两两比较的 Python 循环，几万道题也只需几秒。
+"""
+import re
+
+import numpy as np
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+# 16 个 band × 8 行：Jaccard 约 0.7 以上的文本大概率落入同一个桶
+BANDS = 16
+DEFAULT_THRESHOLD = 0.7
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+# 每次参与运算的 (排列数 × shingle 数) 上限，控制内存
+_BLOCK_ELEMENTS = 1 << 23
+
+_NORMALIZE_RE = re.compile(r'[\s\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """去掉空白和标点、统一小写，只比较文字本身"""
+    return _NORMALIZE_RE.sub('', text).lower()
+
+
+def shingle_hashes(texts, k=SHINGLE_SIZE):
+    """
+    所有文本的字符 k-gram 的 32 位哈希。返回 (hashes, owners)：
+    hashes[i] 属于第 owners[i] 个文本，owners 升序。短于 k 的文本整体算一个 shingle，空文本没有 shingle。
+    """
+    lengths = np.array([len(t) for t in texts], dtype=np.int64)
+    # 每个文本后补 k-1 个 \0，k-gram 不会跨越文本边界
+    sep = "\0" * (k - 1)
+    codes = np.frombuffer((sep.join(texts) + sep).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    starts = np.concatenate(([0], np.cumsum(lengths + k - 1)[:-1]))
+
+    owners_all = np.repeat(np.arange(len(texts)), lengths + k - 1)
+    pos = np.arange(len(codes)) - starts[owners_all]
+    valid = (pos < np.maximum(lengths[owners_all] - k + 1, np.minimum(lengths[owners_all], 1)))
+
+    h = np.zeros(len(codes), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for j in range(k):
+            shifted = np.zeros(len(codes), dtype=np.uint64)
+            shifted[:len(codes) - j] = codes[j:]
+            h = h * np.uint64(0x100000001B3) + shifted
+        # xor-shift 混合后取高 32 位
+        h ^= h >> np.uint64(29)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(32)
+    return h[valid] & _MAX_HASH, owners_all[valid]
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM, seed=1):
+    """每个文本一行 num_perm 列的 MinHash 签名（uint64）；空文本的签名全为最大值"""
+    hashes, owners = shingle_hashes(texts)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+
+    sig = np.full((len(texts), num_perm), _MAX_HASH, dtype=np.uint64)
+    if len(hashes) == 0:
+        return sig
+    # 每个非空文本的第一个 shingle 的位置
+    present, seg_starts = np.unique(owners, return_index=True)
+    block = max(1, _BLOCK_ELEMENTS // len(hashes))
+    for lo in range(0, num_perm, block):
+        hi = min(num_perm, lo + block)
+        values = (a[lo:hi, None] * hashes[None, :] + b[lo:hi, None]) % _MERSENNE & _MAX_HASH
+        sig[present, lo:hi] = np.minimum.reduceat(values, seg_starts, axis=1).T
+    return sig
+
+
+def candidate_pairs(sig, groups=None, bands=BANDS, threshold=DEFAULT_THRESHOLD):
+    """
+    LSH 分桶找候选对，并用签名估计的 Jaccard 相似度校验。
+    groups（可选，整数数组）不同的文本不会配对，例如只在同一本书内查重。
+    返回两个等长数组 (i, j)。
+    """
+    n, num_perm = sig.shape
+    rows = num_perm // bands
+    nonempty = np.flatnonzero(sig[:, 0] != _MAX_HASH)
+    if len(nonempty) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    group_col = (np.zeros(n, dtype=np.uint64) if groups is None else np.asarray(groups, dtype=np.uint64))[nonempty]
+
+    left, right = [], []
+    for band in range(bands):
+        keys = np.column_stack((group_col, sig[nonempty, band * rows:(band + 1) * rows]))
+        _, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        sorted_inv = inverse[order]
+        bucket_start = np.flatnonzero(np.concatenate(([True], sorted_inv[1:] != sorted_inv[:-1])))
+        bucket_size = np.diff(np.concatenate((bucket_start, [len(order)])))
+        # 桶内每个成员都与桶里第一个成员比较（线性，而不是桶内两两比较）
+        first = np.repeat(order[bucket_start], bucket_size)
+        mask = first != order
+        if not mask.any():
+            continue
+        i, j = nonempty[first[mask]], nonempty[order[mask]]
+        similar = (sig[i] == sig[j]).mean(axis=1) >= threshold
+        left.append(i[similar])
+        right.append(j[similar])
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(left), np.concatenate(right)
+
+
+def near_duplicate_clusters(texts, groups=None, threshold=DEFAULT_THRESHOLD):
+    """返回长度与 texts 相同的簇编号数组：互为近似重复的文本簇编号相同（取簇内最小下标）"""
+    sig = minhash_signatures([normalize(t) for t in texts])
+    i, j = candidate_pairs(sig, groups, threshold=threshold)
+
+    parent = list(range(len(texts)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for x, y in zip(i.tolist(), j.tolist()):
+        rx, ry = find(x), find(y)
+        if rx != ry:
+            parent[max(rx, ry)] = min(rx, ry)
+    return np.array([find(x) for x in range(len(texts))], dtype=np.int64)
@@ -0,0 +1,684 @@
+#!/usr/bin/env python3
+"""
+题库生成引擎：generate_quiz_pool.py / retry_failed_quiz.py / retry_first3_chapters.py 共用。
+负责调用 DeepSeek 出题、组装云数据库记录，并以有界线程池并发执行，
+所有结果由主线程单独写入 JSONL，保证行与行之间不会交错。
+"""
+import os
+import sys
+import atexit
+import json
+import re
+import datetime
+import hashlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import http_client
+import metrics
+from batch_api import (DEFAULT_POLL_INTERVAL, LocalBatchBackend, OpenAIBatchBackend, http_responder,
+                       iter_batch_output, read_batch_custom_ids, wait_for_batch, write_batch_input)
+from http_client import HttpClient, TRANSIENT_ERRORS
+from llm_cache import DEFAULT_CACHE_PATH, ResponseCache, cache_key
+from rate_limiter import RateLimiter, call_with_retry, non_negative_int
+from record_index import RecordIndex
+from run_journal import RunJournal, new_run_id
+from segmenter import MAX_SEGMENT_TOKENS, count_tokens, plan_parts
+from stream_parser import QuestionStreamParser, iter_sse_events
+
+# ==========================================
+# 配置区域
+# ==========================================
+API_KEY = os.environ.get("DEEPSEEK_API_KEY", "YOUR_DEEPSEEK_API_KEY_HERE")
+# 可指向本地 stub 服务器做联调/压测
+BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1/chat/completions")
+MODEL = "deepseek-chat"
+TEMPERATURE = 0.4
+
+LEVELS = [1, 2, 3]
+
+LEVEL_REQUIREMENTS = {
+    1: '考察基础情节、人物名称、核心事件等直观内容。题目必须非常简单直接。',
+    2: '考察人物动机、情节因果关系、隐含的深层含义等。需要一点点思考分析。',
+    3: '考察细节挖掘、逻辑推理、词句赏析、乃至作品背后的文化内涵或写作手法。'
+}
+
+# 默认同时在途的请求数（--workers 可覆盖）
+DEFAULT_WORKERS = int(os.environ.get("QUIZ_WORKERS", "4"))
+# 限流预算：每分钟请求数 / 每分钟 Token 数（0 表示不限制 Token）
+DEFAULT_RPM = int(os.environ.get("DEEPSEEK_RPM", "60"))
+DEFAULT_TPM = int(os.environ.get("DEEPSEEK_TPM", "0"))
+MAX_RETRIES = 5
+# 每条题库记录的题目数
+QUESTIONS_PER_RECORD = 10
+# 一次出 10 道题的回复大约消耗的 Token 数，用于 TPM 预估
+EXPECTED_COMPLETION_TOKENS = 1500
+# 多等级合并模式：同一个 Chunk 的 L1/L2/L3 在一次请求里生成（--multi-level 开启）
+MULTI_LEVEL = False
+# 流式模式：边收边校验题目数组，结构出错立即断开重试（--stream 开启）
+STREAM = False
+# 流式回复结构出错 / 中途断开时的重新请求次数
+STREAM_RETRIES = 2
+# Batch 接口地址（OpenAI 兼容的 /files、/batches 所在的前缀）
+BATCH_BASE_URL = os.environ.get("DEEPSEEK_BATCH_BASE_URL", BASE_URL.rsplit("/chat/completions", 1)[0])
+# 批量输入 / 输出文件的存放目录，以及本地模拟后端的目录
+BATCH_WORK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache', 'batches')
+DEFAULT_LOCAL_BATCH_DIR = os.path.join(BATCH_WORK_DIR, 'local')
+
+# 所有 worker 共用一个限流器，configure() 会按命令行参数重建
+LIMITER = RateLimiter(DEFAULT_RPM, DEFAULT_TPM)
+# 回复缓存，由 configure() 打开；None 表示不使用缓存
+CACHE = None
+# 所有 worker 共用的连接池客户端，configure() 会按命令行参数重建
+HTTP = http_client.get_client()
+# Batch 后端，由 configure() 按 --batch 创建；None 表示逐条实时请求
+BATCH = None
+BATCH_POLL_INTERVAL = DEFAULT_POLL_INTERVAL
+# 本次运行的日志，由 configure() 打开；None 表示不记录（例如被其它脚本当作库调用）
+JOURNAL = None
+
+def add_engine_arguments(parser):
+    """给各脚本的 argparse 加上引擎通用参数"""
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"同时在途的出题请求数 (默认 {DEFAULT_WORKERS}，1 即串行)")
+    parser.add_argument("--rpm", type=non_negative_int, default=DEFAULT_RPM,
+                        help=f"每分钟最多请求数 (默认 {DEFAULT_RPM}，0 表示不限制)")
+    parser.add_argument("--tpm", type=non_negative_int, default=DEFAULT_TPM,
+                        help="每分钟最多 Token 数 (默认不限制)")
+    parser.add_argument("--multi-level", action="store_true",
+                        help="每个 Chunk 只发一次请求，同时生成三个难度等级（失败时按等级回退）")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH,
+                        help="LLM 回复缓存文件 (SQLite)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不读写回复缓存，全部重新请求")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="续跑之前中断的运行，跳过其中已完成的任务")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式接收回复，边收边校验题目 JSON，格式出错立即中止并重试")
+    parser.add_argument("--batch", nargs="?", const="openai", choices=["openai", "local"],
+                        help="整批提交到 Batch 接口，轮询完成后写回（local 为本地模拟后端，逐条转发给 DEEPSEEK_BASE_URL）")
+    parser.add_argument("--batch-dir", default=DEFAULT_LOCAL_BATCH_DIR,
+                        help="本地模拟 Batch 后端的目录")
+    parser.add_argument("--batch-poll", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"Batch 模式轮询间隔秒数 (默认 {DEFAULT_POLL_INTERVAL})")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="HTTP 连接池大小 (默认取 --workers 与 16 中较大者)")
+    parser.add_argument("--connect-timeout", type=float, default=http_client.DEFAULT_CONNECT_TIMEOUT,
+                        help=f"建立连接的超时秒数 (默认 {http_client.DEFAULT_CONNECT_TIMEOUT})")
+    parser.add_argument("--read-timeout", type=float, default=http_client.DEFAULT_READ_TIMEOUT,
+                        help=f"等待回复的超时秒数 (默认 {http_client.DEFAULT_READ_TIMEOUT})")
+    parser.add_argument("--http2", action="store_true",
+                        help="使用 HTTP/2 多路复用（需要 httpx[http2]，未安装时回退到 HTTP/1.1）")
+    parser.add_argument("--metrics-file", default=metrics.DEFAULT_REPORT_PATH,
+                        help="运行结束时把各阶段耗时、Token 用量和重试次数追加到此 JSONL 报告（传空字符串则不写）")
+    parser.add_argument("--prom-file",
+                        help="同时写一份 Prometheus textfile（供 node_exporter 的 textfile collector 采集）")
+
+def configure(args):
+    """根据命令行参数初始化引擎"""
+    global LIMITER, MULTI_LEVEL, STREAM, CACHE, JOURNAL, HTTP, BATCH, BATCH_POLL_INTERVAL
+    LIMITER = RateLimiter(args.rpm, args.tpm)
+    STREAM = args.stream
+    pool_size = args.pool_size or max(args.workers, http_client.DEFAULT_POOL_SIZE)
+    HTTP = HttpClient(pool_size, args.connect_timeout, args.read_timeout, args.http2)
+    http_client.set_client(HTTP)
+    if args.batch == "openai":
+        BATCH = OpenAIBatchBackend(BATCH_BASE_URL, API_KEY, HTTP)
+    elif args.batch == "local":
+        BATCH = LocalBatchBackend(args.batch_dir, http_responder(HTTP, BASE_URL, API_KEY))
+    BATCH_POLL_INTERVAL = args.batch_poll
+    MULTI_LEVEL = args.multi_level
+    CACHE = None if args.no_cache else ResponseCache(args.cache_path)
+    JOURNAL = RunJournal.open(os.path.basename(sys.argv[0]), args.resume)
+    if JOURNAL.resumed:
+        print(f"📝 续跑 {JOURNAL.summary()}")
+    else:
+        print(f"📝 运行 ID: {JOURNAL.run_id}（中断后可用 --resume {JOURNAL.run_id} 续跑）")
+    # 正常结束、出错或 Ctrl-C 中断都会写出本次运行的指标
+    if args.metrics_file:
+        atexit.register(_write_metrics, args.metrics_file, args.prom_file, JOURNAL.run_id,
+                        os.path.basename(sys.argv[0]))
+
+def _write_metrics(path, prom_path, run_id, script):
+    report = metrics.write_report(path, run_id, script, prom_path)
+    cost = report["counters"].get("cost_yuan")
+    print(f"📈 运行指标已写入 {path}" + (f"（估算成本 ¥{cost:.2f}）" if cost else ""))
+
+# ==========================================
+# 出题
+# ==========================================
+def build_messages(book_name, chapter_name, chunk_text, level, count=QUESTIONS_PER_RECORD):
+    """组装单个难度等级的出题 Prompt（count 为本次出题数）"""
+    req_desc = LEVEL_REQUIREMENTS[level]
+
+    system_prompt = f"""你是一位专业的阅读理解出题专家。你的任务是基于给定的原著节选文本，生成高质量的单项选择题。
+
+【出题规则】
+1. **书名**：《{book_name}》
+2. **章节名称**：{chapter_name}
+3. **难度等级**：Level {level}。要求：{req_desc}
+4. **题目数量**：必须生成 **{count}** 道单选题。
+5. **绝对忠于文本**：所有题目的答案必须能够从给定的节选文本中找到依据。
+6. **输出格式**：必须且只能输出一个 **纯 JSON 数组**，不要包含任何 Markdown 代码块标签（如 ```json），也不要解释文字。
+格式范例：
+[
+  {{
+    "id": 1,
+    "question": "题目内容？",
+    "options": ["选项A", "选项B", "选项C", "选项D"],
+    "correctIndex": 0,
+    "explanation": "解析内容"
+  }}
+]
+"""
+    user_prompt = f"以下是节选文本内容：\n\n{chunk_text}\n\n请针对以上文本，严格按照要求的难度等级（Level {level}）生成 {count} 道选择题。"
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def build_multi_level_messages(book_name, chapter_name, chunk_text, levels):
+    """组装一次生成多个难度等级的 Prompt，要求按等级分组输出"""
+    level_rules = "\n".join(f"   - Level {lv}：{LEVEL_REQUIREMENTS[lv]}" for lv in levels)
+    keys = ", ".join(f'"{lv}"' for lv in levels)
+
+    system_prompt = f"""你是一位专业的阅读理解出题专家。你的任务是基于给定的原著节选文本，按多个难度等级分别生成高质量的单项选择题。
+
+【出题规则】
+1. **书名**：《{book_name}》
+2. **章节名称**：{chapter_name}
+3. **难度等级**：需要同时生成以下每个等级的题目，各等级之间题目不要重复：
+{level_rules}
+4. **题目数量**：每个等级必须生成 **10** 道单选题。
+5. **绝对忠于文本**：所有题目的答案必须能够从给定的节选文本中找到依据。
+6. **输出格式**：必须且只能输出一个 **纯 JSON 对象**，键为等级编号（{keys}），值为该等级的题目数组，不要包含任何 Markdown 代码块标签（如 ```json），也不要解释文字。
+格式范例：
+{{
+  "1": [
+    {{
+      "id": 1,
+      "question": "题目内容？",
+      "options": ["选项A", "选项B", "选项C", "选项D"],
+      "correctIndex": 0,
+      "explanation": "解析内容"
+    }}
+  ]
+}}
+"""
+    level_list = "、".join(f"Level {lv}" for lv in levels)
+    user_prompt = f"以下是节选文本内容：\n\n{chunk_text}\n\n请针对以上文本，分别为 {level_list} 各生成 10 道选择题。"
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def strip_code_fence(reply):
+    """清理多余的 Markdown 标记"""
+    cleaned = re.sub(r'^```json\s*', '', reply)
+    cleaned = re.sub(r'\s*```$', '', cleaned)
+    return cleaned.strip()
+
+def normalize_questions(questions):
+    """兜底规范化格式"""
+    valid = []
+    for i, q in enumerate(questions):
+        ans = q.get('correctIndex', q.get('answer', 0))  # 兼容 answer 或 correctIndex
+        valid.append({
+            "id": i + 1,
+            "question": q.get('question', ''),
+            "options": q.get('options', [])[:4],
+            "correctIndex": ans if isinstance(ans, int) else 0,
+            "explanation": q.get('explanation', '暂无解析')
+        })
+    return valid
+
+def estimate_tokens(messages, completion_tokens=EXPECTED_COMPLETION_TOKENS):
+    """粗略估算一次请求的 Token 消耗（中文约 1 字 1 Token，偏保守）"""
+    return sum(len(m["content"]) for m in messages) + completion_tokens
+
+def _headers():
+    return {
+        "Authorization": f"Bearer {API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+def chat_completion(messages, completion_tokens=EXPECTED_COMPLETION_TOKENS):
+    """在共享限流器控制下调用 chat/completions，返回回复文本"""
+    headers = _headers()
+    payload = {
+        "model": MODEL,
+        "messages": messages,
+        "temperature": TEMPERATURE
+    }
+    estimated = estimate_tokens(messages, completion_tokens)
+    response = call_with_retry(
+        lambda: HTTP.post(BASE_URL, json=payload, headers=headers),
+        LIMITER, tokens=estimated, max_retries=MAX_RETRIES)
+    data = response.json()
+    metrics.add_usage(data.get("usage"))
+    LIMITER.settle(estimated, data.get("usage", {}).get("total_tokens"))
+    return data["choices"][0]["message"]["content"]
+
+def stream_completion(messages, completion_tokens=EXPECTED_COMPLETION_TOKENS):
+    """
+    流式调用 chat/completions，边收边校验题目数组，返回数组的 JSON 文本。
+    数组结构出错、题目缺字段或流中途断开时立即断开连接重新请求，最多重试 STREAM_RETRIES 次。
+    """
+    headers = _headers()
+    payload = {
+        "model": MODEL,
+        "messages": messages,
+        "temperature": TEMPERATURE,
+        "stream": True,
+        "stream_options": {"include_usage": True}
+    }
+    estimated = estimate_tokens(messages, completion_tokens)
+    for attempt in range(STREAM_RETRIES + 1):
+        response = call_with_retry(
+            lambda: HTTP.post(BASE_URL, json=payload, headers=headers, stream=True),
+            LIMITER, tokens=estimated, max_retries=MAX_RETRIES)
+        parser = QuestionStreamParser()
+        received = 0
+        usage = None
+        try:
+            with metrics.timer("stream_read"):
+                for event in iter_sse_events(HTTP.iter_lines(response)):
+                    usage = event.get("usage") or usage
+                    for choice in event.get("choices") or []:
+                        delta = (choice.get("delta") or {}).get("content") or ""
+                        received += len(delta)
+                        parser.feed(delta)
+                    if parser.done and usage:
+                        break
+            reply = parser.close()
+        except (ValueError, *TRANSIENT_ERRORS) as e:
+            # 已消耗的 Token ≈ Prompt + 已收到的内容
+            LIMITER.settle(estimated, estimated - completion_tokens + received)
+            cause = "stream_format" if isinstance(e, ValueError) else e.__class__.__name__
+            metrics.inc("tokens", received, kind="completion_aborted")
+            if attempt == STREAM_RETRIES:
+                metrics.inc("failures", cause=cause)
+                raise
+            metrics.inc("retries", cause=cause)
+            print(f"    ↻ 流式回复异常，已中止并重新请求 ({str(e)})")
+            continue
+        finally:
+            response.close()
+        metrics.add_usage(usage)
+        LIMITER.settle(estimated, (usage or {}).get("total_tokens"))
+        return reply
+
+def cached_completion(messages, parse, completion_tokens=EXPECTED_COMPLETION_TOKENS, stream=False):
+    """
+    先查回复缓存，未命中再调用 API，返回 parse(回复文本) 的结果。
+    只有 parse 成功的回复才会写入缓存，避免把坏结果固化下来。
+    stream=True 时走流式接口（仅适用于回复为题目数组的请求）。
+    """
+    key = None
+    if CACHE:
+        key = cache_key(MODEL, TEMPERATURE, messages)
+        reply = CACHE.get(key)
+        if reply is not None:
+            try:
+                result = parse(reply)
+                metrics.inc("cache", result="hit")
+                return result
+            except Exception:
+                pass  # 缓存内容无法解析就重新请求
+        metrics.inc("cache", result="miss")
+    if stream:
+        reply = stream_completion(messages, completion_tokens)
+    else:
+        reply = chat_completion(messages, completion_tokens)
+    try:
+        with metrics.timer("parse"):
+            result = parse(reply)
+    except Exception:
+        metrics.inc("failures", cause="parse")
+        raise
+    if CACHE:
+        CACHE.put(key, reply)
+    return result
+
+def parse_questions(reply):
+    return normalize_questions(json.loads(strip_code_fence(reply)))
+
+def parse_grouped_questions(reply):
+    grouped = json.loads(strip_code_fence(reply))
+    if not isinstance(grouped, dict):
+        raise ValueError("多等级回复不是 JSON 对象")
+    return grouped
+
+def build_part_messages(book_name, chapter_name, chunk_text, level):
+    """
+    按 segmenter.plan_parts 切分文本，返回每个部分的 (Prompt, 出题数)。
+    不超长的文本只有一个部分，Prompt 与不切分时完全相同（缓存照常命中）。
+    """
+    return [(build_messages(book_name, chapter_name, part_text, level, count), count)
+            for part_text, count in plan_parts(chunk_text, QUESTIONS_PER_RECORD)]
+
+def combine_parts(part_questions, counts):
+    """把各部分的题目合并为一条记录的题目（多部分时每部分最多取分配的题数，重新编号）"""
+    if len(part_questions) == 1:
+        return part_questions[0]
+    return normalize_questions([q for questions, count in zip(part_questions, counts) for q in questions[:count]])
+
+def generate_questions(book_name, chapter_name, chunk_text, level):
+    """
+    调用 DeepSeek 生成指定难度等级的题目（优先读缓存），失败返回 None。
+    超长的文本切成若干部分分别出题后合并，任一部分失败则整条失败（成功的部分已进缓存，重试时不再付费）。
+    """
+    try:
+        parts = build_part_messages(book_name, chapter_name, chunk_text, level)
+        part_questions = [
+            cached_completion(messages, parse_questions, EXPECTED_COMPLETION_TOKENS * count // QUESTIONS_PER_RECORD,
+                              stream=STREAM)
+            for messages, count in parts]
+        return combine_parts(part_questions, [count for _, count in parts])
+    except Exception as e:
+        print(f"    ❌ 生成失败 (Level {level}): {str(e)}")
+        return None
+
+def generate_multi_level(book_name, chapter_name, chunk_text, levels):
+    """
+    一次请求生成多个等级的题目，返回 {level: questions 或 None}。
+    合并回复无法解析或某个等级缺失/为空时，该等级回退为单独请求。
+    """
+    results = {}
+    try:
+        grouped = cached_completion(build_multi_level_messages(book_name, chapter_name, chunk_text, levels),
+                                    parse_grouped_questions,
+                                    completion_tokens=EXPECTED_COMPLETION_TOKENS * len(levels))
+        for level in levels:
+            questions = grouped.get(str(level), grouped.get(f"Level {level}"))
+            if isinstance(questions, list) and questions:
+                results[level] = normalize_questions(questions)
+    except Exception as e:
+        print(f"    ⚠️ 多等级合并生成失败，改为按等级生成: {str(e)}")
+
+    if len(results) < len(levels):
+        metrics.inc("multi_level_fallbacks", len(levels) - len(results))
+    for level in levels:
+        if level not in results:
+            results[level] = generate_questions(book_name, chapter_name, chunk_text, level)
+    return results
+
+def build_record(book_name, chapter_name, level, questions, source):
+    """组装符合微信云开发导入格式的 JSON 对象"""
+    return {
+        "_id": uuid.uuid4().hex,
+        "book_name": book_name,
+        "chapter": chapter_name,
+        "level": level,
+        "questions": questions,
+        "created_at": {"$date": datetime.datetime.utcnow().isoformat() + "Z"},  # 云数据库特定的日期格式
+        "source": source,
+        "version": 1
+    }
+
+# ==========================================
+# 并发执行
+# ==========================================
+def _iter_jobs(work_items, multi_level):
+    """
+    把出题任务打包成一次请求的 job（job 为若干条共享同一 Chunk 的任务）。
+    多等级模式下，相邻且书名/章节/文本相同的任务合并成一个 job。
+    """
+    job = []
+    for item in work_items:
+        if job and (not multi_level or item[:3] != job[0][:3]):
+            yield job
+            job = []
+        job.append(item)
+    if job:
+        yield job
+
+def _work(job):
+    book_name, chapter_name, chunk_text, _ = job[0]
+    with metrics.timer("job"):
+        if len(job) == 1 or count_tokens(chunk_text) > MAX_SEGMENT_TOKENS:
+            # 超长文本需要切分，不走多等级合并请求
+            return {level: generate_questions(book_name, chapter_name, chunk_text, level) for *_, level in job}
+        return generate_multi_level(book_name, chapter_name, chunk_text, [item[3] for item in job])
+
+class _RecordSink:
+    """
+    主线程中唯一的写入方：把一条任务的结果写成记录追加到 output_file（写完立即 flush），
+    同步维护旁路索引和运行日志，回调 on_result，并统计成功 / 失败数。
+    """
+
+    def __init__(self, output_file, source, total=None, on_result=None):
+        self.output_file = output_file
+        self.source = source
+        self.total = total
+        self.on_result = on_result
+        self.success = 0
+        self.fail = 0
+        self.skipped = 0
+
+    def __enter__(self):
+        # 旁路索引随写随记，供重试脚本快速查询缺失项
+        self.record_index = RecordIndex.open(self.output_file)
+        self.out_f = open(self.output_file, 'ab')
+        return self
+
+    def __exit__(self, *exc):
+        self.out_f.close()
+        self.record_index.close()
+
+    def unfinished(self, work_items):
+        """续跑时跳过日志中已完成的任务"""
+        for item in work_items:
+            if JOURNAL and JOURNAL.is_done((item[0], item[1], item[3])):
+                metrics.inc("records", status="skipped", level=item[3])
+                self.skipped += 1
+                continue
+            yield item
+
+    def emit(self, book_name, chapter_name, level, questions):
+        done = self.success + self.fail + 1
+        progress = f"[{done + self.skipped}/{self.total}]" if self.total else f"[{done}]"
+        if questions:
+            record = build_record(book_name, chapter_name, level, questions, self.source)
+            with metrics.timer("write"):
+                # 写入一行 JSON (\n 结尾，即 JSONL 格式)
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+                offset = self.out_f.tell()
+                self.out_f.write(line)
+                self.out_f.flush()
+                if JOURNAL:
+                    # 记录落盘后才在日志里标记完成，崩溃后不会漏题
+                    os.fsync(self.out_f.fileno())
+                self.record_index.add(record, offset, len(line))
+            metrics.inc("records", status="ok", level=level)
+            print(f"  {progress} ✅ 《{book_name}》{chapter_name} - Level {level}")
+            self.success += 1
+        else:
+            print(f"  {progress} ❌ 《{book_name}》{chapter_name} - Level {level}")
+            metrics.inc("records", status="failed", level=level)
+            self.fail += 1
+        if JOURNAL:
+            JOURNAL.record((book_name, chapter_name, level), bool(questions))
+        if self.on_result:
+            self.on_result(book_name, chapter_name, level, bool(questions))
+
+    def summary(self):
+        if self.skipped:
+            print(f"⏭️  续跑跳过已完成的 {self.skipped} 条任务")
+        if CACHE:
+            print(f"💾 回复缓存: {CACHE.stats()}")
+        if JOURNAL:
+            print(f"📝 {JOURNAL.summary()}")
+        return self.success, self.fail
+
+def run_generation(work_items, output_file, source, workers=DEFAULT_WORKERS, total=None, on_result=None):
+    """
+    并发生成题目并追加写入 output_file。
+    work_items: 可迭代的 (book_name, chapter_name, chunk_text, level)，可以是生成器。
+    同时在途的请求不超过 workers 个；只有主线程写文件，每条记录写完立即 flush。
+    on_result(book_name, chapter_name, level, ok) 在主线程中对每条任务回调一次。
+    开启 Batch 模式（--batch）时改为整批提交，见 run_batch。
+    返回 (成功数, 失败数)。
+    """
+    if BATCH:
+        return run_batch(work_items, output_file, source, total, on_result)
+
+    workers = max(1, workers)
+    sink = _RecordSink(output_file, source, total, on_result)
+    jobs = _iter_jobs(sink.unfinished(work_items), MULTI_LEVEL)
+
+    with sink, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def fill():
+            while len(pending) < workers:
+                try:
+                    job = next(jobs)
+                except StopIteration:
+                    return
+                pending[pool.submit(_work, job)] = job
+
+        try:
+            fill()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = pending.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        print(f"    ❌ 任务异常: {e}")
+                        results = {}
+
+                    for book_name, chapter_name, _, level in job:
+                        sink.emit(book_name, chapter_name, level, results.get(level))
+                fill()
+        except KeyboardInterrupt:
+            # 已写入的记录都已落盘，取消排队中的请求后退出
+            pool.shutdown(wait=False, cancel_futures=True)
+            if JOURNAL:
+                print(f"\n⏸️  已中断，可用 --resume {JOURNAL.run_id} 续跑")
+            raise
+
+    return sink.summary()
+
+# ==========================================
+# Batch 模式
+# ==========================================
+def batch_custom_id(book_name, chapter_name, level, part=0):
+    """批量请求的 custom_id：由任务主键和部分序号确定，续跑时重新生成也能对上"""
+    digest = hashlib.sha1(f"{book_name}\0{chapter_name}\0{level}".encode('utf-8')).hexdigest()[:20]
+    return f"{digest}-{part}"
+
+def _cached_questions(key):
+    reply = CACHE.get(key) if CACHE else None
+    if reply is not None:
+        try:
+            return parse_questions(reply)
+        except Exception:
+            pass
+    return None
+
+def _collect_batch(batch_id, batch_dir):
+    """等待批次结束并取回结果：{custom_id: (回复文本 或 None, 错误信息 或 None)}；批次失败时为空"""
+    try:
+        with metrics.timer("batch_wait"):
+            state = wait_for_batch(BATCH, batch_id, BATCH_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        if JOURNAL:
+            print(f"\n⏸️  已中断，批次 {batch_id} 仍在服务端处理，可用 --resume {JOURNAL.run_id} 继续等待")
+        raise
+    if state != "completed":
+        print(f"❌ 批次 {batch_id} 结束状态为 {state}，本批任务全部记为失败")
+        return {}
+    output_path = BATCH.fetch(batch_id, os.path.join(batch_dir, 'output.jsonl'))
+    return {custom_id: (content, error) for custom_id, content, error in iter_batch_output(output_path)}
+
+
+def _emit_batch_results(sink, items, results):
+    """按批次结果写出一批任务的记录；results 中缺少的部分记为失败"""
+    for book_name, chapter_name, level, parts in items:
+        error = None
+        for part in parts:
+            if part["questions"]:
+                continue
+            # 每个部分都尝试解析，成功的进缓存，下次重试只需补失败的部分
+            content, part_error = results.get(part["custom_id"], (None, "批次结果中没有该请求"))
+            if content is None:
+                error = part_error
+                continue
+            try:
+                with metrics.timer("parse"):
+                    part["questions"] = parse_questions(content)
+                if CACHE:
+                    CACHE.put(part["key"], content)
+            except Exception as e:
+                metrics.inc("failures", cause="parse")
+                error = str(e)
+        questions = None
+        if all(part["questions"] for part in parts):
+            questions = combine_parts([p["questions"] for p in parts], [p["count"] for p in parts])
+        else:
+            print(f"    ❌ 生成失败 (Level {level}): {error}")
+        sink.emit(book_name, chapter_name, level, questions)
+
+
+def run_batch(work_items, output_file, source, total=None, on_result=None):
+    """
+    Batch 模式：缓存未命中的任务写成一个批量输入文件整批提交，轮询到完成后
+    按原来的记录格式写回 output_file。轮询中断后用 --resume 续跑会继续等待同一个批次，不会重复提交；
+    续跑时不在那个批次里的任务（例如之后新增的章节）另外提交一个批次。
+    """
+    sink = _RecordSink(output_file, source, total, on_result)
+    batch_dir = os.path.join(BATCH_WORK_DIR, JOURNAL.run_id if JOURNAL else new_run_id())
+    os.makedirs(batch_dir, exist_ok=True)
+    input_path = os.path.join(batch_dir, 'input.jsonl')
+    pending_batch = JOURNAL.pending_batch() if JOURNAL else None
+
+    with sink:
+        # 每条任务一个或多个部分（超长文本切分），各部分为 {custom_id, key, count, questions, body}
+        items = []
+        for book_name, chapter_name, chunk_text, level in sink.unfinished(work_items):
+            parts = []
+            for i, (messages, count) in enumerate(build_part_messages(book_name, chapter_name, chunk_text, level)):
+                key = cache_key(MODEL, TEMPERATURE, messages) if CACHE else None
+                parts.append({"custom_id": batch_custom_id(book_name, chapter_name, level, i), "key": key,
+                              "count": count, "questions": _cached_questions(key),
+                              "body": {"model": MODEL, "messages": messages, "temperature": TEMPERATURE}})
+            if all(part["questions"] for part in parts):
+                sink.emit(book_name, chapter_name, level,
+                          combine_parts([p["questions"] for p in parts], [p["count"] for p in parts]))
+                continue
+            items.append((book_name, chapter_name, level, parts))
+
+        if pending_batch and items:
+            print(f"📦 继续等待之前提交的批次 {pending_batch}")
+            results = _collect_batch(pending_batch, batch_dir)
+            # 只有随那个批次提交过的任务才用它的结果（输入文件丢失时以结果为准），其余的另行提交，不记为失败
+            submitted = read_batch_custom_ids(input_path) if os.path.exists(input_path) else set(results)
+            waiting, rest = [], []
+            for item in items:
+                in_batch = all(p["questions"] or p["custom_id"] in submitted for p in item[3])
+                (waiting if in_batch else rest).append(item)
+            _emit_batch_results(sink, waiting, results)
+            if JOURNAL:
+                JOURNAL.note("batch_collected", batch_id=pending_batch)
+            items = rest
+
+        if not items:
+            return sink.summary()
+
+        requests_out = [(p["custom_id"], p["body"]) for *_, parts in items for p in parts if not p["questions"]]
+        write_batch_input(input_path, requests_out)
+        batch_id = BATCH.submit(input_path)
+        if JOURNAL:
+            JOURNAL.note("batch_submitted", batch_id=batch_id)
+        print(f"📦 已提交批次 {batch_id}：{len(items)} 条任务，{len(requests_out)} 个请求")
+
+        _emit_batch_results(sink, items, _collect_batch(batch_id, batch_dir))
+        if JOURNAL:
+            JOURNAL.note("batch_collected", batch_id=batch_id)
+
+    return sink.summary()
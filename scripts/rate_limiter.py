@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+DeepSeek 调用的共享限流器：按 RPM（每分钟请求数）和 TPM（每分钟 Token 数）双令牌桶放行，
+遇到 429 时遵守 Retry-After 并自适应降速，遇到 5xx / 网络错误时指数退避 + 随机抖动重试。
+取代各脚本里固定的 time.sleep(1)。
+"""
+import argparse
+import email.utils
+import random
+import threading
+import time
+
+import metrics
+from http_client import TRANSIENT_ERRORS
+
+# 可重试的 HTTP 状态码：限流 + 服务端临时错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """容量为 capacity、每秒补充 rate 个令牌的令牌桶（不加锁，由 RateLimiter 统一加锁）"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """还需要等待多少秒才能取出 amount 个令牌"""
+        # 单次请求超过桶容量时按满桶放行，避免永远等不到
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    线程安全的自适应限流器。
+    rpm / tpm 为上限；收到 429 后当前速率减半（不低于 min_ratio × 上限），
+    之后每次成功按 recover_step 逐步恢复到上限（AIMD）。rpm=0 / tpm=0 表示不限制请求数 / Token。
+    """
+
+    def __init__(self, rpm=60, tpm=0, min_ratio=0.1, recover_step=0.05):
+        self.max_rpm = rpm
+        self.max_tpm = tpm
+        self.min_ratio = min_ratio
+        self.recover_step = recover_step
+        self.ratio = 1.0
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _apply_ratio(self):
+        if self.requests:
+            self.requests.rate = self.max_rpm * self.ratio / 60.0
+        if self.tokens:
+            self.tokens.rate = self.max_tpm * self.ratio / 60.0
+
+    def acquire(self, tokens=0):
+        """阻塞直到本次请求（预计消耗 tokens 个 Token）可以发出"""
+        with metrics.timer("rate_limit_wait"):
+            self._acquire(tokens)
+
+    def _acquire(self, tokens):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                delay = self.paused_until - now
+                if delay <= 0:
+                    delay = 0.0
+                    if self.requests:
+                        self.requests.refill(now)
+                        delay = self.requests.wait_time(1)
+                    if self.tokens and tokens:
+                        self.tokens.refill(now)
+                        delay = max(delay, self.tokens.wait_time(tokens))
+                    if delay <= 0:
+                        if self.requests:
+                            self.requests.tokens -= 1
+                        if self.tokens and tokens:
+                            self.tokens.tokens -= min(tokens, self.tokens.capacity)
+                        return
+            time.sleep(delay)
+
+    def settle(self, estimated, actual):
+        """用 API 返回的实际 usage 修正预估的 Token 消耗"""
+        if not self.tokens or actual is None:
+            return
+        with self.lock:
+            self.tokens.tokens -= actual - estimated
+
+    def on_success(self):
+        with self.lock:
+            if self.ratio < 1.0:
+                self.ratio = min(1.0, self.ratio + self.recover_step)
+                self._apply_ratio()
+
+    def on_throttle(self, retry_after=None):
+        """收到 429：全体暂停 retry_after 秒，并把速率减半"""
+        with self.lock:
+            self.ratio = max(self.min_ratio, self.ratio / 2)
+            self._apply_ratio()
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+def non_negative_int(value):
+    """argparse 用的类型：--rpm / --tpm 等限速参数不能为负数（0 表示不限制）"""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"不能为负数: {value}")
+    return number
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """第 attempt 次重试（从 0 开始）的等待时间：指数退避 + full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retry(send, limiter, tokens=0, max_retries=5, base_delay=1.0):
+    """
+    在限流器控制下执行 send()（返回 HttpClient.post 的响应）。
+    429 / 5xx / 连接错误 / 超时会重试，其它 4xx 直接抛出；重试用尽后抛出最后一次的错误。
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire(tokens)
+        try:
+            with metrics.timer("http_request"):
+                response = send()
+        except TRANSIENT_ERRORS as e:
+            cause = e.__class__.__name__
+            if attempt == max_retries:
+                metrics.inc("failures", cause=cause)
+                raise
+            delay = backoff_delay(attempt, base_delay)
+            metrics.inc("retries", cause=cause)
+            metrics.observe("backoff_sleep_seconds", delay, cause=cause)
+            print(f"    ⏳ 网络错误 ({cause})，{delay:.1f}s 后第 {attempt + 1} 次重试...")
+            time.sleep(delay)
+            continue
+
+        cause = f"http_{response.status_code}"
+        if response.status_code not in RETRYABLE_STATUS:
+            if response.status_code >= 400:
+                metrics.inc("failures", cause=cause)
+                # 抛错前归还连接，否则每个 4xx 都占着连接池里的一个连接
+                response.close()
+            response.raise_for_status()
+            limiter.on_success()
+            return response
+
+        if attempt == max_retries:
+            metrics.inc("failures", cause=cause)
+            response.close()
+            response.raise_for_status()
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if response.status_code == 429:
+            limiter.on_throttle(retry_after)
+        delay = retry_after if retry_after is not None else backoff_delay(attempt, base_delay)
+        metrics.inc("retries", cause=cause)
+        metrics.observe("backoff_sleep_seconds", delay, cause=cause)
+        print(f"    ⏳ HTTP {response.status_code}，{delay:.1f}s 后第 {attempt + 1} 次重试...")
+        # 及时归还连接池里的连接，不要等垃圾回收
+        response.close()
+        time.sleep(delay)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+题库输出文件（database_export_batch.json）的旁路索引：<输出文件>.idx.sqlite。
+记录每条题库的 (book_name, chapter, level) 和它在 JSONL 中的字节偏移，写题时同步维护；
+查询「已有 / 缺失哪些」只读索引，不再逐行 json.loads 整个题库（包括 10 道题的正文）。
+输出文件被其它程序追加过时，只补扫索引之后新增的尾部；被整体重写时自动重建。
+"""
+import json
+import os
+import re
+import sqlite3
+from collections import Counter
+
+# 引擎写出的记录以固定顺序的键开头，直接用正则取出主键，不解析 questions
+RECORD_HEAD_RE = re.compile(
+    r'^\{"_id": ("(?:[^"\\]|\\.)*"), "book_name": ("(?:[^"\\]|\\.)*"), '
+    r'"chapter": ("(?:[^"\\]|\\.)*"), "level": (\d+)')
+
+
+def parse_record_key(line):
+    """从一行 JSONL 中取出 (_id, book_name, chapter, level)，无法识别返回 None"""
+    m = RECORD_HEAD_RE.match(line)
+    if m:
+        return json.loads(m.group(1)), json.loads(m.group(2)), json.loads(m.group(3)), int(m.group(4))
+    try:
+        r = json.loads(line)
+        return r.get('_id'), r['book_name'], r['chapter'], r['level']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class RecordIndex:
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.path = output_file + '.idx.sqlite'
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                book_name TEXT NOT NULL,
+                chapter TEXT NOT NULL,
+                level INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                record_id TEXT
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_key ON records(book_name, chapter, level)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self.conn.commit()
+        self.sync()
+
+    @classmethod
+    def open(cls, output_file):
+        return cls(output_file)
+
+    def _meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def sync(self):
+        """让索引追上输出文件：文件被重写（inode 变化或变短）时重建，否则只扫描新增的尾部"""
+        if not os.path.exists(self.output_file):
+            self.conn.execute("DELETE FROM records")
+            self._set_meta("indexed_bytes", 0)
+            self._set_meta("inode", 0)
+            self.conn.commit()
+            return
+
+        stat = os.stat(self.output_file)
+        indexed = self._meta("indexed_bytes") or 0
+        if self._meta("inode") != stat.st_ino or stat.st_size < indexed:
+            self.conn.execute("DELETE FROM records")
+            indexed = 0
+        if stat.st_size == indexed:
+            return
+
+        rows = []
+        with open(self.output_file, 'rb') as f:
+            f.seek(indexed)
+            offset = indexed
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 正在写入的半行，下次再补
+                key = parse_record_key(raw.decode('utf-8'))
+                if key:
+                    record_id, book_name, chapter, level = key
+                    rows.append((book_name, chapter, level, offset, len(raw), record_id))
+                offset += len(raw)
+        self.conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._set_meta("indexed_bytes", offset)
+        self._set_meta("inode", stat.st_ino)
+        self.conn.commit()
+
+    def add(self, record, offset, length):
+        """写题时调用：登记刚追加到输出文件 offset 处、长度 length 字节的记录"""
+        self.conn.execute("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                          (record["book_name"], record["chapter"], record["level"],
+                           offset, length, record.get("_id")))
+        self._set_meta("indexed_bytes", offset + length)
+        self._set_meta("inode", os.stat(self.output_file).st_ino)
+        self.conn.commit()
+
+    def missing(self, expected, book=None, level=None):
+        """
+        expected 中还没有题库的 key（保持 expected 的顺序），可按书名 / 等级过滤。
+        expected 先写进临时表，过滤和差集都在 SQLite 里按 idx_key 完成，不把已有 key 全部取回 Python。
+        """
+        self.conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS expected (
+                seq INTEGER PRIMARY KEY,
+                book_name TEXT NOT NULL,
+                chapter TEXT NOT NULL,
+                level INTEGER NOT NULL
+            )""")
+        self.conn.execute("DELETE FROM temp.expected")
+        self.conn.executemany("INSERT INTO temp.expected (book_name, chapter, level) VALUES (?, ?, ?)", expected)
+        rows = self.conn.execute("""
+            SELECT e.book_name, e.chapter, e.level FROM temp.expected e
+            WHERE (:book IS NULL OR e.book_name = :book)
+              AND (:level IS NULL OR e.level = :level)
+              AND NOT EXISTS (SELECT 1 FROM records r
+                              WHERE r.book_name = e.book_name AND r.chapter = e.chapter AND r.level = e.level)
+            ORDER BY e.seq""", {"book": book, "level": level}).fetchall()
+        self.conn.execute("DELETE FROM temp.expected")
+        self.conn.commit()
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+
+def missing_by_book(keys):
+    """缺失 key 按书名计数"""
+    return Counter(key[0] for key in keys)
+
+
+def missing_by_level(keys):
+    """缺失 key 按等级计数"""
+    return Counter(key[2] for key in keys)
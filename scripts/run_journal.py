@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+出题任务的运行日志（journal）：每次运行一个 run ID，对应 .cache/runs/<run_id>.jsonl。
+每完成一条 (book, chapter, level) 就追加一行并 fsync，崩溃或 Ctrl-C 后用 --resume <run_id>
+继续，已完成的任务在内存字典里 O(1) 判断跳过，不需要重新扫描输出文件。
+"""
+import datetime
+import json
+import os
+import uuid
+
+RUNS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache', 'runs')
+
+
+def new_run_id():
+    return datetime.datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+
+
+class RunJournal:
+    """
+    追加写的 JSONL 日志，每行一条：
+    {"event": "start", "run_id", "script", "at"} 或
+    {"key": [book, chapter, level], "status": "done" | "failed", "attempts": n, "at"} 或
+    {"event": "batch_submitted" | "batch_collected", "batch_id", "at"}（Batch 模式）
+    同一个 key / 同一种事件以最后一行为准。
+    """
+
+    def __init__(self, run_id, script, runs_dir=None):
+        # 调用时才取 RUNS_DIR（不写成默认参数），benchmark_pipeline.py 改了它之后日志也跟着进临时工作目录
+        runs_dir = runs_dir or RUNS_DIR
+        self.run_id = run_id
+        self.path = os.path.join(runs_dir, f'{run_id}.jsonl')
+        self.items = {}
+        self.notes = {}
+        os.makedirs(runs_dir, exist_ok=True)
+
+        self.resumed = os.path.exists(self.path)
+        if self.resumed:
+            self._replay()
+        self.f = open(self.path, 'a', encoding='utf-8')
+        self._append({"event": "start", "run_id": run_id, "script": script})
+
+    @classmethod
+    def open(cls, script, resume=None, runs_dir=None):
+        """resume 为已有 run ID 时续跑，否则新建一次运行"""
+        runs_dir = runs_dir or RUNS_DIR
+        if resume and not os.path.exists(os.path.join(runs_dir, f'{resume}.jsonl')):
+            raise SystemExit(f"❌ 找不到运行日志 {resume}，无法续跑")
+        return cls(resume or new_run_id(), script, runs_dir)
+
+    def _replay(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时写了一半的最后一行
+                if "key" in entry:
+                    self.items[tuple(entry["key"])] = entry
+                elif "event" in entry:
+                    self.notes[entry["event"]] = entry
+
+    def _append(self, entry):
+        entry["at"] = datetime.datetime.utcnow().isoformat() + "Z"
+        self.f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def is_done(self, key):
+        entry = self.items.get(key)
+        return entry is not None and entry["status"] == "done"
+
+    def attempts(self, key):
+        entry = self.items.get(key)
+        return entry["attempts"] if entry else 0
+
+    def record(self, key, ok):
+        entry = {"key": list(key), "status": "done" if ok else "failed",
+                 "attempts": self.attempts(key) + 1}
+        self._append(entry)
+        self.items[key] = entry
+
+    def note(self, event, **fields):
+        """记录一个运行级事件（如提交的批次 ID），续跑时可取回"""
+        entry = {"event": event, **fields}
+        self._append(entry)
+        self.notes[event] = entry
+
+    def pending_batch(self):
+        """已提交但还没取回结果的批次 ID，没有返回 None"""
+        submitted = self.notes.get("batch_submitted")
+        collected = self.notes.get("batch_collected")
+        if submitted and (not collected or collected["batch_id"] != submitted["batch_id"]):
+            return submitted["batch_id"]
+        return None
+
+    def summary(self):
+        done = sum(1 for e in self.items.values() if e["status"] == "done")
+        return f"运行 {self.run_id}：已完成 {done} 条，失败待重试 {len(self.items) - done} 条"
+
+    def close(self):
+        self.f.close()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+补生成任务的优先级调度和 Token / 成本预算。
+- 每条任务按 Chunk 的 Token 数估算消耗（Prompt 模板 + 节选文本 + 回复），超长文本按切分后的部分数计
+- 优先级：有学生正在读的书（user_progress 导出中 status 为 reading）> 其它书；
+  同档内低 recommend_level 优先、靠前的章节优先，正在读的书从读者当前所在章节开始往后排
+- 以章节为单位（同一章节缺的各等级一起）在预算内按优先级贪心挑选，放不下的章节跳过、继续看更便宜的，
+  尽量让预算覆盖更多完整可测的章节
+- 运行中再按 API 返回的实际 usage 把关，实际消耗到达预算就不再派发新任务
+"""
+import json
+import math
+import os
+from collections import defaultdict
+
+import metrics
+from corpus import BOOKS_IMPORT_FILE, REPO_DIR
+from quiz_engine import EXPECTED_COMPLETION_TOKENS, QUESTIONS_PER_RECORD
+from segmenter import MAX_SEGMENT_TOKENS, OVERLAP_TOKENS
+
+# 从云开发控制台导出的 user_progress 集合（JSON Lines），不存在时不区分在读的书
+PROGRESS_FILE = os.path.join(REPO_DIR, 'database_user_progress_export.json')
+# 出题 Prompt 模板本身（规则、格式范例）的 Token 数
+PROMPT_OVERHEAD_TOKENS = 450
+# 未分级的书（recommend_level 为 0）排在所有分级书之后
+UNGRADED_RANK = 99
+
+
+def estimate_item_tokens(chunk_tokens, count=QUESTIONS_PER_RECORD):
+    """单条任务（一个等级）预计消耗的 Token：超长文本切成若干部分，每部分各带一份 Prompt 模板"""
+    parts = 1
+    if chunk_tokens > MAX_SEGMENT_TOKENS:
+        parts = min(count, math.ceil(chunk_tokens / (MAX_SEGMENT_TOKENS - OVERLAP_TOKENS)))
+    prompt = chunk_tokens + parts * (PROMPT_OVERHEAD_TOKENS + OVERLAP_TOKENS)
+    return prompt + EXPECTED_COMPLETION_TOKENS * count // QUESTIONS_PER_RECORD
+
+
+def estimate_cost(prompt_tokens, completion_tokens):
+    """按未命中上下文缓存的输入价格估算（元），偏保守"""
+    return (prompt_tokens * metrics.PRICE_INPUT_CACHE_MISS + completion_tokens * metrics.PRICE_OUTPUT) / 1e6
+
+
+def load_books(path=BOOKS_IMPORT_FILE):
+    """books 集合：{书名: 书籍记录}，文件不存在返回空字典"""
+    books = {}
+    if not os.path.exists(path):
+        return books
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                book = json.loads(line)
+                books[book['title']] = book
+    return books
+
+
+def load_active_readers(path=PROGRESS_FILE, books=None):
+    """
+    读取 user_progress 导出，返回 {书名: (在读人数, 读者所在的最靠前章节下标)}。
+    记录里的 book_name 缺失时用 book_id 对照 books 集合。
+    """
+    active = {}
+    if not path or not os.path.exists(path):
+        return active
+    titles_by_id = {b.get('_id'): title for title, b in (books or {}).items()}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            progress = json.loads(line)
+            if progress.get('status') != 'reading':
+                continue
+            title = progress.get('book_name') or titles_by_id.get(progress.get('book_id'))
+            if not title:
+                continue
+            index = progress.get('current_chapter_index') or 0
+            readers, first = active.get(title, (0, index))
+            active[title] = (readers + 1, min(first, index))
+    return active
+
+
+class Budget:
+    """
+    本次运行的 Token / 成本上限（0 或 None 表示不限）。
+    计划阶段按估算值扣减；运行阶段 exhausted() 读取 metrics 中 API 实际返回的用量。
+    """
+
+    def __init__(self, max_tokens=None, max_cost=None):
+        self.max_tokens = max_tokens or 0
+        self.max_cost = max_cost or 0
+        self.tokens = 0
+        self.cost = 0.0
+
+    def __bool__(self):
+        return bool(self.max_tokens or self.max_cost)
+
+    def fits(self, tokens, cost):
+        return ((not self.max_tokens or self.tokens + tokens <= self.max_tokens)
+                and (not self.max_cost or self.cost + cost <= self.max_cost))
+
+    def reserve(self, tokens, cost):
+        self.tokens += tokens
+        self.cost += cost
+
+    def exhausted(self):
+        spent = (metrics.total("tokens", kind="prompt") + metrics.total("tokens", kind="completion")
+                 + metrics.total("tokens", kind="completion_aborted"))
+        return ((self.max_tokens and spent >= self.max_tokens)
+                or (self.max_cost and metrics.total("cost_yuan") >= self.max_cost))
+
+    def describe(self):
+        limits = []
+        if self.max_tokens:
+            limits.append(f"{self.max_tokens:,} Token")
+        if self.max_cost:
+            limits.append(f"¥{self.max_cost:.2f}")
+        return " / ".join(limits) or "不限"
+
+
+def prioritize(missing, books=None, active=None):
+    """
+    missing: [(文件名, 书名, 段, [等级...])]，每项为一个章节。
+    返回按优先级排好序的同一列表，每项后附 (估算 Token, 估算成本)。
+    """
+    books = books or {}
+    active = active or {}
+    chapter_rank = {title: {c: i for i, c in enumerate(dict.fromkeys(b.get('chapters') or []))}
+                    for title, b in books.items()}
+    position = defaultdict(int)  # 书在 books 中找不到该章节时，按索引中的顺序
+
+    def sort_key(entry):
+        _, book_name, chunk, _ = entry
+        fallback = position[book_name]
+        position[book_name] += 1
+        chapter = chapter_rank.get(book_name, {}).get(chunk["chapter"], fallback)
+        level = (books.get(book_name) or {}).get('recommend_level') or UNGRADED_RANK
+        readers, first = active.get(book_name, (0, 0))
+        if readers:
+            # 读者还没读到的章节在前，已经读过的放到最后
+            ahead = chapter - first if chapter >= first else chapter + 100000
+            return (0, ahead, -readers, level, book_name)
+        return (1, level, chapter, book_name)
+
+    keyed = [(sort_key(entry), i, entry) for i, entry in enumerate(missing)]
+    keyed.sort(key=lambda x: (x[0], x[1]))
+    result = []
+    for _, _, entry in keyed:
+        per_item = estimate_item_tokens(entry[2].get("tokens") or entry[2].get("chars") or 0)
+        completion = EXPECTED_COMPLETION_TOKENS * len(entry[3])
+        tokens = per_item * len(entry[3])
+        result.append((entry, tokens, estimate_cost(tokens - completion, completion)))
+    return result
+
+
+def plan(missing, budget, books=None, active=None):
+    """
+    按优先级在预算内挑选章节，返回 (选中的 missing 列表, 预计 Token, 预计成本, 跳过的章节数)。
+    同一章节缺的各等级一起选中或一起跳过。
+    """
+    selected = []
+    skipped = 0
+    for entry, tokens, cost in prioritize(missing, books, active):
+        if budget and not budget.fits(tokens, cost):
+            skipped += 1
+            continue
+        budget.reserve(tokens, cost)
+        selected.append(entry)
+    return selected, budget.tokens, budget.cost, skipped
+
+
+def guard(work_items, budget):
+    """运行中把关：实际消耗到达预算后不再产出新任务（已在途的请求照常完成）"""
+    for item in work_items:
+        if budget and budget.exhausted():
+            print("💰 已达到本次运行的预算上限，停止派发新任务")
+            return
+        yield item
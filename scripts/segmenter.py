@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Token 感知的分段：用本地近似分词估算文本的 Token 数，让每次出题请求的输入落在目标区间内。
+- 同一章节名下相邻的 Chunk（其中有过短的，或合并后仍不超上限）合并成一段，不再为几十个字单独发请求
+- 超过上限的文本按段落切成若干部分（相邻部分带少量重叠），10 道题按部分分配，合并为同一条题库记录
+"""
+import math
+import re
+
+# 近似分词：一个汉字算 1 个 Token，连续的字母数字每 4 个字符算 1 个，其余符号各算 1 个
+TOKEN_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]|[A-Za-z0-9]+|\S')
+SENTENCE_END_RE = re.compile(r'(?<=[。！？!?；;…])')
+
+# 出题请求输入的目标区间（Token）
+MIN_SEGMENT_TOKENS = 200
+MAX_SEGMENT_TOKENS = 3000
+# 切分时相邻部分的重叠量，避免在段落交界处丢失上下文
+OVERLAP_TOKENS = 150
+
+
+def count_tokens(text):
+    total = 0
+    for m in TOKEN_RE.finditer(text):
+        length = m.end() - m.start()
+        total += 1 if length == 1 else math.ceil(length / 4)
+    return total
+
+
+def _pieces(text, max_tokens):
+    """把文本拆成不超过 max_tokens 的小块：先按空行分段，过长的段落再按行、按句、最后按字数切"""
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            yield paragraph
+            continue
+        for line in paragraph.split('\n'):
+            if count_tokens(line) <= max_tokens:
+                if line.strip():
+                    yield line
+                continue
+            for sentence in SENTENCE_END_RE.split(line):
+                while sentence:
+                    # 连句子都超长（极少见）：按字数硬切
+                    cut = sentence[:max_tokens]
+                    sentence = sentence[max_tokens:]
+                    if cut.strip():
+                        yield cut
+
+
+def _overlap(pieces, budget):
+    """上一部分末尾不超过 budget 个 Token 的内容：尽量取整段，最后一段太长时取它末尾的几句"""
+    carried = []
+    used = 0
+    for p, t in reversed(pieces):
+        if used + t <= budget:
+            carried.insert(0, (p, t))
+            used += t
+            continue
+        tail = ""
+        for sentence in reversed([x for x in SENTENCE_END_RE.split(p) if x]):
+            if count_tokens(sentence + tail) + used > budget:
+                break
+            tail = sentence + tail
+        if tail.strip():
+            carried.insert(0, (tail.strip(), count_tokens(tail.strip())))
+        break
+    return carried
+
+
+def split_text(text, max_tokens=MAX_SEGMENT_TOKENS, overlap_tokens=OVERLAP_TOKENS):
+    """按段落边界把文本切成每部分不超过约 max_tokens 的若干部分，下一部分以上一部分末尾约 overlap_tokens 开头"""
+    parts = []
+    current = []
+    current_tokens = 0
+    for piece in _pieces(text, max_tokens):
+        tokens = count_tokens(piece)
+        if current and current_tokens + tokens > max_tokens:
+            parts.append("\n\n".join(p for p, _ in current))
+            budget = min(overlap_tokens, max_tokens - tokens)
+            current = _overlap(current, budget)
+            current_tokens = sum(t for _, t in current)
+        current.append((piece, tokens))
+        current_tokens += tokens
+    if current:
+        parts.append("\n\n".join(p for p, _ in current))
+    return parts
+
+
+def distribute(total, n):
+    """把 total 道题尽量平均地分给 n 个部分（靠前的部分多分）"""
+    return [total // n + (1 if i < total % n else 0) for i in range(n)]
+
+
+def plan_parts(text, questions):
+    """
+    返回 [(部分文本, 该部分出题数)]。不超过 MAX_SEGMENT_TOKENS 的文本原样返回一个部分；
+    超长文本切分后每部分至少分到 1 道题，因此部分数不超过 questions。
+    """
+    tokens = count_tokens(text)
+    if tokens <= MAX_SEGMENT_TOKENS:
+        return [(text, questions)]
+    max_tokens = max(MAX_SEGMENT_TOKENS, math.ceil(tokens / questions))
+    parts = split_text(text, max_tokens)
+    while len(parts) > questions:
+        max_tokens = math.ceil(max_tokens * 1.2)
+        parts = split_text(text, max_tokens)
+    return list(zip(parts, distribute(questions, len(parts))))
+
+
+def should_merge(group_tokens, next_tokens):
+    """同名相邻 Chunk 是否合并：任一方过短，或合并后不超过上限"""
+    return (group_tokens < MIN_SEGMENT_TOKENS or next_tokens < MIN_SEGMENT_TOKENS
+            or group_tokens + next_tokens <= MAX_SEGMENT_TOKENS)
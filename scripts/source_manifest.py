@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+源文件清单：记录 docs/RAG_books 下每个 .md 的 mtime、大小、内容哈希，以及由它派生出的数据
+（章节列表 / 各 Chunk 的哈希），让 generate_books_db.py、generate_quiz_pool.py 只处理真正变化的文件。
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(filepath):
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class SourceManifest:
+    """
+    JSON 格式的清单文件，结构：
+    {"version": 1, "files": {文件名: {"mtime", "size", "sha256", ...派生字段}}}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.files = data.get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 清单文件损坏，将全量重建 ({e})")
+
+    def check(self, filepath):
+        """
+        返回 (entry, fingerprint)。
+        entry 为上次记录的条目，文件内容未变时原样返回，变了则为 None；
+        fingerprint 为当前文件的 {"mtime", "size", "sha256"}。
+        mtime 和大小都没变时不读文件内容；否则计算哈希确认内容是否真的变了。
+        """
+        name = os.path.basename(filepath)
+        stat = os.stat(filepath)
+        entry = self.files.get(name)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry, {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": entry["sha256"]}
+
+        fingerprint = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": file_sha256(filepath)}
+        if entry and entry["sha256"] == fingerprint["sha256"]:
+            # 只是被 touch 过，内容没变
+            entry.update(fingerprint)
+            return entry, fingerprint
+        return None, fingerprint
+
+    def update(self, filepath, fingerprint, **derived):
+        entry = dict(fingerprint)
+        entry.update(derived)
+        self.files[os.path.basename(filepath)] = entry
+        return entry
+
+    def prune(self, names):
+        """删除不在 names 中的条目，返回被删除的条目 {文件名: entry}"""
+        removed = {n: e for n, e in self.files.items() if n not in names}
+        for n in removed:
+            del self.files[n]
+        return removed
+
+    def save(self):
+        """先写临时文件再替换，避免中途崩溃留下半个清单"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+流式出题回复的增量解析：逐段读取 SSE（text/event-stream）中的内容增量，
+边收边解析题目 JSON 数组，每道题的对象一闭合就校验。
+结构一旦出错（数组前出现多余文字、元素不是对象、题目缺字段、流在数组结束前中断）
+立即抛出 StreamFormatError，调用方可以马上断开连接重试，不必等完整回复、也不再为坏回复付完 Token。
+"""
+import json
+
+# 数组之前允许出现的 Markdown 代码块开头
+FENCE_OPEN = "```json"
+
+
+class StreamFormatError(ValueError):
+    """流式回复的结构不符合题目数组格式"""
+
+
+def iter_sse_events(lines):
+    """
+    lines: SSE 响应的文本行。逐个产出 data 行解析后的 JSON 对象，遇到 [DONE] 结束。
+    """
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue  # 空行 / 注释 / keep-alive
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        yield json.loads(data)
+
+
+def check_question(q):
+    """校验一道题的基本结构，不合格抛出 StreamFormatError"""
+    if not isinstance(q, dict):
+        raise StreamFormatError(f"数组元素不是题目对象: {q!r:.60}")
+    if not isinstance(q.get("question"), str) or not q["question"].strip():
+        raise StreamFormatError("题目缺少 question")
+    options = q.get("options")
+    if not isinstance(options, list) or len(options) < 4:
+        raise StreamFormatError(f"题目选项不足 4 个: {q['question']:.30}")
+    ans = q.get("correctIndex", q.get("answer", 0))
+    if isinstance(ans, int) and not 0 <= ans < len(options):
+        raise StreamFormatError(f"correctIndex 越界: {ans}")
+
+
+class QuestionStreamParser:
+    """
+    增量解析题目 JSON 数组。feed(text) 返回本次新闭合的题目对象列表；
+    数组闭合后 done 为 True，text 为完整的数组 JSON（不含代码块标记和前后杂项）。
+    """
+
+    def __init__(self, validate=check_question):
+        self.validate = validate
+        self.done = False
+        self.count = 0
+        self._prefix = ""
+        self._started = False
+        self._parts = []    # 已闭合的数组文本片段
+        self._obj = []      # 当前未闭合对象的字符
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_item = True
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def feed(self, text):
+        completed = []
+        for ch in text:
+            if self.done:
+                break
+            if not self._started:
+                self._feed_prefix(ch)
+            elif self._depth:
+                self._feed_object(ch, completed)
+            else:
+                self._feed_array(ch, completed)
+        return completed
+
+    def _feed_prefix(self, ch):
+        if ch == "[":
+            self._started = True
+            self._parts.append("[")
+            return
+        self._prefix += ch
+        head = self._prefix.strip()
+        if not (FENCE_OPEN.startswith(head) or (head.startswith(FENCE_OPEN) and not head[len(FENCE_OPEN):].strip())):
+            raise StreamFormatError(f"题目数组之前出现多余内容: {head[:30]!r}")
+
+    def _feed_array(self, ch, completed):
+        if ch.isspace():
+            return
+        if ch == "{" and self._expect_item:
+            self._depth = 1
+            self._obj = ["{"]
+        elif ch == "," and not self._expect_item:
+            self._expect_item = True
+        elif ch == "]" and (not self._expect_item or self.count == 0):
+            self._parts.append("]")
+            self.done = True
+        else:
+            raise StreamFormatError(f"题目数组中出现意外字符 {ch!r}（第 {self.count + 1} 题附近）")
+
+    def _feed_object(self, ch, completed):
+        self._obj.append(ch)
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+            return
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                raw = "".join(self._obj)
+                try:
+                    q = json.loads(raw)
+                except ValueError as e:
+                    raise StreamFormatError(f"第 {self.count + 1} 题不是合法 JSON: {e}")
+                if self.validate:
+                    self.validate(q)
+                self._parts.append(("," if self.count else "") + raw)
+                self.count += 1
+                self._expect_item = False
+                completed.append(q)
+
+    def close(self):
+        """流结束时调用：数组没有闭合说明回复被截断"""
+        if not self.done:
+            raise StreamFormatError(f"回复在题目数组结束前中断（已收到 {self.count} 题）")
+        return self.text
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+书名多模式匹配（Aho-Corasick 自动机）。
+sanitize_book_name 和 generate_books_db.find_grade_info 共用：一次构建，
+之后每次查询只需扫描一遍输入文本，与书单长度无关；结果按「最长匹配」确定，不依赖书单顺序。
+"""
+from collections import deque
+
+
+class TitleMatcher:
+    """
+    longest_in(text)：text 中出现的最长书名（同长取出现位置最靠前的，再按书单顺序）。
+    containing(fragment)：包含 fragment 的书名（最短优先），用于「背影 → 朱自清·背影」这类反向匹配。
+    """
+
+    def __init__(self, titles):
+        self.titles = list(dict.fromkeys(t for t in titles if t))
+        self.rank = {t: i for i, t in enumerate(self.titles)}
+        self.title_set = set(self.titles)
+        self._substrings = None
+
+        # goto 表 / 失败指针 / 每个状态结束的书名
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for title in self.titles:
+            state = 0
+            for ch in title:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][ch] = nxt
+                state = nxt
+            self.output[state].append(title)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def __contains__(self, title):
+        return title in self.title_set
+
+    def find_all(self, text):
+        """产出 text 中所有书名出现的 (起始位置, 书名)"""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for title in self.output[state]:
+                yield i - len(title) + 1, title
+
+    def longest_in(self, text):
+        """text 中出现的最长书名，没有返回 None"""
+        best = None
+        best_key = None
+        for start, title in self.find_all(text):
+            key = (-len(title), start, self.rank[title])
+            if best_key is None or key < best_key:
+                best, best_key = title, key
+        return best
+
+    def containing(self, fragment):
+        """包含 fragment 的所有书名，按长度升序（同长按书单顺序）"""
+        if self._substrings is None:
+            # 书名都很短，预先展开所有子串 → 书名，之后 O(1) 查询
+            self._substrings = {}
+            for title in self.titles:
+                seen = set()
+                for i in range(len(title)):
+                    for j in range(i + 1, len(title) + 1):
+                        sub = title[i:j]
+                        if sub not in seen:
+                            seen.add(sub)
+                            self._substrings.setdefault(sub, []).append(title)
+            for titles in self._substrings.values():
+                titles.sort(key=lambda t: (len(t), self.rank[t]))
+        return self._substrings.get(fragment, [])
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+分片上传：按 export_parts.py 写出的 manifest 并发上传各分片，代替在云开发控制台里逐个手动导入。
+- 后端可替换：wxcloud（上传到云存储后调用数据库导入接口，冲突时 upsert）、http（POST 到任意接收端）、
+  local（复制到本地目录，联调用）；本脚本的 serve 子命令就是一个本地 HTTP 接收端，可按比例注入 5xx
+- 单个分片失败只重试该分片（退避），HTTP 层的 429 / 5xx 由 rate_limiter 统一重试
+- 每个分片成功后立即记入 upload_state.json，中断后重新运行只上传尚未成功、或内容变了的分片
+
+    python upload_parts.py ../export/questions --backend wxcloud --workers 4
+    python upload_parts.py serve --port 8766 --dir /tmp/received --error-rate 0.2
+    python upload_parts.py ../export/questions --backend http --url http://127.0.0.1:8766/upload
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from export_parts import COMPRESSIONS, load_manifest, read_part
+from http_client import HttpClient
+from rate_limiter import RateLimiter, backoff_delay, call_with_retry, non_negative_int
+from source_manifest import file_sha256
+
+# ==========================================
+# 配置区域
+# ==========================================
+STATE_NAME = 'upload_state.json'
+DEFAULT_WORKERS = 4
+# 单个分片的重试次数（不含 HTTP 层的重试）
+PART_RETRIES = 3
+PART_RETRY_DELAY = 2.0
+# 上传请求的每分钟上限（云开发 HTTP API 有频率限制）
+DEFAULT_UPLOAD_RPM = 120
+
+WX_API_BASE = "https://api.weixin.qq.com"
+WX_CLOUD_ENV = os.environ.get("WX_CLOUD_ENV", "cloudbase-7gak18djbca53c89")
+WX_APPID = os.environ.get("WX_APPID", "")
+WX_APPSECRET = os.environ.get("WX_APPSECRET", "")
+# 云存储中存放导入文件的目录
+WX_STORAGE_PREFIX = "imports"
+# 数据库导入：file_type 1 = JSON Lines，conflict_mode 2 = UPSERT（_id 确定，重复导入覆盖旧记录）
+WX_IMPORT_FILE_TYPE = 1
+WX_CONFLICT_UPSERT = 2
+WX_IMPORT_POLL_INTERVAL = 3
+# 导入任务超过这么多秒仍未结束就放弃轮询，按上传失败处理（UPSERT 导入，整片重试不会产生重复记录）
+WX_IMPORT_TIMEOUT = 30 * 60
+
+
+def _raw_name(part):
+    """去掉压缩扩展名的分片文件名（导入接口只认未压缩的 JSON）"""
+    suffix = COMPRESSIONS.get(part.get("compression") or "none", "")
+    name = part["name"]
+    return name[:-len(suffix)] if suffix and name.endswith(suffix) else name
+
+# ==========================================
+# 上传后端：name 标识上传目标（上传状态按它分别记录），upload(路径, 分片, 集合名) 成功返回后端给出的凭据
+# ==========================================
+class LocalUploadBackend:
+    """复制到 directory/<集合名>/ 下，校验哈希后返回目标路径"""
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.name = f"local:{self.directory}"
+
+    def upload(self, path, part, collection):
+        dest_dir = os.path.join(self.directory, collection)
+        os.makedirs(dest_dir, exist_ok=True)
+        dest = os.path.join(dest_dir, part["name"])
+        shutil.copyfile(path, dest + ".tmp")
+        if file_sha256(dest + ".tmp") != part["sha256"]:
+            raise IOError(f"{part['name']} 复制后哈希不一致")
+        os.replace(dest + ".tmp", dest)
+        return dest
+
+
+class HttpUploadBackend:
+    """
+    POST <url>/<集合名>/<分片名>，正文为分片原样的字节，X-Content-SHA256 为其哈希。
+    接收端返回 {"sha256": ...}，与本地不一致时视为失败。
+    """
+
+    def __init__(self, url, http, limiter, token=None):
+        self.url = url.rstrip('/')
+        self.http = http
+        self.limiter = limiter
+        self.headers = {"Content-Type": "application/octet-stream"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.name = f"http:{self.url}"
+
+    def upload(self, path, part, collection):
+        with open(path, 'rb') as f:
+            body = f.read()
+        headers = dict(self.headers, **{"X-Content-SHA256": part["sha256"]})
+        response = call_with_retry(
+            lambda: self.http.post(f"{self.url}/{collection}/{part['name']}", data=body, headers=headers),
+            self.limiter)
+        received = response.json().get("sha256")
+        if received != part["sha256"]:
+            raise IOError(f"{part['name']} 接收端哈希不一致: {received}")
+        return f"{self.url}/{collection}/{part['name']}"
+
+
+class WxCloudBackend:
+    """
+    微信云开发 HTTP API：tcb/uploadfile 取上传凭据 → 表单上传到云存储 →
+    tcb/databasemigrateimport 创建导入任务 → 轮询 tcb/databasemigratequeryinfo 直到完成（最多 WX_IMPORT_TIMEOUT 秒）。
+    压缩的分片先解压再上传。
+    """
+
+    def __init__(self, env, appid, secret, http, limiter):
+        if not (appid and secret):
+            raise ValueError("wxcloud 后端需要 WX_APPID 和 WX_APPSECRET 环境变量")
+        self.env = env
+        self.appid = appid
+        self.secret = secret
+        self.http = http
+        self.limiter = limiter
+        self.name = f"wxcloud:{env}"
+        self._token = None
+        self._token_expires = 0
+        self._token_lock = threading.Lock()
+
+    def _access_token(self):
+        with self._token_lock:
+            if not self._token or time.time() > self._token_expires:
+                response = call_with_retry(lambda: self.http.get(
+                    f"{WX_API_BASE}/cgi-bin/token?grant_type=client_credential"
+                    f"&appid={self.appid}&secret={self.secret}"), self.limiter)
+                data = self._check(response.json(), "获取 access_token")
+                self._token = data["access_token"]
+                # 提前 5 分钟刷新
+                self._token_expires = time.time() + data.get("expires_in", 7200) - 300
+            return self._token
+
+    @staticmethod
+    def _check(data, action):
+        if data.get("errcode"):
+            raise RuntimeError(f"{action}失败: {data.get('errcode')} {data.get('errmsg')}")
+        return data
+
+    def _api(self, path, payload, action):
+        response = call_with_retry(lambda: self.http.post(
+            f"{WX_API_BASE}/tcb/{path}?access_token={self._access_token()}",
+            json=dict(payload, env=self.env)), self.limiter)
+        return self._check(response.json(), action)
+
+    def upload(self, path, part, collection):
+        cloud_path = f"{WX_STORAGE_PREFIX}/{collection}/{_raw_name(part)}"
+        info = self._api("uploadfile", {"path": cloud_path}, "获取上传凭据")
+        body = read_part(path)
+        response = call_with_retry(lambda: self.http.post(info["url"], data={
+            "key": cloud_path,
+            "Signature": info["authorization"],
+            "x-cos-security-token": info["token"],
+            "x-cos-meta-fileid": info["cos_file_id"],
+        }, files={"file": (_raw_name(part), body)}), self.limiter)
+        response.raise_for_status()
+
+        job = self._api("databasemigrateimport", {
+            "collection_name": collection,
+            "file_path": cloud_path,
+            "file_type": WX_IMPORT_FILE_TYPE,
+            "stop_on_error": False,
+            "conflict_mode": WX_CONFLICT_UPSERT,
+        }, "创建导入任务")
+        deadline = time.monotonic() + WX_IMPORT_TIMEOUT
+        while True:
+            status = self._api("databasemigratequeryinfo", {"job_id": job["job_id"]}, "查询导入任务")
+            if status.get("status") == "success":
+                return f"job:{job['job_id']}"
+            if status.get("status") == "fail":
+                raise RuntimeError(f"{part['name']} 导入失败: {status.get('error_msg') or status}")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{part['name']} 导入任务 {job['job_id']} 超过 {WX_IMPORT_TIMEOUT}s 仍未完成"
+                                   f"（状态: {status.get('status')}）")
+            time.sleep(WX_IMPORT_POLL_INTERVAL)
+
+
+def add_backend_arguments(parser):
+    group = parser.add_argument_group("上传")
+    group.add_argument("--backend", choices=["wxcloud", "http", "local"], default="wxcloud",
+                       help="上传后端 (默认 wxcloud)")
+    group.add_argument("--url", help="http 后端的接收地址")
+    group.add_argument("--token", default=os.environ.get("UPLOAD_TOKEN"), help="http 后端的 Bearer Token")
+    group.add_argument("--dest", help="local 后端的目标目录")
+    group.add_argument("--env", default=WX_CLOUD_ENV, help=f"wxcloud 后端的云环境 ID (默认 {WX_CLOUD_ENV})")
+    group.add_argument("--upload-workers", type=int, default=DEFAULT_WORKERS,
+                       help=f"并发上传的分片数 (默认 {DEFAULT_WORKERS})")
+    group.add_argument("--upload-rpm", type=non_negative_int, default=DEFAULT_UPLOAD_RPM,
+                       help=f"上传请求每分钟上限 (默认 {DEFAULT_UPLOAD_RPM}，0 表示不限制)")
+
+
+def make_backend(args):
+    limiter = RateLimiter(args.upload_rpm)
+    if args.backend == "local":
+        if not args.dest:
+            raise SystemExit("❌ local 后端需要 --dest")
+        return LocalUploadBackend(args.dest)
+    http = HttpClient(pool_size=args.upload_workers)
+    if args.backend == "http":
+        if not args.url:
+            raise SystemExit("❌ http 后端需要 --url")
+        return HttpUploadBackend(args.url, http, limiter, args.token)
+    return WxCloudBackend(args.env, WX_APPID, WX_APPSECRET, http, limiter)
+
+# ==========================================
+# 核心逻辑
+# ==========================================
+def load_state(parts_dir, backend_name):
+    """{分片名: 已上传内容的 sha256}，按后端分别记录"""
+    path = os.path.join(parts_dir, STATE_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get(backend_name, {})
+
+
+def save_state(parts_dir, backend_name, uploaded):
+    path = os.path.join(parts_dir, STATE_NAME)
+    state = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    state[backend_name] = uploaded
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def upload_part(backend, path, part, collection, retries=PART_RETRIES):
+    """上传一个分片，失败时退避后整片重试；重试用尽后抛出最后一次的错误"""
+    if file_sha256(path) != part["sha256"]:
+        raise IOError(f"{part['name']} 与 manifest 中的哈希不一致，请重新导出")
+    for attempt in range(retries + 1):
+        try:
+            with metrics.timer("upload_part"):
+                return backend.upload(path, part, collection)
+        except Exception as e:
+            if attempt == retries:
+                metrics.inc("failures", cause="part_upload")
+                raise
+            delay = backoff_delay(attempt, PART_RETRY_DELAY)
+            metrics.inc("retries", cause="part_upload")
+            print(f"    ⏳ {part['name']} 上传失败 ({e})，{delay:.1f}s 后第 {attempt + 1} 次重试...")
+            time.sleep(delay)
+
+
+def publish(parts_dir, backend, workers=DEFAULT_WORKERS, retries=PART_RETRIES):
+    """
+    并发上传 manifest 中尚未上传（或内容已变化）的分片，返回失败的分片数。
+    上传状态只在主线程写入，每成功一个分片保存一次。
+    """
+    manifest = load_manifest(parts_dir)
+    if manifest is None:
+        print(f"❌ {parts_dir} 下没有 manifest.json，请先导出分片")
+        return 1
+    collection = manifest["collection"]
+    uploaded = load_state(parts_dir, backend.name)
+    # 记录在分片里，WxCloudBackend 据此去掉压缩扩展名
+    parts = [dict(p, compression=manifest["compression"]) for p in manifest["parts"]]
+    pending = [p for p in parts if uploaded.get(p["name"]) != p["sha256"]]
+    print(f"🚚 {collection}: 共 {len(parts)} 个分片，已上传 {len(parts) - len(pending)} 个，"
+          f"本次上传 {len(pending)} 个 → {backend.name}")
+    if not pending:
+        return 0
+
+    start = time.time()
+    fail = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(upload_part, backend, os.path.join(parts_dir, p["name"]), p, collection, retries): p
+                   for p in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            part = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                fail += 1
+                metrics.inc("parts", status="failed")
+                print(f"  [{done}/{len(pending)}] ❌ {part['name']}: {e}")
+                continue
+            uploaded[part["name"]] = part["sha256"]
+            save_state(parts_dir, backend.name, uploaded)
+            metrics.inc("parts", status="ok")
+            metrics.inc("upload_bytes", part["stored_bytes"])
+            print(f"  [{done}/{len(pending)}] ✅ {part['name']} ({part['records']} 条)")
+
+    elapsed = time.time() - start
+    size = sum(p["stored_bytes"] for p in pending) / 1024 / 1024
+    print(f"\n{'✅' if not fail else '⚠️'} 上传完成，用时 {elapsed:.1f}s（{size:.1f} MB），失败 {fail} 个"
+          f"{'（重新运行即可只补传失败的分片）' if fail else ''}")
+    return fail
+
+# ==========================================
+# 本地 HTTP 接收端（联调用）
+# ==========================================
+def make_receiver(directory, error_rate=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if random.random() < error_rate:
+                self._reply(503, {"error": "模拟的服务端错误"})
+                return
+            # 路径最后两段为 <集合名>/<分片名>
+            segments = [s for s in self.path.split('?')[0].split('/') if s]
+            if len(segments) < 2 or {segments[-2], segments[-1]} & {'.', '..'}:
+                self._reply(400, {"error": "路径应为 /<集合名>/<分片名>"})
+                return
+            collection, name = segments[-2:]
+            sha256 = hashlib.sha256(body).hexdigest()
+            if self.headers.get("X-Content-SHA256") not in (None, sha256):
+                self._reply(400, {"error": "sha256 不一致", "sha256": sha256})
+                return
+            dest_dir = os.path.join(directory, os.path.basename(collection))
+            os.makedirs(dest_dir, exist_ok=True)
+            dest = os.path.join(dest_dir, os.path.basename(name))
+            with open(dest + ".tmp", 'wb') as f:
+                f.write(body)
+            os.replace(dest + ".tmp", dest)
+            self._reply(200, {"sha256": sha256, "bytes": len(body)})
+
+    return Handler
+
+
+def serve(args):
+    server = ThreadingHTTPServer((args.host, args.port), make_receiver(args.dir, args.error_rate))
+    server.daemon_threads = True
+    print(f"🧪 本地接收端已启动: http://{args.host}:{server.server_port}/upload → {os.path.abspath(args.dir)}",
+          flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        parser = argparse.ArgumentParser(description="本地 HTTP 接收端")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8766)
+        parser.add_argument("--dir", required=True, help="收到的分片保存目录")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="按比例返回 503，用于测试重试")
+        serve(parser.parse_args(sys.argv[2:]))
+    else:
+        parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+        parser.add_argument("parts_dir", help="export_parts.py 的输出目录（含 manifest.json）")
+        parser.add_argument("--retries", type=int, default=PART_RETRIES, help=f"单个分片的重试次数 (默认 {PART_RETRIES})")
+        add_backend_arguments(parser)
+        args = parser.parse_args()
+        failed = publish(args.parts_dir, make_backend(args), args.upload_workers, args.retries)
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,41 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def js_functions(relpath, *names):
+    """从云函数源码中取出指定的顶层函数（按花括号配对），用于在 node 里单独运行"""
+    with open(os.path.join(REPO_DIR, relpath), 'r', encoding='utf-8') as f:
+        source = f.read()
+    parts = []
+    for name in names:
+        m = re.search(r'^(?:async )?function ' + re.escape(name) + r'\(', source, re.M)
+        assert m, f"{relpath} 中找不到函数 {name}"
+        depth = 0
+        for i in range(source.index('{', m.end()), len(source)):
+            depth += {'{': 1, '}': -1}.get(source[i], 0)
+            if depth == 0:
+                parts.append(source[m.start():i + 1])
+                break
+    return "\n\n".join(parts)
+
+
+@pytest.fixture
+def run_js():
+    """运行一段 JS（可用 require('crypto')），返回它 console.log 的 JSON；没有 node 时跳过"""
+    node = shutil.which("node")
+    if not node:
+        pytest.skip("需要 node 才能核对云函数与 Python 的一致性")
+
+    def run(script):
+        result = subprocess.run([node, "-e", script], capture_output=True, text=True, timeout=30)
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout)
+
+    return run
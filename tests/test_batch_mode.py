@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import quiz_engine  # noqa: E402
+from batch_api import LocalBatchBackend, read_batch_custom_ids  # noqa: E402
+from mock_llm_server import fake_reply  # noqa: E402
+from run_journal import RunJournal  # noqa: E402
+
+TEXT = "花果山顶上有一块仙石，受天真地秀、日精月华，感之既久，遂有灵通之意。" * 5
+
+
+def responder(body):
+    content = fake_reply(body["messages"])
+    return 200, {"choices": [{"message": {"role": "assistant", "content": content}}],
+                 "usage": {"prompt_tokens": 100, "completion_tokens": 200, "total_tokens": 300}}
+
+
+def work_items(chapters):
+    return [("西游记", chapter, TEXT, level) for chapter in chapters for level in quiz_engine.LEVELS]
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(quiz_engine, "BATCH_WORK_DIR", str(tmp_path / "work"))
+    monkeypatch.setattr(quiz_engine, "BATCH_POLL_INTERVAL", 0)
+    monkeypatch.setattr(quiz_engine, "CACHE", None)
+    monkeypatch.setattr(quiz_engine, "JOURNAL", None)
+    return tmp_path
+
+
+def pending_batch(run_id, runs_dir):
+    journal = RunJournal.open("test", run_id, runs_dir)
+    journal.close()
+    return journal.pending_batch()
+
+
+def read_output(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_run_batch_end_to_end(engine, monkeypatch):
+    monkeypatch.setattr(quiz_engine, "BATCH", LocalBatchBackend(str(engine / "local"), responder))
+    output = str(engine / "out.json")
+    items = work_items(["第一回", "第二回"])
+    assert quiz_engine.run_generation(items, output, source="test") == (len(items), 0)
+    records = read_output(output)
+    assert [(r["chapter"], r["level"]) for r in records] == [(c, lv) for _, c, _, lv in items]
+    assert all(len(r["questions"]) == quiz_engine.QUESTIONS_PER_RECORD for r in records)
+    assert len(os.listdir(engine / "local")) == 1
+
+
+def test_resume_waits_for_pending_batch_and_submits_new_items(engine, monkeypatch):
+    runs_dir = str(engine / "runs")
+    local_dir = str(engine / "local")
+    output = str(engine / "out.json")
+    first = work_items(["第一回", "第二回"])
+
+    # 第一次运行：提交后在等待批次时被中断，没有任何记录写出
+    journal = RunJournal.open("test", runs_dir=runs_dir)
+    monkeypatch.setattr(quiz_engine, "JOURNAL", journal)
+    monkeypatch.setattr(quiz_engine, "BATCH", LocalBatchBackend(local_dir))
+
+    def interrupted(*args):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(quiz_engine, "wait_for_batch", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        quiz_engine.run_generation(first, output, source="test")
+    journal.close()
+    pending = pending_batch(journal.run_id, runs_dir)
+    assert pending and os.listdir(local_dir) == [pending]
+    assert not os.path.exists(output) or read_output(output) == []
+
+    # 续跑：同时多了一个新章节。之前的批次照常取回，新章节另外提交，不会记为"批次结果中没有该请求"
+    monkeypatch.undo()
+    monkeypatch.setattr(quiz_engine, "BATCH_WORK_DIR", str(engine / "work"))
+    monkeypatch.setattr(quiz_engine, "BATCH_POLL_INTERVAL", 0)
+    monkeypatch.setattr(quiz_engine, "CACHE", None)
+    journal = RunJournal.open("test", journal.run_id, runs_dir)
+    monkeypatch.setattr(quiz_engine, "JOURNAL", journal)
+    monkeypatch.setattr(quiz_engine, "BATCH", LocalBatchBackend(local_dir, responder))
+    added = work_items(["第三回"])
+    try:
+        assert quiz_engine.run_generation(first + added, output, source="test") == (len(first + added), 0)
+    finally:
+        journal.close()
+
+    records = read_output(output)
+    assert sorted((r["chapter"], r["level"]) for r in records) == sorted((c, lv) for _, c, _, lv in first + added)
+    follow_up = [b for b in os.listdir(local_dir) if b != pending]
+    assert len(follow_up) == 1
+    assert read_batch_custom_ids(os.path.join(local_dir, follow_up[0], "input.jsonl")) == {
+        quiz_engine.batch_custom_id(b, c, lv) for b, c, _, lv in added}
+    assert read_batch_custom_ids(os.path.join(local_dir, pending, "input.jsonl")) == {
+        quiz_engine.batch_custom_id(b, c, lv) for b, c, _, lv in first}
+    assert pending_batch(journal.run_id, runs_dir) is None
@@ -0,0 +1,40 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import corpus  # noqa: E402
+import bm25_index  # noqa: E402
+
+FILLER = "他们一路向西，翻山越岭，走过许多村庄和河流，遇到了形形色色的人。" * 3
+
+
+def write(directory, name, chapters):
+    body = "".join(f"## {title}\n\n{text}{FILLER}\n\n" for title, text in chapters)
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        f.write(body)
+
+
+def test_same_title_in_non_adjacent_files_shares_book_id(tmp_path, monkeypatch):
+    books = tmp_path / "books"
+    books.mkdir()
+    catalog = tmp_path / "books.json"
+    catalog.write_text("\n".join(json.dumps({"title": t}, ensure_ascii=False) for t in ("西游记", "三国演义")),
+                       encoding='utf-8')
+    monkeypatch.setattr(corpus, "CACHE_DIR", str(tmp_path / ".cache"))
+    monkeypatch.setattr(corpus, "BOOKS_IMPORT_FILE", str(catalog))
+    monkeypatch.setattr(corpus, "_title_matcher", None)
+    # 按文件名排序后三国演义夹在两个西游记文件之间
+    write(books, "RAG_西游记_原著完整版.md", [("第一回 灵根育孕源流出", "花果山上有一块仙石，迸裂出一个石猴。")])
+    write(books, "三国演义.md", [("第一回 宴桃园豪杰三结义", "刘备关羽张飞在桃园结为兄弟。")])
+    write(books, "西游记_完整试读版.md", [("第二回 悟彻菩提真妙理", "石猴拜师学艺，得名孙悟空。")])
+
+    output = str(tmp_path / "bm25.idx")
+    assert bm25_index.build(str(books), output)
+    with bm25_index.RetrievalIndex(output) as index:
+        assert sorted(index.books) == ["三国演义", "西游记"]
+        chapters = {r["chapter"] for r in index.search("石猴", k=10, book_name="西游记")}
+        assert chapters == {"第一回 灵根育孕源流出", "第二回 悟彻菩提真妙理"}
+        hits = index.search("石猴", k=10, book_name="西游记", chapter_name="第一回 灵根育孕源流出")
+        assert hits and all(r["chapter"] == "第一回 灵根育孕源流出" for r in hits)
@@ -0,0 +1,130 @@
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from build_assets import encode_png, filter_scanlines  # noqa: E402
+
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def read_chunks(png):
+    """逐块解析 PNG，校验每块的 CRC，返回 [(类型, 数据)]"""
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks, pos = [], 8
+    while pos < len(png):
+        length, kind = struct.unpack('>I4s', png[pos:pos + 8])
+        data = png[pos + 8:pos + 8 + length]
+        crc, = struct.unpack('>I', png[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(kind + data) & 0xffffffff, kind
+        chunks.append((kind, data))
+        pos += 12 + length
+    assert pos == len(png)
+    return chunks
+
+
+def unfilter(data, height, stride, bpp):
+    """按 PNG 规范逐行还原 None / Sub / Up / Average / Paeth 过滤"""
+    rows, prev, pos = [], bytearray(stride), 0
+    for _ in range(height):
+        kind, line = data[pos], bytearray(data[pos + 1:pos + 1 + stride])
+        pos += 1 + stride
+        for i in range(stride):
+            a = line[i - bpp] if i >= bpp else 0
+            b = prev[i]
+            c = prev[i - bpp] if i >= bpp else 0
+            if kind == 1:
+                line[i] = (line[i] + a) & 0xFF
+            elif kind == 2:
+                line[i] = (line[i] + b) & 0xFF
+            elif kind == 3:
+                line[i] = (line[i] + (a + b) // 2) & 0xFF
+            elif kind == 4:
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                line[i] = (line[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+            else:
+                assert kind == 0
+        rows.append(line)
+        prev = line
+    assert pos == len(data)
+    return np.array(rows, dtype=np.uint8).reshape(height, stride)
+
+
+def decode_png(png):
+    """只用 zlib 解码：返回 (RGBA 数组, 颜色类型, 位深)"""
+    chunks = read_chunks(png)
+    kinds = [k for k, _ in chunks]
+    assert kinds[0] == b'IHDR' and kinds[-1] == b'IEND'
+    width, height, depth, color_type, *rest = struct.unpack('>IIBBBBB', chunks[0][1])
+    assert rest == [0, 0, 0]
+    body = dict(chunks)
+    channels = CHANNELS[color_type]
+    stride = -(-width * channels * depth // 8)
+    raw = unfilter(zlib.decompress(b''.join(d for k, d in chunks if k == b'IDAT')),
+                   height, stride, max(1, channels * depth // 8))
+    if color_type == 3:
+        bits = np.unpackbits(raw, axis=1).reshape(height, -1, depth)[:, :width]
+        indices = (bits * (1 << np.arange(depth - 1, -1, -1))).sum(axis=2)
+        palette = np.frombuffer(body[b'PLTE'], dtype=np.uint8).reshape(-1, 3)
+        alpha = np.full(len(palette), 255, dtype=np.uint8)
+        trns = np.frombuffer(body.get(b'tRNS', b''), dtype=np.uint8)
+        alpha[:len(trns)] = trns
+        rgba = np.concatenate([palette, alpha[:, None]], axis=1)[indices]
+    else:
+        pixels = raw.reshape(height, width, channels)
+        color = pixels[..., :1].repeat(3, axis=2) if color_type in (0, 4) else pixels[..., :3]
+        alpha = pixels[..., -1:] if color_type in (4, 6) else np.full((height, width, 1), 255, np.uint8)
+        rgba = np.concatenate([color, alpha], axis=2)
+    return rgba, color_type, depth
+
+
+def image(colors, height=13, width=11, seed=24):
+    """按给定颜色列表随机填充的 RGBA 图像；宽度取奇数以覆盖低位深扫描线末尾的补齐位"""
+    rng = np.random.default_rng(seed)
+    colors = np.array(colors, dtype=np.uint8)
+    return colors[rng.integers(0, len(colors), size=(height, width))]
+
+
+@pytest.mark.parametrize("colors, color_type, depth", [
+    ([(0, 0, 0, 0), (250, 100, 20, 255)], 3, 1),
+    ([(0, 0, 0, 0), (10, 20, 30, 128), (250, 100, 20, 255), (1, 2, 3, 255)], 3, 2),
+    ([(i * 40, 255 - i * 40, 7, 255 if i % 2 else 90) for i in range(6)], 3, 4),
+    ([(i, 2 * i % 256, 255 - i, 255 if i % 3 else i) for i in range(150)], 3, 8),
+])
+def test_palette_round_trip(colors, color_type, depth):
+    rgba = image(colors)
+    decoded, kind, bits = decode_png(encode_png(rgba))
+    assert (kind, bits) == (color_type, depth)
+    assert np.array_equal(decoded, rgba)
+
+
+def test_gray_and_truecolor_round_trip():
+    rng = np.random.default_rng(24)
+    gray = rng.integers(0, 256, size=(9, 17), dtype=np.uint8)
+    alpha = rng.integers(0, 256, size=(9, 17), dtype=np.uint8)
+    cases = {
+        0: np.stack([gray, gray, gray, np.full_like(gray, 255)], axis=2),
+        4: np.stack([gray, gray, gray, alpha], axis=2),
+        2: np.concatenate([rng.integers(0, 256, size=(9, 17, 3), dtype=np.uint8),
+                           np.full((9, 17, 1), 255, np.uint8)], axis=2),
+        6: rng.integers(0, 256, size=(9, 17, 4), dtype=np.uint8),
+    }
+    for color_type, rgba in cases.items():
+        decoded, kind, depth = decode_png(encode_png(rgba))
+        assert (kind, depth) == (color_type, 8)
+        assert np.array_equal(decoded, rgba)
+
+
+def test_filters_invert():
+    rng = np.random.default_rng(24)
+    raw = rng.integers(0, 256, size=(6, 12), dtype=np.uint8)
+    filtered = filter_scanlines(raw, 3)
+    for kind in range(5):
+        data = np.concatenate([np.full((6, 1), kind, np.uint8), filtered[kind]], axis=1).tobytes()
+        assert np.array_equal(unfilter(data, 6, 12, 3), raw)
@@ -0,0 +1,80 @@
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import dedup_quiz_pool  # noqa: E402
+from dedup_quiz_pool import MIN_QUESTIONS, dedup  # noqa: E402
+from near_dup import near_duplicate_clusters  # noqa: E402
+
+_RNG = random.Random(7)
+
+
+def distinct_text():
+    """随机汉字组成的题干，彼此之间几乎没有相同的 3-gram"""
+    return "".join(chr(_RNG.randint(0x4E00, 0x9FA5)) for _ in range(24)) + "？"
+
+
+def question(text, i):
+    return {"id": i, "question": text, "options": ["甲", "乙", "丙", "丁"], "correctIndex": 0, "explanation": ""}
+
+
+def record(level, texts, book="西游记", chapter="第一回", created="2026-01-01T00:00:00Z"):
+    return {"book_name": book, "chapter": chapter, "level": level,
+            "questions": [question(t, i) for i, t in enumerate(texts, 1)], "created_at": {"$date": created}}
+
+
+def test_near_identical_questions_share_a_cluster():
+    base = distinct_text()
+    texts = [base, base.replace("？", "?") + " ", base[:12] + "的" + base[13:], distinct_text(), distinct_text()]
+    clusters = near_duplicate_clusters(texts).tolist()
+    assert clusters[0] == clusters[1] == clusters[2] == 0
+    assert len({clusters[0], clusters[3], clusters[4]}) == 3
+    # 不同书之间不合并
+    assert near_duplicate_clusters(texts[:2], groups=[0, 1]).tolist() == [0, 1]
+
+
+def test_distinct_questions_survive():
+    records = [record(1, [distinct_text() for _ in range(10)]), record(2, [distinct_text() for _ in range(10)])]
+    kept, stats = dedup(records)
+    assert kept == records
+    assert stats["questions_removed"] == 0 and stats["duplicate_clusters"] == 0
+
+
+def test_no_record_drops_below_min_questions():
+    shared = [distinct_text() for _ in range(6)]
+    level1 = record(1, shared + [distinct_text() for _ in range(4)])
+    # 第二条记录有 6 道题与第一条近似重复，最多只能删到 MIN_QUESTIONS 道
+    level2 = record(2, [t.replace("？", "?") for t in shared] + [distinct_text() for _ in range(4)])
+    kept, stats = dedup([level1, level2])
+    assert kept[0] == level1
+    assert len(kept[1]["questions"]) == MIN_QUESTIONS
+    assert stats["questions_removed"] == 10 - MIN_QUESTIONS
+    assert stats["kept_for_min"] == 6 - (10 - MIN_QUESTIONS)
+    assert [q["id"] for q in kept[1]["questions"]] == list(range(1, MIN_QUESTIONS + 1))
+    # 同一 key 的多条记录只留一条
+    retry = record(2, [distinct_text() for _ in range(10)], created="2026-06-01T00:00:00Z")
+    kept, stats = dedup([level1, level2, retry])
+    assert stats["records_removed"] == 1 and kept[1] is retry
+
+
+def test_preview_without_apply_writes_nothing(tmp_path, monkeypatch):
+    shared = [distinct_text() for _ in range(6)]
+    output = tmp_path / "out.json"
+    lines = [json.dumps(r, ensure_ascii=False) + "\n" for r in
+             (record(1, shared + [distinct_text() for _ in range(4)]),
+              record(2, [t + " " for t in shared] + [distinct_text() for _ in range(4)]))]
+    output.write_text("".join(lines) + "不是 JSON 的行\n", encoding='utf-8')
+    before = output.read_bytes()
+    monkeypatch.setattr(dedup_quiz_pool, "OUTPUT_FILE", str(output))
+
+    dedup_quiz_pool.main(apply=False)
+    assert output.read_bytes() == before
+    assert sorted(os.listdir(tmp_path)) == ["out.json"]
+
+    dedup_quiz_pool.main(apply=True)
+    rewritten = output.read_text(encoding='utf-8').splitlines()
+    assert len(json.loads(rewritten[1])["questions"]) == MIN_QUESTIONS
+    assert rewritten[-1] == "不是 JSON 的行"
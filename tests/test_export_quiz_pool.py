@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from conftest import REPO_DIR, js_functions  # noqa: E402
+from export_quiz_pool import best_records, coverage_report, record_id  # noqa: E402
+from quiz_engine import LEVELS  # noqa: E402
+
+GENERATE_QUIZ_JS = "cloudfunctions/generateQuiz/index.js"
+# 与 generateQuiz 中 quizRecordId 注释里的例子相同；改动 _id 规则时两边要一起改
+PINNED_KEY = ("西游记", "第一回 灵根育孕源流出", 1)
+PINNED_ID = "q24ee1119f595efb846c0"
+
+
+def question(i, valid=True):
+    return {"id": i, "question": f"第 {i} 题？", "options": ["A", "B", "C", "D"] if valid else ["A"],
+            "correctIndex": 0, "explanation": ""}
+
+
+def record(chapter, level, valid, created, total=10):
+    return {"book_name": "西游记", "chapter": chapter, "level": level,
+            "questions": [question(i, i <= valid) for i in range(1, total + 1)],
+            "created_at": {"$date": created}}
+
+
+def test_record_id_is_pinned_and_shared_with_cloud_function(run_js):
+    assert record_id(*PINNED_KEY) == PINNED_ID
+    with open(os.path.join(REPO_DIR, GENERATE_QUIZ_JS), 'r', encoding='utf-8') as f:
+        assert PINNED_ID in f.read()
+    script = "const crypto = require('crypto');\n" + js_functions(GENERATE_QUIZ_JS, "quizRecordId") + \
+        f"\nconsole.log(JSON.stringify(quizRecordId(...{json.dumps(PINNED_KEY, ensure_ascii=False)})));"
+    assert run_js(script) == PINNED_ID
+
+
+def test_best_records_keeps_better_duplicate():
+    chapter = "第一回 灵根育孕源流出"
+    more_valid = record(chapter, 1, 10, "2026-01-01T00:00:00Z")
+    newer_but_worse = record(chapter, 1, 8, "2026-06-01T00:00:00Z")
+    older_tie = record(chapter, 2, 10, "2026-01-01T00:00:00Z")
+    newer_tie = record(chapter, 2, 10, "2026-06-01T00:00:00Z")
+    best = best_records([more_valid, newer_but_worse, newer_tie, older_tie])
+    assert set(best) == {("西游记", chapter, 1), ("西游记", chapter, 2)}
+    assert best[("西游记", chapter, 1)] is more_valid
+    assert best[("西游记", chapter, 2)] is newer_tie
+
+
+def test_coverage_report_counts_missing_levels():
+    catalog = {"西游记": ["第一回", "第二回", "第一回"], "三国演义": ["第一回"]}
+    keys = {("西游记", "第一回", level) for level in LEVELS} | {("西游记", "第二回", LEVELS[0]),
+                                                               ("西游记", "第九回", LEVELS[0])}
+    report = coverage_report(catalog, keys)
+    assert report["total_keys"] == 3 * len(LEVELS)
+    assert report["covered"] == len(LEVELS) + 1
+    assert report["by_book"]["西游记"] == {"covered": len(LEVELS) + 1, "total": 2 * len(LEVELS)}
+    assert report["by_book"]["三国演义"] == {"covered": 0, "total": len(LEVELS)}
+    assert report["missing"] == (
+        [{"book_name": "西游记", "chapter": "第二回", "level": lv} for lv in LEVELS[1:]]
+        + [{"book_name": "三国演义", "chapter": "第一回", "level": lv} for lv in LEVELS])
+    assert report["orphans"] == [{"book_name": "西游记", "chapter": "第九回", "level": LEVELS[0]}]
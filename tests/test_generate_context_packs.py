@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from conftest import js_functions  # noqa: E402
+from generate_context_packs import fit_pack, pack_id, render_pack  # noqa: E402
+from segmenter import count_tokens  # noqa: E402
+
+AGENT_JS = "cloudfunctions/smartDialogueAgent/index.js"
+KEYS = [("西游记", "第一回 灵根育孕源流出"), ("三国演义", "第一回"), ("Charlotte's Web", "Chapter 1")]
+
+PACK = {
+    "summary": "花果山顶的仙石迸裂，生出一只石猴。石猴带领群猴发现水帘洞，被拥立为美猴王，后来为求长生离家拜师。",
+    "characters": [{"name": "石猴", "role": "本回主角"}, {"name": "群猴", "role": "花果山的猴子们"}],
+    "plot_beats": ["仙石迸裂生石猴", "石猴发现水帘洞", "众猴拜石猴为王", "美猴王渡海求仙"],
+    "vocabulary": [{"word": "迸裂", "meaning": "突然破裂"}, {"word": "拥立", "meaning": "共同推举为王"}],
+}
+
+
+def test_pack_id_matches_cloud_function(run_js):
+    script = "const crypto = require('crypto');\n" + js_functions(AGENT_JS, "contextPackId") + \
+        f"\nconsole.log(JSON.stringify({json.dumps(KEYS, ensure_ascii=False)}.map(([b, c]) => contextPackId(b, c))));"
+    assert run_js(script) == [pack_id(b, c) for b, c in KEYS]
+
+
+def test_render_pack_matches_cloud_function(run_js):
+    script = js_functions(AGENT_JS, "renderContextPack") + \
+        f"\nconsole.log(JSON.stringify(renderContextPack({json.dumps(PACK, ensure_ascii=False)})));"
+    assert run_js(script) == render_pack(PACK)
+
+
+def test_fit_pack_respects_token_limit():
+    big = {
+        "summary": PACK["summary"] * 4,
+        "characters": PACK["characters"] * 5,
+        "plot_beats": PACK["plot_beats"] * 3,
+        "vocabulary": PACK["vocabulary"] * 5,
+    }
+    for limit in (400, 120, 60, 30):
+        fitted = fit_pack(big, limit)
+        assert count_tokens(render_pack(fitted)) <= limit
+        assert fitted["summary"]
+    # 本来就没超出的原样保留，且不改动传入的对象
+    assert fit_pack(PACK, 400) == PACK
+    assert len(big["characters"]) == 10
+
+
+def _get_context_pack(run_js, by_id, by_index, chapter, chapter_index, from_progress):
+    """用内存里的 chapter_context 集合运行云函数的 getContextPack"""
+    script = "const crypto = require('crypto');\n" + \
+        js_functions(AGENT_JS, "contextPackId", "renderContextPack", "getContextPack") + f"""
+const byId = {json.dumps(by_id, ensure_ascii=False)};
+const byIndex = {json.dumps(by_index, ensure_ascii=False)};
+const db = {{ collection: () => ({{
+    doc: id => ({{ get: async () => {{
+        if (!byId[id]) throw new Error('document not exists');
+        return {{ data: byId[id] }};
+    }} }}),
+    where: () => ({{ limit: () => ({{ get: async () => ({{ data: byIndex }}) }}) }}),
+}}) }};
+getContextPack('西游记', {json.dumps(chapter, ensure_ascii=False)}, {json.dumps(chapter_index)}, {json.dumps(from_progress)})
+    .then(r => console.log(JSON.stringify(r)));
+"""
+    return run_js(script)
+
+
+def test_context_pack_must_match_requested_chapter(run_js):
+    first = dict(PACK, book_name="西游记", chapter="第一回 灵根育孕源流出", chapter_index=0)
+    second = dict(PACK, summary="石猴拜师学艺。", book_name="西游记", chapter="第二回 悟彻菩提真妙理", chapter_index=1)
+    by_id = {pack_id("西游记", first["chapter"]): first,
+             # _id 撞上但内容是别的章节：不能用
+             pack_id("西游记", "第三回"): second}
+
+    assert _get_context_pack(run_js, by_id, [], first["chapter"], 0, False) == render_pack(first)
+    assert _get_context_pack(run_js, by_id, [second], "第三回", 2, False) is None
+    # 用户明确问了某一章（不是进度拼出的默认章节名）：点查不到就不回退到章节下标
+    assert _get_context_pack(run_js, by_id, [second], "第二回", 1, False) is None
+    # 章节名来自阅读进度时才按下标回退，且下标必须对得上
+    assert _get_context_pack(run_js, by_id, [second], "第2回", 1, True) == render_pack(second)
+    assert _get_context_pack(run_js, by_id, [second], "第3回", 2, True) is None
@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from generate_note_questions_pool import FALLBACK_EMOJI, QUESTIONS_PER_CHAPTER, parse_note_questions  # noqa: E402
+
+
+def test_keeps_first_five_and_fills_missing_emoji():
+    reply = "```json\n" + json.dumps([
+        "🦸‍♂️ 这一章里谁最让你佩服？",
+        "如果你是孙悟空会怎么做？",
+        "  ",
+        42,
+        "✨ 哪个情节最让你意外？",
+        "石猴为什么要拜师？",
+        "💡 你学到了什么？",
+        "😄 哪里最好笑？",
+    ], ensure_ascii=False) + "\n```"
+    questions = parse_note_questions(reply)
+    assert len(questions) == QUESTIONS_PER_CHAPTER
+    assert questions == [
+        "🦸‍♂️ 这一章里谁最让你佩服？",
+        f"{FALLBACK_EMOJI[1]} 如果你是孙悟空会怎么做？",
+        "✨ 哪个情节最让你意外？",
+        f"{FALLBACK_EMOJI[3]} 石猴为什么要拜师？",
+        "💡 你学到了什么？",
+    ]
+
+
+@pytest.mark.parametrize("reply", [
+    "这一章讲了石猴出世。",
+    json.dumps({"questions": ["🤔 为什么？"] * 5}, ensure_ascii=False),
+    json.dumps(["🤔 为什么？", "✨ 怎么办？", "", None, "💡 学到了什么？"], ensure_ascii=False),
+])
+def test_malformed_reply_is_rejected(reply):
+    with pytest.raises(ValueError):
+        parse_note_questions(reply)
@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import corpus  # noqa: E402
+import generate_quiz_pool  # noqa: E402
+from quiz_engine import LEVELS, build_record  # noqa: E402
+from record_index import RecordIndex  # noqa: E402
+from source_manifest import SourceManifest  # noqa: E402
+
+FILLER = "他们一路向西，翻山越岭，走过许多村庄和河流，遇到了形形色色的人。" * 3
+
+
+def test_levels_already_in_output_are_not_regenerated(tmp_path, monkeypatch):
+    books = tmp_path / "books"
+    books.mkdir()
+    catalog = tmp_path / "books.json"
+    catalog.write_text(json.dumps({"title": "西游记"}, ensure_ascii=False), encoding='utf-8')
+    monkeypatch.setattr(corpus, "CACHE_DIR", str(tmp_path / ".cache"))
+    monkeypatch.setattr(corpus, "BOOKS_IMPORT_FILE", str(catalog))
+    monkeypatch.setattr(corpus, "_title_matcher", None)
+    (books / "西游记.md").write_text(f"## 第一回 灵根育孕源流出\n\n花果山上有一块仙石。{FILLER}\n", encoding='utf-8')
+    index = corpus.CorpusIndex.build(str(books))
+    filename, = index.files
+    chunk = next(iter(index.segments(filename)))
+
+    # 上次运行在保存清单前崩溃：清单里没有等级，但输出文件里已经写了 Level 1
+    manifest = SourceManifest(str(tmp_path / "manifest.json"))
+    manifest.update(filename, index.fingerprint(filename), book_name="西游记",
+                    chunks={chunk["chapter"]: {"sha256": chunk["sha256"], "levels": []}})
+    output = tmp_path / "out.json"
+    record = build_record("西游记", chunk["chapter"], LEVELS[0], [{"q": "?"}], "test")
+    output.write_text(json.dumps(record, ensure_ascii=False) + "\n", encoding='utf-8')
+
+    record_index = RecordIndex.open(str(output))
+    try:
+        pending = generate_quiz_pool.process_book_file(index, filename, manifest, set(), record_index)
+    finally:
+        record_index.close()
+    assert [levels for *_, levels in pending] == [LEVELS[1:]]
@@ -0,0 +1,139 @@
+import argparse
+import os
+import sys
+import threading
+import time
+import types
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import mock_llm_server  # noqa: E402
+import rate_limiter  # noqa: E402
+from http_client import HttpClient  # noqa: E402
+from rate_limiter import RateLimiter, call_with_retry, non_negative_int  # noqa: E402
+
+MESSAGES = {"model": "mock", "messages": [{"role": "user", "content": "请生成 2 道题"}]}
+
+
+@pytest.fixture
+def mock_server():
+    """在随机端口启动 mock_llm_server，返回 (地址, MockState, HttpClient)；测试里直接改 state.args 控制错误注入"""
+    args = mock_llm_server.build_parser().parse_args(["--port", "0", "--latency", "0", "--jitter", "0"])
+    state = mock_llm_server.MockState(args)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), mock_llm_server.make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = HttpClient()
+    yield f"http://127.0.0.1:{server.server_port}", state, client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+class Spy:
+    """包一层响应，记录是否被 close()"""
+
+    def __init__(self, response):
+        self.response = response
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.response.close()
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+def test_retry_after_is_honoured_and_rate_recovers(mock_server):
+    url, state, client = mock_server
+    state.args.retry_after = 1
+    limiter = RateLimiter(rpm=6000)
+    sent = []
+
+    def send():
+        # 第一次请求返回 429，之后全部放行
+        state.args.rate_limit = 1.0 if not sent else 0.0
+        sent.append(Spy(client.post(url + "/v1/chat/completions", json=MESSAGES)))
+        return sent[-1]
+
+    start = time.monotonic()
+    response = call_with_retry(send, limiter, base_delay=0.01)
+    assert response.status_code == 200
+    assert time.monotonic() - start >= 1.0
+    assert [r.status_code for r in sent] == [429, 200]
+    assert sent[0].closed
+    # 429 后速率减半，成功一次恢复 recover_step
+    assert limiter.ratio == pytest.approx(0.5 + limiter.recover_step)
+    assert limiter.requests.rate == pytest.approx(6000 * limiter.ratio / 60)
+
+    for _ in range(20):
+        call_with_retry(lambda: client.post(url + "/v1/chat/completions", json=MESSAGES), limiter)
+    assert limiter.ratio == 1.0
+    assert state.stats == {"requests": 22, "ok": 21, "errors": 0, "throttled": 1}
+
+
+def test_5xx_is_retried_until_max_retries_then_raises(mock_server):
+    url, state, client = mock_server
+    state.args.error_rate = 1.0
+    sent = []
+
+    def send():
+        sent.append(Spy(client.post(url + "/v1/chat/completions", json=MESSAGES)))
+        return sent[-1]
+
+    with pytest.raises(requests.HTTPError):
+        call_with_retry(send, RateLimiter(rpm=6000), max_retries=2, base_delay=0.01)
+    assert state.stats["requests"] == 3
+    assert all(r.status_code >= 500 and r.closed for r in sent)
+
+
+def test_4xx_is_not_retried_and_connection_is_released(mock_server):
+    url, state, client = mock_server
+    sent = []
+
+    def send():
+        sent.append(Spy(client.get(url + "/missing")))
+        return sent[-1]
+
+    with pytest.raises(requests.HTTPError):
+        call_with_retry(send, RateLimiter(rpm=6000), base_delay=0.01)
+    assert len(sent) == 1 and sent[0].status_code == 404 and sent[0].closed
+
+
+def test_zero_limits_never_sleep(mock_server, monkeypatch):
+    url, state, client = mock_server
+
+    def no_sleep(seconds):
+        raise AssertionError(f"rpm=0 / tpm=0 不应等待（sleep {seconds}）")
+
+    # 只替换 rate_limiter 看到的 time 模块，模拟服务器线程仍用真正的 sleep
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(
+        monotonic=time.monotonic, time=time.time, sleep=no_sleep))
+    limiter = RateLimiter(rpm=0, tpm=0)
+    for _ in range(1000):
+        limiter.acquire(tokens=100000)
+    limiter.on_throttle()
+    limiter.on_success()
+    for _ in range(5):
+        response = call_with_retry(lambda: client.post(url + "/v1/chat/completions", json=MESSAGES),
+                                   limiter, tokens=100000)
+        assert response.status_code == 200
+
+    # 只限 Token 时请求数不受限
+    limiter = RateLimiter(rpm=0, tpm=600000)
+    for _ in range(100):
+        limiter.acquire(tokens=10)
+
+
+def test_non_negative_int_rejects_negative_values():
+    assert non_negative_int("0") == 0
+    assert non_negative_int("120") == 120
+    with pytest.raises(argparse.ArgumentTypeError):
+        non_negative_int("-1")
+    with pytest.raises(ValueError):
+        non_negative_int("abc")
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from quiz_engine import build_record  # noqa: E402
+from record_index import RecordIndex  # noqa: E402
+
+QUESTIONS = [{"id": 1, "question": "？", "options": ["A", "B", "C", "D"], "correctIndex": 0}]
+
+
+def lines(*keys):
+    return "".join(json.dumps(build_record(b, c, lv, QUESTIONS, "test"), ensure_ascii=False) + "\n"
+                   for b, c, lv in keys)
+
+
+def indexed(output):
+    record_index = RecordIndex.open(str(output))
+    try:
+        return record_index.conn.execute(
+            "SELECT book_name, chapter, level, offset, length FROM records ORDER BY offset").fetchall()
+    finally:
+        record_index.close()
+
+
+def test_tail_scan_after_append(tmp_path):
+    output = tmp_path / "out.json"
+    output.write_text(lines(("西游记", "第一回", 1), ("西游记", "第一回", 2)), encoding='utf-8')
+    first = indexed(output)
+    assert [row[:3] for row in first] == [("西游记", "第一回", 1), ("西游记", "第一回", 2)]
+
+    # 其它程序追加了一条完整记录和半行：只补扫新增的完整行
+    tail = lines(("三国演义", "第一回", 3))
+    with open(output, 'a', encoding='utf-8') as f:
+        f.write(tail + '{"_id": "q')
+    rows = indexed(output)
+    assert rows[:2] == first
+    assert rows[2][:3] == ("三国演义", "第一回", 3)
+    with open(output, 'rb') as f:
+        f.seek(rows[2][3])
+        assert f.read(rows[2][4]).decode('utf-8') == tail
+
+
+def test_rebuild_after_truncate_or_replace(tmp_path):
+    output = tmp_path / "out.json"
+    output.write_text(lines(("西游记", "第一回", 1), ("西游记", "第一回", 2), ("西游记", "第二回", 1)),
+                      encoding='utf-8')
+    assert len(indexed(output)) == 3
+
+    # 文件变短（同一 inode）：全部重建
+    with open(output, 'r+', encoding='utf-8') as f:
+        f.truncate(0)
+        f.write(lines(("红楼梦", "第一回", 1)))
+    assert [row[:3] for row in indexed(output)] == [("红楼梦", "第一回", 1)]
+
+    # 整体重写成新文件（inode 变化），即使长度不比索引短也要重建
+    tmp = tmp_path / "out.json.tmp"
+    tmp.write_text(lines(("水浒传", "第一回", 2), ("水浒传", "第一回", 3)), encoding='utf-8')
+    os.replace(tmp, output)
+    assert [row[:3] for row in indexed(output)] == [("水浒传", "第一回", 2), ("水浒传", "第一回", 3)]
+
+
+def test_missing_with_book_and_level_filters(tmp_path):
+    output = tmp_path / "out.json"
+    output.write_text(lines(("西游记", "第一回", 1), ("三国演义", "第一回", 2)), encoding='utf-8')
+    expected = [(b, c, lv) for b in ("西游记", "三国演义") for c in ("第一回", "第二回") for lv in (1, 2, 3)]
+
+    record_index = RecordIndex.open(str(output))
+    try:
+        everything = record_index.missing(expected)
+        assert everything == [k for k in expected if k not in {("西游记", "第一回", 1), ("三国演义", "第一回", 2)}]
+        assert record_index.missing(expected, book="西游记") == [k for k in everything if k[0] == "西游记"]
+        assert record_index.missing(expected, level=2) == [k for k in everything if k[2] == 2]
+        assert record_index.missing(expected, book="三国演义", level=2) == [("三国演义", "第二回", 2)]
+        assert record_index.missing(expected, book="红楼梦") == []
+
+        # 写题时登记的记录立即反映在查询里，重复查询不受上一次临时表影响
+        line = lines(("西游记", "第二回", 3)).encode('utf-8')
+        with open(output, 'ab') as f:
+            offset = f.tell()
+            f.write(line)
+        record_index.add(build_record("西游记", "第二回", 3, QUESTIONS, "test"), offset, len(line))
+        assert ("西游记", "第二回", 3) not in record_index.missing(expected, book="西游记")
+    finally:
+        record_index.close()
+    assert len(indexed(output)) == 3
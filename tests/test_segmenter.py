@@ -0,0 +1,77 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from segmenter import (MAX_SEGMENT_TOKENS, MIN_SEGMENT_TOKENS, OVERLAP_TOKENS, count_tokens,  # noqa: E402
+                       plan_parts, should_merge, split_text)
+
+
+def paragraphs(n, tokens, seed=0):
+    """n 个互不相同的段落，每段正好 tokens 个 Token（tokens-1 个汉字加句号）"""
+    rng = random.Random(seed)
+    return ["".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(tokens - 1)) + "。" for _ in range(n)]
+
+
+def shared_paragraphs(prev, nxt):
+    """下一部分开头与上一部分末尾相同的段落数"""
+    a, b = prev.split("\n\n"), nxt.split("\n\n")
+    return max(k for k in range(min(len(a), len(b)) + 1) if k == 0 or a[-k:] == b[:k])
+
+
+def test_parts_stay_under_max_and_overlap():
+    paras = paragraphs(200, 50)
+    text = "\n\n".join(paras)
+    assert count_tokens(text) == 200 * 50
+    parts = split_text(text)
+    assert len(parts) == 4
+    for part in parts:
+        assert count_tokens(part) <= MAX_SEGMENT_TOKENS
+    for prev, nxt in zip(parts, parts[1:]):
+        # 相邻部分共享上一部分末尾约 OVERLAP_TOKENS 个 Token 的整段
+        shared = shared_paragraphs(prev, nxt) * 50
+        assert OVERLAP_TOKENS - 50 < shared <= OVERLAP_TOKENS
+    # 去掉重叠后首尾相接，正好是原文
+    rebuilt = parts[0].split("\n\n")
+    for prev, nxt in zip(parts, parts[1:]):
+        rebuilt += nxt.split("\n\n")[shared_paragraphs(prev, nxt):]
+    assert rebuilt == paras
+
+
+def test_splits_fall_on_paragraph_boundaries():
+    rng = random.Random(1)
+    paras = [p for i in range(60) for p in paragraphs(1, rng.randint(20, 400), seed=i)]
+    text = "\n\n\n".join(paras) + "\n"
+    for part in split_text(text):
+        assert count_tokens(part) <= MAX_SEGMENT_TOKENS
+        assert all(p in paras for p in part.split("\n\n"))
+
+
+def test_oversized_paragraph_is_cut_at_sentences():
+    sentences = paragraphs(40, 100, seed=3)
+    part_list = split_text("".join(sentences), max_tokens=1000, overlap_tokens=150)
+    for part in part_list:
+        assert count_tokens(part) <= 1000
+        assert all(p.endswith("。") for p in part.split("\n\n"))
+
+
+def test_plan_parts():
+    short = "\n\n".join(paragraphs(10, 50))
+    assert plan_parts(short, 10) == [(short, 10)]
+
+    long_text = "\n\n".join(paragraphs(400, 50))
+    planned = plan_parts(long_text, 10)
+    assert 1 < len(planned) <= 10
+    assert sum(count for _, count in planned) == 10
+    assert all(count >= 1 for _, count in planned)
+    # 部分数不够分时放宽单部分上限，而不是让某部分分不到题
+    assert len(plan_parts("\n\n".join(paragraphs(400, 50)), 3)) <= 3
+
+
+def test_should_merge_chunks_below_min():
+    assert should_merge(MIN_SEGMENT_TOKENS - 1, MAX_SEGMENT_TOKENS)
+    assert should_merge(MAX_SEGMENT_TOKENS, MIN_SEGMENT_TOKENS - 1)
+    assert should_merge(MAX_SEGMENT_TOKENS // 2, MAX_SEGMENT_TOKENS // 2)
+    assert not should_merge(MIN_SEGMENT_TOKENS, MAX_SEGMENT_TOKENS - MIN_SEGMENT_TOKENS + 1)
+    assert not should_merge(2000, 1500)
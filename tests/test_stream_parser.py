@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from stream_parser import QuestionStreamParser, StreamFormatError, iter_sse_events  # noqa: E402
+
+QUESTIONS = [
+    {"id": 1, "question": "孙悟空的兵器叫什么？", "options": ["金箍棒", "九齿钉耙", "降妖宝杖", "月牙铲"],
+     "correctIndex": 0, "explanation": "原文称\"如意金箍棒\"，含 [括号] 和 {花括号}"},
+    {"id": 2, "question": "唐僧的坐骑是谁变的？", "options": ["白龙", "黑熊", "青牛", "金鱼"],
+     "correctIndex": 0, "explanation": "西海龙王三太子"},
+]
+
+
+def sse_lines(content, size=7, done=True):
+    """把 content 切成 size 个字符一段的 SSE 事件行（含空行和 keep-alive 注释）"""
+    lines = [": keep-alive", ""]
+    for i in range(0, len(content), size):
+        lines += ["data: " + json.dumps({"choices": [{"delta": {"content": content[i:i + size]}}]},
+                                        ensure_ascii=False), ""]
+    lines += ["data: " + json.dumps({"choices": [], "usage": {"total_tokens": 42}}), ""]
+    if done:
+        lines += ["data: [DONE]", "", "data: 这一行在 [DONE] 之后，不应被解析"]
+    return lines
+
+
+def parse(lines):
+    """按事件喂给解析器，返回 (解析器, 每道题闭合时已消费的事件数)"""
+    parser = QuestionStreamParser()
+    closed_at = []
+    for n, event in enumerate(iter_sse_events(lines), 1):
+        for choice in event.get("choices") or []:
+            for _ in parser.feed(choice["delta"].get("content") or ""):
+                closed_at.append(n)
+    return parser, closed_at
+
+
+def test_question_split_across_chunks():
+    content = "```json\n" + json.dumps(QUESTIONS, ensure_ascii=False, indent=2) + "\n```"
+    parser, closed_at = parse(sse_lines(content, size=5))
+    assert json.loads(parser.close()) == QUESTIONS
+    # 第一题在流的中途就已闭合并通过校验，不用等整个回复
+    assert len(closed_at) == 2 and closed_at[0] < closed_at[1]
+
+
+def test_done_ends_the_event_stream():
+    events = list(iter_sse_events(sse_lines("[]")))
+    assert events[-1] == {"choices": [], "usage": {"total_tokens": 42}}
+    assert all("[DONE]" not in json.dumps(e) for e in events)
+
+
+def test_invalid_question_rejected_before_stream_ends():
+    bad = [QUESTIONS[0], {"id": 2, "question": "选项太少？", "options": ["A", "B"], "correctIndex": 0}, QUESTIONS[1]]
+    lines = sse_lines(json.dumps(bad, ensure_ascii=False), size=10)
+    consumed = []
+
+    def tracked():
+        for line in lines:
+            consumed.append(line)
+            yield line
+
+    with pytest.raises(StreamFormatError, match="选项不足"):
+        parse(tracked())
+    # 坏题目一闭合就抛错，第三题和 [DONE] 都还没读到
+    assert len(consumed) < len(lines) - 10
+
+
+@pytest.mark.parametrize("content", [
+    json.dumps(QUESTIONS, ensure_ascii=False)[:-1],
+    json.dumps(QUESTIONS, ensure_ascii=False)[:80],
+    "",
+])
+def test_truncated_stream(content):
+    parser, _ = parse(sse_lines(content, done=False))
+    assert not parser.done
+    with pytest.raises(StreamFormatError, match="中断"):
+        parser.close()
+
+
+def test_text_before_array_is_rejected():
+    with pytest.raises(StreamFormatError, match="多余内容"):
+        parse(sse_lines("好的，以下是题目：" + json.dumps(QUESTIONS, ensure_ascii=False)))
@@ -0,0 +1,96 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import generate_books_db  # noqa: E402
+from generate_books_db import GRADE_MAP, GRADE_MATCHER, find_grade_info  # noqa: E402
+from title_matcher import TitleMatcher  # noqa: E402
+
+TITLES = list(GRADE_MAP)
+
+
+def naive_longest_in(titles, text):
+    """逐个书名做子串查找的参照实现：最长优先，同长取出现位置靠前的，再按书单顺序"""
+    found = [(-len(t), text.find(t), i, t) for i, t in enumerate(titles) if t in text]
+    return min(found)[3] if found else None
+
+
+def naive_containing(titles, fragment):
+    return sorted((t for t in titles if fragment in t), key=lambda t: (len(t), titles.index(t)))
+
+
+def baseline_find_grade_info(book_name):
+    """改用自动机之前的实现（按 GRADE_MAP 顺序取第一个互相包含的书名）"""
+    if book_name in GRADE_MAP:
+        return GRADE_MAP[book_name]
+    for key, value in GRADE_MAP.items():
+        if book_name in key or key in book_name:
+            return value
+    clean = book_name.replace('《', '').replace('》', '')
+    if clean in GRADE_MAP:
+        return GRADE_MAP[clean]
+    return None
+
+
+def sample_texts():
+    rng = random.Random(8)
+    texts = []
+    for title in TITLES:
+        texts += [title, f"RAG_{title}_原著完整版", f"《{title}》", f"朱自清·{title}", title[1:], title[:-1]]
+    for _ in range(300):
+        a, b = rng.sample(TITLES, 2)
+        texts.append(f"{a}与{b}合集")
+    return texts
+
+
+def test_grade_matcher_agrees_with_substring_scan():
+    for text in sample_texts():
+        assert GRADE_MATCHER.longest_in(text) == naive_longest_in(TITLES, text), text
+        assert GRADE_MATCHER.containing(text) == naive_containing(TITLES, text), text
+
+
+def test_matches_baseline_when_unambiguous():
+    checked = 0
+    for text in sample_texts():
+        candidates = {key for key in GRADE_MAP if text in key or key in text}
+        if text in GRADE_MAP or len({GRADE_MAP[k] for k in candidates}) <= 1:
+            assert find_grade_info(text) == baseline_find_grade_info(text), text
+            checked += 1
+    assert checked > len(TITLES)
+
+
+def test_overlapping_keys_longest_wins():
+    assert GRADE_MATCHER.longest_in("RAG_少年读史记_原著完整版") == "少年读史记"
+    assert GRADE_MATCHER.longest_in("史记选读") == "史记"
+    matcher = TitleMatcher(["西游", "游记", "西游记", "记"])
+    assert matcher.longest_in("少儿版西游记故事") == "西游记"
+    # 同长取出现位置靠前的
+    assert matcher.longest_in("游记西游") == "游记"
+    assert matcher.longest_in("三国演义") is None
+    assert matcher.containing("游") == ["西游", "游记", "西游记"]
+    assert matcher.containing("西游记故事") == []
+
+
+@pytest.fixture
+def grade_map(monkeypatch):
+    grades = {"背影": ("七级", 7), "少年读史记": ("六级", 6), "史记": ("九级", 9), "孔子": ("一级A", 1)}
+    monkeypatch.setattr(generate_books_db, "GRADE_MAP", grades)
+    monkeypatch.setattr(generate_books_db, "GRADE_MATCHER", TitleMatcher(grades))
+    return grades
+
+
+def test_find_grade_info_inner_and_outer(grade_map):
+    # 书名中出现了年级书名（inner）
+    assert generate_books_db.find_grade_info("朱自清·背影") == grade_map["背影"]
+    assert generate_books_db.find_grade_info("少年读史记（全彩版）") == grade_map["少年读史记"]
+    # 书名是某个年级书名的一部分（outer），且比书名中出现的年级书名更长时用 outer
+    assert generate_books_db.find_grade_info("读史记") == grade_map["少年读史记"]
+    # 精确匹配优先，不会被包含它的更长书名抢走
+    assert generate_books_db.find_grade_info("史记") == grade_map["史记"]
+    assert generate_books_db.find_grade_info("孔") == grade_map["孔子"]
+    assert generate_books_db.find_grade_info("《孔子》") == grade_map["孔子"]
+    assert generate_books_db.find_grade_info("三国演义") is None
@@ -0,0 +1,166 @@
+import functools
+import json
+import os
+import random
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import rate_limiter  # noqa: E402
+import upload_parts  # noqa: E402
+from export_parts import iter_part_records, load_manifest, write_parts  # noqa: E402
+from http_client import HttpClient  # noqa: E402
+from rate_limiter import RateLimiter  # noqa: E402
+from upload_parts import HttpUploadBackend, WxCloudBackend, make_receiver, publish  # noqa: E402
+
+MAX_PART_BYTES = 192 * 1024
+
+
+def records(n, tag=""):
+    return [{"_id": f"q{i:05d}", "book_name": "西游记", "chapter": f"第{i // 30 + 1}回", "level": i % 3 + 1,
+             "questions": [{"question": f"第 {i} 题{tag}？" + "题干" * 20, "options": ["A", "B", "C", "D"]}]}
+            for i in range(n)]
+
+
+@pytest.fixture
+def start_receiver(tmp_path, monkeypatch):
+    """按给定错误率启动 make_receiver，返回 (地址, 收到的分片目录, 收到的 POST 路径列表)"""
+    servers = []
+    random.seed(25)
+    # 缩短退避，测试不必真的等上几秒
+    monkeypatch.setattr(upload_parts, "call_with_retry", functools.partial(rate_limiter.call_with_retry,
+                                                                          base_delay=0.01))
+    monkeypatch.setattr(upload_parts, "PART_RETRY_DELAY", 0.01)
+
+    def start(error_rate):
+        received = tmp_path / "received"
+        posts = []
+
+        class Counting(make_receiver(str(received), error_rate)):
+            def do_POST(self):
+                posts.append(self.path)
+                super().do_POST()
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Counting)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/upload", received, posts
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_part_size_cap(tmp_path):
+    data = records(3000)
+    manifest = write_parts(iter(data), str(tmp_path / "parts"), "questions", MAX_PART_BYTES, "gzip")
+    assert len(manifest["parts"]) > 1 and manifest["records"] == 3000
+    assert all(p["bytes"] <= MAX_PART_BYTES for p in manifest["parts"])
+    # 分片再多装一条记录就会超限
+    for part, nxt in zip(manifest["parts"], manifest["parts"][1:]):
+        first = next(iter_part_records(str(tmp_path / "parts" / nxt["name"])))
+        assert part["bytes"] + len(json.dumps(first, ensure_ascii=False).encode('utf-8')) + 1 > MAX_PART_BYTES
+    restored = [r for p in manifest["parts"] for r in iter_part_records(str(tmp_path / "parts" / p["name"]))]
+    assert restored == data
+
+
+def test_publish_with_injected_errors_and_resume(tmp_path, start_receiver):
+    url, received, posts = start_receiver(0.3)
+    parts_dir = str(tmp_path / "parts")
+    manifest = write_parts(iter(records(3000)), parts_dir, "questions", MAX_PART_BYTES, "gzip")
+    client = HttpClient()
+    backend = HttpUploadBackend(url, client, RateLimiter(0))
+    try:
+        assert publish(parts_dir, backend, workers=3, retries=5) == 0
+        assert len(posts) > len(manifest["parts"])  # 有请求被注入了 503 并重试
+        for part in manifest["parts"]:
+            with open(os.path.join(parts_dir, part["name"]), 'rb') as a, \
+                    open(received / "questions" / part["name"], 'rb') as b:
+                assert a.read() == b.read()
+
+        # 全部上传过的再跑一次什么都不传
+        posts.clear()
+        assert publish(parts_dir, backend, workers=3) == 0
+        assert posts == []
+
+        # 状态里缺一个分片（例如上次中断）：只补传这一个
+        state_path = os.path.join(parts_dir, upload_parts.STATE_NAME)
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        missing = manifest["parts"][1]["name"]
+        del state[backend.name][missing]
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        assert publish(parts_dir, backend, workers=3) == 0
+        assert set(posts) == {f"/upload/questions/{missing}"}
+
+        # 重新导出后只有内容变了的分片需要上传
+        posts.clear()
+        changed = records(3000)
+        changed[-1]["questions"][0]["question"] += "（修订）"
+        manifest = write_parts(iter(changed), parts_dir, "questions", MAX_PART_BYTES, "gzip")
+        assert publish(parts_dir, backend, workers=3) == 0
+        assert set(posts) == {f"/upload/questions/{manifest['parts'][-1]['name']}"}
+        assert load_manifest(parts_dir) == manifest
+    finally:
+        client.close()
+
+
+def test_receiver_rejects_paths_without_collection_and_name(start_receiver):
+    url, received, posts = start_receiver(0.0)
+    base = url.rsplit('/', 1)[0]
+    for path in ("/", "/upload", "/upload/questions/..", "/upload/../x"):
+        response = requests.post(base + path, data=b"{}")
+        assert response.status_code == 400, path
+    assert requests.post(base + "/upload/questions/part-0.jsonl", data=b"{}").status_code == 200
+    assert os.listdir(received) == ["questions"]
+
+
+class FakeWx(WxCloudBackend):
+    """把云开发 HTTP API 换成固定回复：导入任务的状态依次取自 statuses（用完后保持最后一个）"""
+
+    def __init__(self, statuses):
+        super().__init__("test-env", "appid", "secret", http=self, limiter=RateLimiter(0))
+        self.statuses = list(statuses)
+        self.polls = 0
+
+    def _api(self, path, payload, action):
+        if path == "uploadfile":
+            return {"url": "https://cos.example/upload", "authorization": "a", "token": "t", "cos_file_id": "f"}
+        if path == "databasemigrateimport":
+            return {"job_id": 7}
+        self.polls += 1
+        return {"status": self.statuses[min(self.polls, len(self.statuses)) - 1]}
+
+    def post(self, url, **kwargs):
+        # 上传到云存储的表单请求
+        response = requests.Response()
+        response.status_code = 204
+        return response
+
+
+def test_wxcloud_import_poll_has_deadline(tmp_path, monkeypatch):
+    manifest = write_parts(iter(records(10)), str(tmp_path), "questions", MAX_PART_BYTES, "none")
+    part = manifest["parts"][0]
+    path = str(tmp_path / part["name"])
+    monkeypatch.setattr(upload_parts, "WX_IMPORT_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(upload_parts, "WX_IMPORT_TIMEOUT", 0.2)
+
+    backend = FakeWx(["waiting", "running", "success"])
+    assert backend.upload(path, part, "questions") == "job:7"
+    assert backend.polls == 3
+
+    backend = FakeWx(["running"])
+    with pytest.raises(TimeoutError, match="未完成"):
+        backend.upload(path, part, "questions")
+    assert 1 < backend.polls < 100
+
+    with pytest.raises(RuntimeError, match="导入失败"):
+        FakeWx(["fail"]).upload(path, part, "questions")